@@ -0,0 +1,139 @@
+# Measures memory used per reminder by the models, compared to plain
+# (non-slotted, non-shared) dataclasses the models used to be.
+#
+# Usage: python benchmarks/memory.py [reminder_count]
+
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import models
+
+# Number of distinct terms, i.e. reminders share translations of popular terms
+TERM_COUNT = 1000
+
+# ----------------------------------------------------------------
+#  @plain_models
+# ----------------------------------------------------------------
+
+
+@dataclass
+class PlainDictionary:
+    src: str
+    dst: str
+
+
+@dataclass
+class PlainExample:
+    src: str
+    dst: str
+
+
+@dataclass
+class PlainDestination:
+    value: str
+    examples: list[PlainExample]
+
+
+@dataclass
+class PlainTranslation:
+    src: str
+    dst: list[PlainDestination]
+    definition: str
+
+
+@dataclass
+class PlainReminder:
+    id: int
+    last_at: int
+    left: int
+    translation: PlainTranslation
+    dictionary: PlainDictionary
+    value: str
+
+
+def create_plain_reminder(id: int) -> PlainReminder:
+    term = f"term {id % TERM_COUNT}"
+
+    # Every reminder used to get its own copy of the translation
+    translation = PlainTranslation(
+        term,
+        [
+            PlainDestination(f"{term} {i}", [PlainExample(f"{term} src", f"{term} dst")])
+            for i in range(3)
+        ],
+        f"{term} definition",
+    )
+
+    dictionary = PlainDictionary("nl", "en")
+
+    return PlainReminder(id, time.time(), 5, translation, dictionary, term)
+
+
+# ----------------------------------------------------------------
+#  @models
+# ----------------------------------------------------------------
+
+
+def create_translation(term: str) -> models.Translation:
+    return models.Translation(
+        term,
+        tuple(
+            models.Destination(
+                f"{term} {i}",
+                (models.Example(f"{term} src", f"{term} dst"),),
+            )
+            for i in range(3)
+        ),
+        f"{term} definition",
+    )
+
+
+translations = {}
+
+
+def create_reminder(id: int) -> models.Reminder:
+    term = f"term {id % TERM_COUNT}"
+
+    # Reminders of the same term share the (cached) translation
+    if term not in translations:
+        translations[term] = create_translation(term)
+
+    translation = translations[term]
+    dictionary = models.Dictionary.of("nl", "en")
+
+    return models.Reminder(id, time.time(), 5, translation, dictionary, term)
+
+
+# ----------------------------------------------------------------
+#  @runner
+# ----------------------------------------------------------------
+
+
+def measure(create: callable, count: int) -> float:
+    tracemalloc.start()
+
+    reminders = [create(id) for id in range(count)]
+
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del reminders
+
+    return size / count
+
+
+if __name__ == "__main__":
+    count = 100_000 if len(sys.argv) == 1 else int(sys.argv[1])
+
+    plain = measure(create_plain_reminder, count)
+    current = measure(create_reminder, count)
+
+    print(f"Reminders: {count}, distinct terms: {TERM_COUNT}")
+    print(f"Plain dataclasses: {plain:.0f} bytes per reminder")
+    print(f"Current models: {current:.0f} bytes per reminder")
+    print(f"Saved: {100 * (1 - current / plain):.1f}%")
@@ -0,0 +1,476 @@
+# Measures the reminder pipeline (the reminder caller, the repository and the
+# update handlers) with synthetic chats. Telegram and OpenAI are replaced by
+# in-process stand-ins with a fixed latency, so results only depend on the
+# bot itself. Every scenario runs in a fresh process with a fresh database.
+#
+# Scenarios:
+# - steady: reminders of all chats are due over a few seconds, and the
+#   reminder caller is called every tick
+# - storm: reminders of all chats are due at once (e.g. after a restart)
+# - ingest: every chat adds a word at the same time
+# - bulk_ingest: every chat adds many words with a single message at once
+# - callbacks: every chat presses reminder buttons at the same time
+#
+# Reports throughput, p50 / p99 latency and peak RSS of every scenario, as
+# JSON tagged with the current commit (to compare results across commits).
+#
+# Usage: python benchmarks/pipeline.py [--chats N] [--reminders M] ...
+#        (see '--help', e.g. '--output results.json' to save the results)
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+SCENARIOS = ["steady", "storm", "ingest", "bulk_ingest", "callbacks"]
+
+# Reminder intervals of chats (in seconds), one of which is picked per chat
+INTERVAL_CHOICES = [
+    [h * 60 for h in [5, 30, 120, 720, 2880]],
+    [m * 60 for m in [1, 10, 60]],
+    [d * 86400 for d in [1, 3, 7, 14, 30, 60, 120]],
+    [3600],
+]
+
+# Number of words added by a single message in the 'bulk_ingest' scenario
+BULK_VALUES = 20
+
+# Number of button presses per chat in the 'callbacks' scenario
+CALLBACKS_PER_CHAT = 3
+
+# Time (in seconds) over which reminders are due in the 'steady' scenario
+STEADY_DURATION = 5.0
+
+# Time (in seconds) between reminder caller calls in the 'steady' scenario
+STEADY_TICK = 0.1
+
+SEED = 42
+
+# ----------------------------------------------------------------
+#  @stand_ins
+# ----------------------------------------------------------------
+
+
+class FakeMessage:
+    def __init__(self, bot: "FakeBot", chat_id: int, text: str):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        return await self.bot.send_message(self.chat_id, text, **kwargs)
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        await self.bot.request()
+        self.text = text
+        return self
+
+
+class FakeBot:
+    # Stand-in for 'telegram.Bot', recording when messages of chats are sent
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent_at: dict[int, list[float]] = {}
+
+    async def request(self) -> None:
+        await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        await self.request()
+        self.sent_at.setdefault(chat_id, []).append(time.time())
+        return FakeMessage(self, chat_id, text)
+
+    async def send_chat_action(self, chat_id: int, action: str) -> None:
+        await self.request()
+
+
+class FakeJobQueue:
+    # The reminder caller is called by the benchmark instead
+
+    def get_jobs_by_name(self, name: str) -> list:
+        return []
+
+    def run_once(self, callback, when: float, name: str) -> None:
+        pass
+
+
+def create_context(bot: FakeBot) -> SimpleNamespace:
+    return SimpleNamespace(
+        bot=bot,
+        job_queue=FakeJobQueue(),
+        application=SimpleNamespace(create_task=asyncio.create_task),
+    )
+
+
+def create_message_update(bot: FakeBot, chat_id: int, text: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=chat_id),
+        message=FakeMessage(bot, chat_id, text),
+        callback_query=None,
+    )
+
+
+def create_callback_update(chat_id: int, data: str) -> SimpleNamespace:
+    async def answer():
+        pass
+
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=chat_id),
+        message=None,
+        callback_query=SimpleNamespace(data=data, answer=answer),
+    )
+
+
+def stub_translator(bot_module, latency: float) -> None:
+    import models
+
+    def create_translation(value: str) -> models.Translation:
+        return models.Translation(
+            value,
+            tuple(
+                models.Destination(
+                    f"{value} {i}", (models.Example(f"{value} src", f"{value} dst"),)
+                )
+                for i in range(bot_module.TRANSLATIONS_PER_REMINDER)
+            ),
+            f"{value} definition",
+        )
+
+    async def translate(value, src, dst, tc, ec, on_partial=None, cached=None):
+        await asyncio.sleep(latency)
+        return create_translation(value)
+
+    def get_cached(value, src, dst, tc, ec):
+        # Every term is new, so that each one costs an OpenAI call
+        return None
+
+    async def translate_many(values, src, dst, tc, ec):
+        await asyncio.sleep(latency)
+        return [create_translation(value) for value in values]
+
+    bot_module.translate = translate
+    bot_module.translate_many = translate_many
+    bot_module.translator.get_cached = get_cached
+
+
+# ----------------------------------------------------------------
+#  @chats
+# ----------------------------------------------------------------
+
+
+def create_chats(bot_module, args, due_at) -> dict[int, float]:
+    # Creates chats with reminders, all reminders of a chat being due at
+    # 'due_at(chat_id)' (or never if None). Returns due times by chat id.
+    import models
+
+    repository = bot_module.repository
+    random.seed(SEED)
+
+    due_times = {}
+
+    for chat_id in range(1, args.chats + 1):
+        chat = repository.create_chat(chat_id)
+        chat.reminder_intervals = random.choice(INTERVAL_CHOICES)
+        repository.storage.save_chat(chat)
+
+        due = due_at(chat_id)
+        reminders = []
+
+        for i in range(args.reminders):
+            left = random.randint(1, len(chat.reminder_intervals))
+            interval = chat.reminder_intervals[-left]
+
+            value = f"word {chat_id}-{i}"
+            last_at = (due if due is not None else time.time()) - interval
+
+            translation = models.Translation(
+                value,
+                (models.Destination(value, (models.Example(value, value),)),),
+                value,
+            )
+
+            reminders.append(
+                models.Reminder(
+                    chat.reminder_next_id + i,
+                    last_at,
+                    left,
+                    translation,
+                    chat.dictionary,
+                    value,
+                )
+            )
+
+        repository.save_reminders(chat_id, reminders)
+
+        if due is not None:
+            due_times[chat_id] = due
+
+    return due_times
+
+
+# ----------------------------------------------------------------
+#  @scenarios
+# ----------------------------------------------------------------
+
+
+async def run_reminders(bot_module, args, duration: float) -> tuple[int, list]:
+    # Calls due reminders until all are sent. Returns the number of sent
+    # reminders and their latencies, i.e. time from due (or from the start,
+    # for reminders due while chats were created) to sent.
+    now = time.time()
+
+    due_times = create_chats(
+        bot_module, args, lambda _: now + random.uniform(0, duration)
+    )
+
+    bot = FakeBot(args.telegram_latency)
+    context = create_context(bot)
+
+    started_at = time.time()
+
+    # Until a call starts after the last reminder is due
+    while True:
+        called_at = time.time()
+        await bot_module.call_due_reminders(context)
+
+        if called_at > now + duration:
+            break
+
+        await asyncio.sleep(STEADY_TICK)
+
+    # Waits for the last messages (e.g. queued by the sender)
+    while len(bot.sent_at) < len(due_times):
+        await asyncio.sleep(STEADY_TICK)
+
+    latencies = [
+        sent_at - max(due_times[chat_id], started_at)
+        for chat_id, times in bot.sent_at.items()
+        for sent_at in times
+    ]
+
+    return (args.chats * args.reminders, latencies)
+
+
+async def run_updates(bot_module, bot: FakeBot, updates: list, handler) -> list:
+    # Handles updates concurrently (as the application does). Returns the
+    # latencies of handlers.
+    context = create_context(bot)
+    semaphore = asyncio.Semaphore(bot_module.MAX_CONCURRENT_UPDATES)
+
+    async def handle(update) -> float:
+        async with semaphore:
+            started_at = time.perf_counter()
+            await handler(update, context)
+            return time.perf_counter() - started_at
+
+    return await asyncio.gather(*(handle(update) for update in updates))
+
+
+async def run_scenario(bot_module, args) -> tuple[int, list[float], float]:
+    # Returns the number of handled items, latencies and the duration
+    started_at = time.perf_counter()
+
+    match args.run:
+        case "steady":
+            (count, latencies) = await run_reminders(bot_module, args, STEADY_DURATION)
+
+        case "storm":
+            (count, latencies) = await run_reminders(bot_module, args, 0)
+
+        case "ingest" | "bulk_ingest":
+            values_per_message = BULK_VALUES if args.run == "bulk_ingest" else 1
+
+            bot = FakeBot(args.telegram_latency)
+            updates = []
+
+            for chat_id in range(1, args.chats + 1):
+                bot_module.repository.create_chat(chat_id)
+
+                values = [
+                    f"word {chat_id}-{i}" for i in range(values_per_message)
+                ]
+                text = "\n".join(values)
+                updates.append(create_message_update(bot, chat_id, text))
+
+            started_at = time.perf_counter()
+
+            latencies = await run_updates(
+                bot_module, bot, updates, bot_module.non_command_handler
+            )
+            count = args.chats * values_per_message
+
+        case "callbacks":
+            create_chats(bot_module, args, lambda _: None)
+
+            bot = FakeBot(args.telegram_latency)
+            actions = ["examples", "definition", "stop"]
+            updates = []
+
+            for chat_id in range(1, args.chats + 1):
+                for i in range(CALLBACKS_PER_CHAT):
+                    action = actions[i % len(actions)]
+                    reminder_id = i % args.reminders
+                    update = create_callback_update(
+                        chat_id, f"{action}|{reminder_id}"
+                    )
+                    updates.append(update)
+
+            started_at = time.perf_counter()
+
+            latencies = await run_updates(
+                bot_module, bot, updates, bot_module.keyboard_handler
+            )
+            count = len(updates)
+
+    return (count, latencies, time.perf_counter() - started_at)
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def run(args) -> dict:
+    sys.path.insert(0, SRC_DIR)
+
+    import bot as bot_module
+    from sender import MessageSender
+
+    stub_translator(bot_module, args.openai_latency)
+
+    # Telegram rate limits are lifted to measure the bot rather than them
+    if not args.telegram_limits:
+        bot_module.sender = MessageSender(1e9, 1e9, 1e9)
+
+    bot_module.sender.start()
+
+    (count, latencies, duration) = await run_scenario(bot_module, args)
+
+    await bot_module.sender.stop()
+
+    # Kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return {
+        "count": count,
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(count / duration, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+# ----------------------------------------------------------------
+#  @runner
+# ----------------------------------------------------------------
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=SRC_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_in_process(scenario: str, args) -> dict:
+    database_path = os.path.join(tempfile.mkdtemp(), "oneling.db")
+    env = {**os.environ, "DATABASE_PATH": database_path}
+
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--run",
+        scenario,
+        "--chats",
+        str(args.chats),
+        "--reminders",
+        str(args.reminders),
+        "--telegram-latency",
+        str(args.telegram_latency),
+        "--openai-latency",
+        str(args.openai_latency),
+    ]
+
+    if args.telegram_limits:
+        command.append("--telegram-limits")
+
+    output = subprocess.run(command, env=env, capture_output=True, text=True)
+
+    if output.returncode != 0:
+        raise SystemExit(f"Scenario '{scenario}' failed:\n{output.stderr}")
+
+    return json.loads(output.stdout)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reminder pipeline benchmark")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--reminders", type=int, default=10, help="per chat")
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument(
+        "--telegram-limits", action="store_true", help="keep Telegram rate limits"
+    )
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--output", help="file to save the results to")
+    parser.add_argument("--run", choices=SCENARIOS, help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Runs a single scenario (in a process started by the benchmark)
+    if args.run:
+        print(json.dumps(asyncio.run(run(args))))
+        sys.exit()
+
+    results = {
+        "commit": get_commit(),
+        "python": sys.version.split()[0],
+        "params": {
+            "chats": args.chats,
+            "reminders": args.reminders,
+            "telegram_latency": args.telegram_latency,
+            "openai_latency": args.openai_latency,
+            "telegram_limits": args.telegram_limits,
+        },
+        "scenarios": {},
+    }
+
+    for scenario in args.scenarios.split(","):
+        result = run_in_process(scenario, args)
+        results["scenarios"][scenario] = result
+
+        print(
+            f"{scenario}: {result['throughput_per_s']}/s, "
+            f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+            f"peak RSS {result['peak_rss_mb']} MB",
+            file=sys.stderr,
+        )
+
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
@@ -0,0 +1,148 @@
+# Measures cost and time to first token of translation requests, with the
+# system prompt of the old 'json_object' requests (counts and the schema
+# interpolated into it) and with the current one (static per counts, with a
+# strict JSON schema). Requests are streamed, like interactive translations.
+#
+# Usage: python benchmarks/prompt.py [request_count]
+#
+# Needs OPENAI_API_KEY (and OPENAI_BASE_URL to use 'dev/fake_openai.py').
+
+import os
+import sys
+import json
+import time
+import asyncio
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import translator
+
+# Price (in dollars) per million tokens of gpt-4o-mini
+PROMPT_PRICE = 0.15
+CACHED_PRICE = 0.075
+COMPLETION_PRICE = 0.6
+
+TERMS = ["hond", "fiets", "gezellig", "uitwaaien", "ik ben hunger", "lekker"]
+
+# Counts of the requests, i.e. chats with different settings
+COUNTS = [(3, 2), (3, 2), (2, 1), (3, 2)]
+
+OLD_JSON_SCHEMA = {
+    "corrected_term": "string",
+    "translations": [
+        {
+            "value": "string",
+            "examples": [{"src": "string", "dst": "string"}],
+        }
+    ],
+    "definition": "string",
+}
+
+
+def get_old_params(
+    term: str, translation_count: int, examples_per_translation_count: int
+) -> dict:
+    json_schema_str = json.dumps(OLD_JSON_SCHEMA)
+
+    system_message = (
+        "Given a term, source and destination languages, "
+        "correct all errors, including typos, grammatical errors, incorrect collocations, improper word choices, and non-idiomatic expressions. "
+        "For example, if the input is 'ik ben hunger', correct it to 'ik heb honger'. "
+        f"Translate the corrected term or phrase using up to {translation_count} unique and non-redundant translations. "
+        "Each translation must be distinct in wording, phrasing, or style, and must not simply be a rewording or synonym substitution of the same translation. "
+        f"For each translation, provide {examples_per_translation_count} unique and non-redundant examples. "
+        "Each example must be provided in both the source language (marked as 'src') and the destination language (marked as 'dst'). "
+        "Ensure that each example offers a distinct context, scenario, or usage, avoiding repetition of similar sentences or ideas. "
+        "Include the term's definition in the source language. "
+        "If the term is not in the source language, is invalid, or unrecognized, return an empty JSON object. "
+        f"Format the response as JSON: {{{json_schema_str}}}"
+    )
+
+    user_message = f"Term: {term}; Source language: nl; Destination language: en"
+
+    return {
+        **get_new_params(term, translation_count, examples_per_translation_count),
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message},
+        ],
+        "response_format": {"type": "json_object"},
+    }
+
+
+def get_new_params(
+    term: str, translation_count: int, examples_per_translation_count: int
+) -> dict:
+    messages = translator.get_translation_messages(
+        term, "nl", "en", translation_count, examples_per_translation_count
+    )
+
+    return translator.get_completion_params(messages, 1)
+
+
+async def request(params: dict) -> tuple[float, object]:
+    # Returns the time to the first token and the usage
+    client = translator.get_client()
+
+    started_at = time.perf_counter()
+    first_token_at = None
+    usage = None
+
+    stream = await client.chat.completions.create(
+        **params, stream=True, stream_options={"include_usage": True}
+    )
+
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+
+        if first_token_at is None and chunk.choices and chunk.choices[0].delta.content:
+            first_token_at = time.perf_counter()
+
+    return ((first_token_at or time.perf_counter()) - started_at, usage)
+
+
+async def measure(name: str, get_params, count: int) -> None:
+    first_token_times = []
+    prompt_tokens = cached_tokens = completion_tokens = 0
+
+    for i in range(count):
+        term = TERMS[i % len(TERMS)]
+        counts = COUNTS[i % len(COUNTS)]
+
+        (first_token_time, usage) = await request(get_params(term, *counts))
+
+        first_token_times.append(first_token_time)
+
+        prompt_tokens += usage.prompt_tokens
+        cached_tokens += translator.get_cached_tokens(usage)
+        completion_tokens += usage.completion_tokens
+
+    cost = (
+        (prompt_tokens - cached_tokens) * PROMPT_PRICE
+        + cached_tokens * CACHED_PRICE
+        + completion_tokens * COMPLETION_PRICE
+    ) / 1_000_000
+
+    print(
+        f"{name}: "
+        f"{prompt_tokens / count:.0f} prompt tokens per request "
+        f"({cached_tokens / max(prompt_tokens, 1):.0%} cached), "
+        f"{completion_tokens / count:.0f} completion tokens, "
+        f"${cost / count * 1000:.4f} per 1000 requests, "
+        f"time to first token p50 {statistics.median(first_token_times) * 1000:.0f} ms"
+    )
+
+
+async def main(count: int):
+    await measure("json_object (old)", get_old_params, count)
+    await measure("json_schema", get_new_params, count)
+
+
+if __name__ == "__main__":
+    count = 20 if len(sys.argv) < 2 else int(sys.argv[1])
+
+    print(f"Requests per prompt: {count}")
+
+    asyncio.run(main(count))
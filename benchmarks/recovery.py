@@ -0,0 +1,117 @@
+# Measures recovery of the log storage, i.e. loading the latest snapshot and
+# replaying the log written after it, together with taking the snapshot.
+#
+# Usage: python benchmarks/recovery.py [reminder_count] [log_record_count]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import models
+from log_storage import LogStorage
+from repository import Repository
+
+# Number of distinct terms, i.e. reminders share translations of popular terms
+TERM_COUNT = 10_000
+
+REMINDERS_PER_CHAT = 20
+
+
+def create_translation(term: str) -> models.Translation:
+    return models.Translation(
+        term,
+        tuple(
+            models.Destination(
+                f"{term} {i}",
+                (models.Example(f"{term} src", f"{term} dst"),),
+            )
+            for i in range(3)
+        ),
+        f"{term} definition",
+    )
+
+
+def populate(storage: LogStorage, reminder_count: int) -> None:
+    repository = Repository(storage)
+    translations = [create_translation(f"term {i}") for i in range(TERM_COUNT)]
+
+    now = time.time()
+
+    for chat_id in range(reminder_count // REMINDERS_PER_CHAT):
+        chat = repository.get_chat(chat_id)
+
+        reminders = [
+            models.Reminder(
+                id,
+                now,
+                len(chat.reminder_intervals),
+                translations[(chat_id + id) % TERM_COUNT],
+                chat.dictionary,
+                f"term {(chat_id + id) % TERM_COUNT}",
+            )
+            for id in range(REMINDERS_PER_CHAT)
+        ]
+
+        repository.save_reminders(chat_id, reminders)
+
+
+def append_calls(storage: LogStorage, record_count: int) -> None:
+    # Reminder calls logged after the snapshot
+    chats = list(storage.chats.values())
+
+    for i in range(record_count):
+        chat = chats[i % len(chats)]
+        reminder = chat.reminders[i % REMINDERS_PER_CHAT]
+
+        reminder.last_at = time.time()
+        reminder.left -= 1
+
+        storage.save_reminder(chat.id, reminder, None)
+
+
+def get_size(path: str) -> float:
+    # Megabytes of all storage files
+    directory = os.path.dirname(path)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return size / 1024 / 1024
+
+
+if __name__ == "__main__":
+    reminder_count = 1_000_000 if len(sys.argv) < 2 else int(sys.argv[1])
+    record_count = 100_000 if len(sys.argv) < 3 else int(sys.argv[2])
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "oneling.db")
+
+    print(f"Reminders: {reminder_count}, log records after the snapshot: {record_count}")
+
+    try:
+        storage = LogStorage(path)
+
+        started_at = time.perf_counter()
+        populate(storage, reminder_count)
+        print(f"Populated in {time.perf_counter() - started_at:.2f}s")
+
+        started_at = time.perf_counter()
+        storage.snapshot()
+        print(f"Snapshot taken in {time.perf_counter() - started_at:.2f}s")
+
+        append_calls(storage, record_count)
+        storage.close()
+
+        print(f"Files: {get_size(path):.1f} MB")
+
+        started_at = time.perf_counter()
+        recovered = LogStorage(path)
+        duration = time.perf_counter() - started_at
+
+        recovered_count = sum(len(chat.reminders) for chat in recovered.chats.values())
+        recovered.close()
+
+        print(f"Recovered {recovered_count} reminders in {duration:.2f}s")
+    finally:
+        shutil.rmtree(directory)
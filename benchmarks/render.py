@@ -0,0 +1,167 @@
+# Measures rendering of a reminder wave on the event loop, compared to the
+# render pool and to the render cache. Reports the total time and the
+# longest event loop stall, i.e. the longest time the loop couldn't do
+# network I/O.
+#
+# Usage: python benchmarks/render.py [reminder_count] [workers]
+
+import os
+import gc
+import sys
+import time
+import asyncio
+from typing import Awaitable, Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import models
+from render import (
+    RenderCache,
+    RenderPool,
+    RenderSlicer,
+    RenderedMessage,
+    ReminderParts,
+    ReminderView,
+    compose_message,
+    compose_reminder,
+    render_parts,
+)
+
+# Number of distinct terms, i.e. reminders share translations of popular terms
+TERM_COUNT = 1000
+
+# Number of reminders per chat due at the same time
+REMINDERS_PER_CHAT = 2
+
+# Time (in seconds) between event loop ticks used to measure stalls
+TICK_INTERVAL = 0.001
+
+INTERVAL_COUNT = 5
+
+
+def create_translation(term: str) -> models.Translation:
+    return models.Translation(
+        term,
+        tuple(
+            models.Destination(
+                f"{term} {i}",
+                (models.Example(f"{term} src", f"{term} dst"),),
+            )
+            for i in range(3)
+        ),
+        f"{term} definition",
+    )
+
+
+def create_views(count: int) -> list[ReminderView]:
+    translations = [create_translation(f"term {i}") for i in range(TERM_COUNT)]
+
+    return [
+        (id, translations[id % TERM_COUNT], id % INTERVAL_COUNT, INTERVAL_COUNT, 3600)
+        for id in range(count)
+    ]
+
+
+async def compose_messages(
+    views: list[ReminderView], parts: list[ReminderParts]
+) -> list[RenderedMessage]:
+    # Composed by chat in slices, like by the bot (see 'render_reminders')
+    slicer = RenderSlicer()
+    messages = []
+
+    for i in range(0, len(views), REMINDERS_PER_CHAT):
+        composed = [
+            compose_reminder(view, part)
+            for view, part in zip(
+                views[i : i + REMINDERS_PER_CHAT], parts[i : i + REMINDERS_PER_CHAT]
+            )
+        ]
+
+        messages.append(compose_message(composed))
+        await slicer.add(len(composed))
+
+    return messages
+
+
+async def measure(render: Callable[[], Awaitable]) -> tuple[float, float]:
+    max_stall = 0.0
+    rendering = True
+
+    async def tick():
+        nonlocal max_stall
+
+        while rendering:
+            ticked_at = time.perf_counter()
+            await asyncio.sleep(TICK_INTERVAL)
+            max_stall = max(max_stall, time.perf_counter() - ticked_at - TICK_INTERVAL)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(TICK_INTERVAL)
+
+    started_at = time.perf_counter()
+    await render()
+    duration = time.perf_counter() - started_at
+
+    rendering = False
+    await ticker
+
+    return (duration, max_stall)
+
+
+async def main(count: int, workers: int):
+    views = create_views(count)
+    reminders = [(id, translation) for (id, translation, _, _, _) in views]
+
+    inline_pool = RenderPool(0)
+    worker_pool = RenderPool(workers)
+    worker_pool.start()
+
+    # Warm up (e.g. start the worker processes)
+    await worker_pool.render(reminders[:1000])
+
+    # Parts of all reminders are cached, i.e. the steady state
+    cache = RenderCache(count)
+
+    for id, translation in reminders:
+        cache.put(0, id, translation, render_parts(id, translation))
+
+    # Like chats recovered by the log storage, which are frozen once loaded
+    gc.freeze()
+
+    async def render_with(pool: RenderPool):
+        await compose_messages(views, await pool.render(reminders))
+
+    async def render_cached():
+        slicer = RenderSlicer()
+        parts = []
+
+        for id, translation in reminders:
+            parts.append(cache.get(0, id, translation))
+            await slicer.add(1)
+
+        await compose_messages(views, parts)
+
+    renders = {
+        "event loop": lambda: render_with(inline_pool),
+        f"{workers} workers": lambda: render_with(worker_pool),
+        "render cache": render_cached,
+    }
+
+    for name, render in renders.items():
+        (duration, max_stall) = await measure(render)
+
+        print(
+            f"{name}: {duration * 1000:.0f} ms total, "
+            f"{max_stall * 1000:.1f} ms longest event loop stall"
+        )
+
+    worker_pool.stop()
+
+
+if __name__ == "__main__":
+    count = 10_000 if len(sys.argv) < 2 else int(sys.argv[1])
+    workers = (os.cpu_count() or 2) if len(sys.argv) < 3 else int(sys.argv[2])
+
+    print(f"Reminders: {count}, distinct terms: {TERM_COUNT}")
+
+    asyncio.run(main(count, workers))
@@ -0,0 +1,130 @@
+# Measures translations through the OpenAI transport against the OpenAI
+# stand-in (see 'dev/fake_openai.py') with injected faults: flaky responses
+# (retried), a slow tail (hedged if enabled) and an outage (failing fast once
+# the circuit opens). Reports outcomes, latency percentiles and transport
+# counters per scenario.
+#
+# Usage: python benchmarks/transport.py [request_count] [latency]
+
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import urllib.request
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import translator
+from transport import Transport, UpstreamUnavailable
+
+PORT = 8093
+
+FAKE_OPENAI = os.path.join(os.path.dirname(__file__), "..", "dev", "fake_openai.py")
+
+# Translations running at the same time
+CONCURRENCY = 16
+
+# Scenario -> (injected faults, hedging)
+SCENARIOS = {
+    "healthy": ({}, False),
+    "flaky (30% errors)": ({"failure_rate": 0.3}, False),
+    "slow tail (5% +2s)": ({"slow_rate": 0.05, "slow_latency": 2}, False),
+    "slow tail, hedged": ({"slow_rate": 0.05, "slow_latency": 2}, True),
+    "outage": ({"failure_rate": 1}, False),
+}
+
+NO_FAULTS = {"failure_rate": 0, "slow_rate": 0}
+
+
+def set_faults(faults: dict) -> None:
+    request = urllib.request.Request(
+        f"http://localhost:{PORT}/v1/fake/faults",
+        data=json.dumps({**NO_FAULTS, **faults}).encode(),
+        method="POST",
+    )
+
+    urllib.request.urlopen(request).read()
+
+
+async def translate(term: str) -> tuple[str, float]:
+    started_at = time.perf_counter()
+
+    try:
+        await translator.translate(term, "nl", "en", 3, 1)
+        outcome = "ok"
+    except UpstreamUnavailable:
+        outcome = "unavailable"
+    except TimeoutError:
+        outcome = "timeout"
+
+    return (outcome, time.perf_counter() - started_at)
+
+
+async def run(name: str, count: int, report: bool = True) -> None:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited(term: str) -> tuple[str, float]:
+        async with semaphore:
+            return await translate(term)
+
+    # Terms are unique, so that neither the cache nor coalescing answers them
+    results = await asyncio.gather(*(limited(f"{name} {i}") for i in range(count)))
+
+    if not report:
+        return
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    durations = sorted(duration for _, duration in results)
+
+    p50 = durations[len(durations) // 2]
+    p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+
+    stats = translator.transport.get_stats()
+
+    print(
+        f"{name}: {dict(outcomes)}, "
+        f"p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms, "
+        f"retries {stats['retries']}, hedged {stats['hedged']}, "
+        f"rejected {stats['rejected']}, circuit opens {stats['circuit_opens']}"
+    )
+
+
+async def main(count: int):
+    # The OpenAI SDK is imported with the client, i.e. not during scenarios
+    translator.get_client()
+
+    for name, (faults, hedging) in SCENARIOS.items():
+        set_faults(faults)
+
+        transport = Transport(hedging=hedging)
+
+        # Latencies to hedge after are collected without faults first
+        if hedging:
+            set_faults({})
+            translator.transport = Transport()
+            await run("warm up", 50, report=False)
+            transport.latencies = translator.transport.latencies
+            set_faults(faults)
+
+        translator.transport = transport
+
+        await run(name, count)
+
+
+if __name__ == "__main__":
+    count = 200 if len(sys.argv) < 2 else int(sys.argv[1])
+    latency = "0.2" if len(sys.argv) < 3 else sys.argv[2]
+
+    os.environ["OPENAI_BASE_URL"] = f"http://localhost:{PORT}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    server = subprocess.Popen([sys.executable, FAKE_OPENAI, str(PORT), latency])
+
+    try:
+        time.sleep(1)
+        asyncio.run(main(count))
+    finally:
+        server.terminate()
@@ -0,0 +1,66 @@
+# Runs several bot workers locally in multi-worker mode, together with the
+# Telegram stand-in. Workers share a database in a temporary directory.
+#
+# Usage: python dev/cluster.py [worker_count]
+#
+# Updates sent to the Telegram stand-in (see 'fake_telegram.py') are
+# delivered to the first worker, which forwards them to their owners.
+# Stop a worker (kill its pid) to see its chats being taken over.
+# Set OPENAI_BASE_URL to use the OpenAI stand-in (see 'fake_openai.py').
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+TELEGRAM_PORT = 8081
+
+# Ports of workers are 'WORKER_PORT', 'WORKER_PORT' + 1, ...
+WORKER_PORT = 8100
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def start_worker(index: int, database_path: str) -> subprocess.Popen:
+    port = WORKER_PORT + index
+
+    env = {
+        **os.environ,
+        "TOKEN": "123:fake",
+        "DATABASE_PATH": database_path,
+        "TELEGRAM_API_URL": f"http://localhost:{TELEGRAM_PORT}/bot",
+        "WEBHOOK_URL": f"http://localhost:{WORKER_PORT}/telegram",
+        "WEBHOOK_SECRET": "fake-secret",
+        "WORKER_URL": f"http://localhost:{port}",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "fake"),
+    }
+
+    return subprocess.Popen(
+        [sys.executable, "main.py", str(port)],
+        cwd=os.path.join(ROOT_DIR, "src"),
+        env=env,
+    )
+
+
+if __name__ == "__main__":
+    worker_count = 2 if len(sys.argv) < 2 else int(sys.argv[1])
+    database_path = os.path.join(tempfile.mkdtemp(), "oneling.db")
+
+    telegram = subprocess.Popen(
+        [sys.executable, "fake_telegram.py", str(TELEGRAM_PORT)],
+        cwd=os.path.join(ROOT_DIR, "dev"),
+    )
+
+    time.sleep(1)
+
+    workers = [start_worker(index, database_path) for index in range(worker_count)]
+
+    for index, worker in enumerate(workers):
+        print(f"Worker {index}: port {WORKER_PORT + index}, pid {worker.pid}")
+
+    try:
+        telegram.wait()
+    finally:
+        for process in [*workers, telegram]:
+            process.terminate()
@@ -0,0 +1,379 @@
+# A local stand-in for the OpenAI API, used to run the bot (and the cache
+# prewarming) without OpenAI. Translations are made up from the terms.
+#
+# Usage: python dev/fake_openai.py [port] [latency] [prefill_latency]
+#
+# Run the bot with OPENAI_BASE_URL=http://localhost:{port}/v1 and any
+# OPENAI_API_KEY. Supports chat completions (also streamed), files and
+# batches. Prompt prefixes are cached like by OpenAI (see 'PromptCache'), and
+# 'prefill_latency' is the time taken per 1000 uncached prompt tokens.
+#
+# Faults of chat completions are injected at runtime (e.g. to test retries,
+# hedging and the circuit breaker of the bot) by posting to /fake/faults:
+#
+#   curl localhost:{port}/fake/faults -d '{"failure_rate": 1}'
+#
+# with any of 'failure_rate' and 'failure_status' (of failed completions),
+# 'slow_rate' and 'slow_latency' (extra time taken by slow completions).
+
+import re
+import sys
+import json
+import time
+import uuid
+import email
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Time (in seconds) taken by every chat completion
+LATENCY = 0.0
+
+# Time (in seconds) taken per 1000 uncached prompt tokens, before the first
+# chunk of streamed chat completions (or with the others)
+PREFILL_LATENCY = 0.0
+
+# Number of characters per chunk of streamed chat completions
+STREAM_CHUNK_SIZE = 8
+
+# Rough number of characters per token
+CHARS_PER_TOKEN = 4
+
+# OpenAI caches prompts from 1024 tokens, in increments of 128 tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+
+def fake_translation(term: str, dst_lang: str) -> dict:
+    return {
+        "valid": True,
+        "corrected_term": term,
+        "translations": [
+            {
+                "value": f"{term} ({dst_lang})",
+                "examples": [{"src": f"{term}!", "dst": f"{term} ({dst_lang})!"}],
+            }
+        ],
+        "definition": f"Definition of {term}",
+    }
+
+
+def fake_content(user_message: str) -> str:
+    dst_lang = re.search(r"Destination language: (\w+)", user_message).group(1)
+
+    terms = re.match(r"Terms: (\[.*\]);", user_message)
+
+    if terms:
+        translations = [
+            {"term": term, **fake_translation(term, dst_lang)}
+            for term in json.loads(terms.group(1))
+        ]
+        return json.dumps({"terms": translations})
+
+    term = re.match(r"Term: (.*?); Source language", user_message).group(1)
+
+    return json.dumps(fake_translation(term, dst_lang))
+
+
+def get_prompt(body: dict) -> str:
+    # The response format is part of the prompt, before the messages
+    return json.dumps(body.get("response_format")) + json.dumps(body["messages"])
+
+
+def fake_completion(body: dict) -> dict:
+    user_message = body["messages"][-1]["content"]
+    content = fake_content(user_message)
+
+    prompt = get_prompt(body)
+    prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // CHARS_PER_TOKEN,
+            "total_tokens": prompt_tokens + len(content) // CHARS_PER_TOKEN,
+            "prompt_tokens_details": {
+                "cached_tokens": prompt_cache.lookup(prompt),
+            },
+        },
+    }
+
+
+def fake_completion_chunks(body: dict, completion: dict) -> list[dict]:
+    content = completion["choices"][0]["message"]["content"]
+
+    def chunk(delta: dict, finish_reason: str = None, usage: dict = None) -> dict:
+        choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+
+        return {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+            "choices": [] if usage else [choice],
+            "usage": usage,
+        }
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+
+    for i in range(0, len(content), STREAM_CHUNK_SIZE):
+        chunks.append(chunk({"content": content[i : i + STREAM_CHUNK_SIZE]}))
+
+    chunks.append(chunk({}, "stop"))
+
+    if body.get("stream_options", {}).get("include_usage"):
+        chunks.append(chunk({}, usage=completion["usage"]))
+
+    return chunks
+
+
+class PromptCache:
+    # Remembers prompt prefixes (of whole increments) and returns the number
+    # of tokens of the longest one cached already
+
+    def __init__(self):
+        self.prefixes: set[int] = set()
+        self.lock = threading.Lock()
+
+    def lookup(self, prompt: str) -> int:
+        min_length = PROMPT_CACHE_MIN_TOKENS * CHARS_PER_TOKEN
+        increment = PROMPT_CACHE_INCREMENT * CHARS_PER_TOKEN
+
+        cached_length = 0
+        cached = True
+
+        with self.lock:
+            for length in range(min_length, len(prompt) + 1, increment):
+                prefix = hash(prompt[:length])
+
+                # Cached up to the first prefix not seen before
+                cached = cached and prefix in self.prefixes
+
+                if cached:
+                    cached_length = length
+
+                self.prefixes.add(prefix)
+
+        return cached_length // CHARS_PER_TOKEN
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.files: dict[str, dict] = {}
+        self.batches: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+        # Injected faults of chat completions (see '/fake/faults')
+        self.faults = {
+            "failure_rate": 0.0,
+            "failure_status": 503,
+            "slow_rate": 0.0,
+            "slow_latency": 0.0,
+        }
+
+    def create_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+        with self.lock:
+            self.files[file["id"]] = {**file, "content": content}
+
+        return file
+
+    def create_batch(self, body: dict) -> dict:
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+        }
+
+        with self.lock:
+            self.batches[batch["id"]] = batch
+
+        threading.Thread(target=self.run_batch, args=(batch,)).start()
+
+        return batch
+
+    def run_batch(self, batch: dict) -> None:
+        content = self.files[batch["input_file_id"]]["content"].decode()
+        results = []
+
+        for line in content.splitlines():
+            request = json.loads(line)
+            response = {"status_code": 200, "body": fake_completion(request["body"])}
+            results.append({"custom_id": request["custom_id"], "response": response})
+
+        output = "\n".join(json.dumps(result) for result in results).encode()
+        output_file = self.create_file("output.jsonl", "batch_output", output)
+
+        with self.lock:
+            batch["output_file_id"] = output_file["id"]
+            batch["status"] = "completed"
+
+
+openai = FakeOpenAI()
+
+prompt_cache = PromptCache()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # Connections are kept alive (like by OpenAI), so clients pool them
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.removeprefix("/v1")
+
+        if match := re.fullmatch(r"/batches/([\w-]+)", path):
+            self.respond(openai.batches.get(match.group(1)))
+        elif match := re.fullmatch(r"/files/([\w-]+)/content", path):
+            file = openai.files.get(match.group(1))
+            self.respond_bytes(file["content"] if file else None)
+        else:
+            self.respond(None)
+
+    def do_POST(self):
+        path = self.path.removeprefix("/v1")
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        match path:
+            case "/chat/completions":
+                self.complete(json.loads(body))
+            case "/files":
+                self.respond(self.create_file(body))
+            case "/batches":
+                self.respond(openai.create_batch(json.loads(body)))
+            case "/fake/faults":
+                openai.faults.update(json.loads(body))
+                self.respond(openai.faults)
+            case _:
+                self.respond(None)
+
+    def complete(self, body: dict) -> None:
+        faults = openai.faults
+
+        if random.random() < faults["slow_rate"]:
+            time.sleep(faults["slow_latency"])
+
+        if random.random() < faults["failure_rate"]:
+            self.respond_error(faults["failure_status"], "Injected failure")
+            return
+
+        completion = fake_completion(body)
+
+        usage = completion["usage"]
+        uncached_tokens = usage["prompt_tokens"] - usage["prompt_tokens_details"]["cached_tokens"]
+
+        time.sleep(PREFILL_LATENCY * uncached_tokens / 1000)
+
+        if not body.get("stream"):
+            time.sleep(LATENCY)
+            self.respond(completion)
+            return
+
+        # The latency is spread over the chunks of streamed completions
+        chunks = fake_completion_chunks(body, completion)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        for chunk in chunks:
+            time.sleep(LATENCY / len(chunks))
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def create_file(self, body: bytes) -> dict:
+        # The multipart body is parsed as a MIME message with its content type
+        headers = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n"
+        message = email.message_from_bytes(headers.encode() + body)
+
+        fields = {
+            part.get_param("name", header="content-disposition"): part
+            for part in message.get_payload()
+        }
+
+        file = fields["file"]
+        purpose = fields["purpose"].get_payload(decode=True).decode()
+
+        return openai.create_file(
+            file.get_filename(), purpose, file.get_payload(decode=True)
+        )
+
+    def respond(self, data: dict | None) -> None:
+        if data is None:
+            self.respond_bytes(None)
+        else:
+            self.respond_bytes(json.dumps(data).encode(), "application/json")
+
+    def respond_error(self, status: int, message: str) -> None:
+        body = json.dumps({"error": {"message": message, "type": "server_error"}})
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def respond_bytes(
+        self, body: bytes | None, content_type: str = "application/octet-stream"
+    ) -> None:
+        if body is None:
+            (status, body) = (404, b'{"error": {"message": "Not found"}}')
+        else:
+            status = 200
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_one_request(self):
+        # Clients may give up on requests (e.g. hedged ones) before they end
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    port = 8082 if len(sys.argv) < 2 else int(sys.argv[1])
+    LATENCY = 0.0 if len(sys.argv) < 3 else float(sys.argv[2])
+    PREFILL_LATENCY = 0.0 if len(sys.argv) < 4 else float(sys.argv[3])
+
+    # Many clients may connect at once (e.g. to test connection pools)
+    ThreadingHTTPServer.request_queue_size = 128
+    ThreadingHTTPServer(("0.0.0.0", port), RequestHandler).serve_forever()
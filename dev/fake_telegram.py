@@ -0,0 +1,201 @@
+# A local stand-in for the Telegram Bot API, used to run the bot without
+# Telegram (e.g. to try out 'webhook' mode).
+#
+# Usage: python dev/fake_telegram.py [port]
+#
+# Run the bot with TELEGRAM_API_URL=http://localhost:{port}/bot, then:
+# - POST /send {"chat_id": 1, "text": "huis"} sends a message to the bot
+# - POST /send {"chat_id": 1, "callback_data": "stop|0"} presses a button
+# - GET /messages lists messages sent by the bot
+
+import sys
+import json
+import time
+import queue
+import itertools
+import threading
+import urllib.request
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Oneling", "username": "onelingbot"}
+
+# Max time (in seconds) to hold a 'getUpdates' request without updates
+POLLING_TIMEOUT = 10
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.webhook_url: str | None = None
+        self.secret_token: str | None = None
+
+        self.updates: queue.Queue[dict] = queue.Queue()
+        self.messages: list[dict] = []
+
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------
+    #  @user_side
+    # ----------------------------------------------------------------
+
+    def send(self, data: dict) -> dict:
+        chat = {"id": data["chat_id"], "type": "private"}
+        user = {"id": data["chat_id"], "is_bot": False, "first_name": "User"}
+
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": chat,
+            "from": user,
+        }
+
+        if "callback_data" in data:
+            update = {
+                "callback_query": {
+                    "id": str(next(self.update_ids)),
+                    "from": user,
+                    "chat_instance": str(data["chat_id"]),
+                    "message": {**message, "from": BOT_USER, "text": "-"},
+                    "data": data["callback_data"],
+                }
+            }
+        else:
+            message["text"] = data["text"]
+
+            if data["text"].startswith("/"):
+                command_length = len(data["text"].split()[0])
+                message["entities"] = [
+                    {"type": "bot_command", "offset": 0, "length": command_length}
+                ]
+
+            update = {"message": message}
+
+        update["update_id"] = next(self.update_ids)
+
+        if self.webhook_url:
+            self.deliver(update)
+        else:
+            self.updates.put(update)
+
+        return update
+
+    def deliver(self, update: dict) -> None:
+        request = urllib.request.Request(
+            self.webhook_url,
+            data=json.dumps(update).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "X-Telegram-Bot-Api-Secret-Token": self.secret_token or "",
+            },
+        )
+        urllib.request.urlopen(request).close()
+
+    # ----------------------------------------------------------------
+    #  @bot_api
+    # ----------------------------------------------------------------
+
+    def call(self, method: str, params: dict) -> object:
+        match method:
+            case "getMe":
+                return BOT_USER
+            case "setWebhook":
+                self.webhook_url = params["url"]
+                self.secret_token = params.get("secret_token")
+                return True
+            case "deleteWebhook":
+                self.webhook_url = None
+                return True
+            case "getUpdates":
+                return self.get_updates(float(params.get("timeout", 0)))
+            case "sendMessage" | "editMessageText":
+                return self.save_message(method, params)
+            case _:
+                return True
+
+    def get_updates(self, timeout: float) -> list[dict]:
+        try:
+            updates = [self.updates.get(timeout=min(timeout, POLLING_TIMEOUT))]
+        except queue.Empty:
+            return []
+
+        while not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+
+        return updates
+
+    def save_message(self, method: str, params: dict) -> dict:
+        message = {
+            "message_id": params.get("message_id") or next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "text": params["text"],
+        }
+
+        with self.lock:
+            self.messages.append({"method": method, **params})
+
+        print(f"[{method}] {params['chat_id']}: {params['text']}", flush=True)
+
+        return message
+
+
+telegram = FakeTelegram()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/messages":
+            with telegram.lock:
+                self.respond(200, telegram.messages)
+        else:
+            self.respond(404, {"ok": False})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode()
+
+        if self.path == "/send":
+            self.respond(200, telegram.send(json.loads(body)))
+            return
+
+        # Bot API paths look like '/bot{token}/{method}'
+        method = self.path.rsplit("/", 1)[-1]
+        params = self.parse_params(body)
+
+        self.respond(200, {"ok": True, "result": telegram.call(method, params)})
+
+    def parse_params(self, body: str) -> dict:
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or "{}")
+
+        params = {}
+
+        # Values are JSON-encoded, except for plain strings
+        for key, value in parse_qsl(body):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+
+        return params
+
+    def respond(self, status: int, data: object) -> None:
+        body = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    port = 8081 if len(sys.argv) == 1 else int(sys.argv[1])
+    ThreadingHTTPServer(("0.0.0.0", port), RequestHandler).serve_forever()
@@ -1,9 +1,17 @@
+import os
+import html
 import time
+import signal
+import asyncio
+import threading
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.error import Conflict, NetworkError
+from telegram.constants import ChatAction
+from telegram.error import Conflict, Forbidden, NetworkError
 from telegram.ext import (
     filters,
+    Application,
+    JobQueue,
     MessageHandler,
     ApplicationBuilder,
     CallbackQueryHandler,
@@ -12,8 +20,27 @@ from telegram.ext import (
 )
 
 from models import Reminder, Chat, Dictionary, Translation, Example
-from translator import translate
-from utils import time_to_str, str_to_time
+import startup
+import translator
+from prewarm import CachePrewarmer
+from render import (
+    RenderCache,
+    RenderPool,
+    RenderSlicer,
+    RenderedMessage,
+    ReminderParts,
+    ReminderView,
+    compose_message,
+    compose_reminder,
+    str_translation,
+    to_2d,
+)
+from translator import translate, translate_many
+from transport import UpstreamUnavailable
+from sender import MessageEditor, MessageSender, INTERACTIVE, SCHEDULED
+from update_processor import ChatUpdateProcessor
+from utils import time_to_str, str_to_time, split_values
+from webhook import WebhookReceiver, get_update_chat_id
 
 type CallbackArgs = tuple[Update, ContextTypes.DEFAULT_TYPE, list[str]]
 
@@ -32,6 +59,45 @@ EXAMPLES_PER_TRANSLATION = 1
 
 MAX_VALUE_LENGTH = 100
 
+# Reply while OpenAI is failing (cached and local translations still work)
+TRANSLATION_UNAVAILABLE_MESSAGE = (
+    "Translating is not available right now. Try again later"
+)
+
+# Reply on unexpected errors (which are reported to the developer)
+TRANSLATION_FAILED_MESSAGE = "Something went wrong while translating. Try again"
+
+# Max number of words or phrases added by a single message
+MAX_VALUES_PER_MESSAGE = 50
+
+# Max number of updates handled at the same time (e.g. during translations),
+# of which only one per chat (see 'ChatUpdateProcessor')
+MAX_CONCURRENT_UPDATES = 64
+
+# Max number of reminder messages being sent at the same time
+MAX_CONCURRENT_REMINDER_SENDS = 256
+
+# Max number of reminders sent in one message (when due at the same time)
+MAX_REMINDERS_PER_MESSAGE = 10
+
+# Upper bound for the reminder caller sleep (e.g. to survive clock changes)
+REMINDER_CALLER_MAX_DELAY = 600
+
+# Number of processes rendering reminder messages off the event loop
+# (if 0, messages are rendered by the event loop itself)
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0))
+
+# Hedge slow OpenAI requests with a second one (after the 95th percentile of
+# recent latencies), at the cost of the extra requests
+OPENAI_HEDGING = os.environ.get("OPENAI_HEDGING") == "1"
+
+# Directory with seed word lists to prewarm the translation cache with
+# (otherwise only recent cache misses are prewarmed)
+PREWARM_SEED_DIR = os.environ.get("PREWARM_SEED_DIR")
+
+# Time (in seconds) between translation cache prewarms
+PREWARM_INTERVAL = 86400
+
 PRIMARY_LANGUAGE = "en"
 
 LANGUAGES = {
@@ -52,10 +118,136 @@ LANGUAGES = {
 #  @repository
 # ----------------------------------------------------------------
 # The repository is used to store user chats & entries.
+# They are persisted to an SQLite database at 'DATABASE_PATH', or with
+# 'STORAGE=log' to a log of changes and snapshots next to 'DATABASE_PATH'.
 
 from repository import Repository
+from storage import SqliteStorage
+from log_storage import LogStorage
+
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "oneling.db")
+
+STORAGE = os.environ.get("STORAGE", "sqlite")
+
+repository = Repository(
+    LogStorage(DATABASE_PATH) if STORAGE == "log" else SqliteStorage(DATABASE_PATH)
+)
+
+# ----------------------------------------------------------------
+#  @cluster
+# ----------------------------------------------------------------
+# In multi-worker mode, chats are partitioned between workers sharing the
+# database. Each worker only handles updates and reminders of its chats.
+
+from cluster import Cluster, get_shard
+
+cluster: Cluster | None = None
+
+
+def enable_cluster(worker_url: str) -> Cluster:
+    global cluster
+
+    cluster = Cluster(
+        DATABASE_PATH,
+        worker_url,
+        worker_url,
+        on_acquire=acquire_shards,
+        on_release=release_shards,
+    )
+
+    return cluster
+
+
+def acquire_shards(shards: set[int]) -> None:
+    in_shards = lambda chat_id: get_shard(chat_id) in shards
+
+    # Chats may have changed while they were owned by other workers
+    repository.unload_chats(in_shards)
+    repository.load_schedule(in_shards)
+
+
+def release_shards(shards: set[int]) -> None:
+    repository.unload_chats(lambda chat_id: get_shard(chat_id) in shards)
+
+
+def route_update(data: dict) -> str | None:
+    chat_id = get_update_chat_id(data)
+
+    if not cluster or chat_id is None:
+        return None
+
+    return cluster.get_owner_url(chat_id)
+
+
+# ----------------------------------------------------------------
+#  @translation_backends
+# ----------------------------------------------------------------
+# Terms are translated by the first tier knowing them: local dictionaries
+# (memory-mapped indexes built by 'local_dictionary.py', one per language
+# pair in 'LOCAL_DICTIONARY_DIR'), the translation cache and OpenAI.
+
+from local_dictionary import LocalDictionaries
+
+LOCAL_DICTIONARY_DIR = os.environ.get("LOCAL_DICTIONARY_DIR")
+
+local_dictionaries = (
+    LocalDictionaries(LOCAL_DICTIONARY_DIR) if LOCAL_DICTIONARY_DIR else None
+)
+
+if local_dictionaries:
+    translator.add_backend(local_dictionaries)
+
+# ----------------------------------------------------------------
+#  @sender
+# ----------------------------------------------------------------
+# The sender is used to send messages within Telegram rate limits.
 
-repository = Repository()
+sender = MessageSender()
+
+
+async def send_reply(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs
+):
+    # Replies to the chat of the update, like other messages through the sender
+    return await sender.send_message(
+        context.bot, update.effective_chat.id, text, **kwargs
+    )
+
+
+# ----------------------------------------------------------------
+#  @rendering
+# ----------------------------------------------------------------
+# The render cache keeps rendered parts of reminders, so that sending them
+# mostly joins precomputed strings. Missing parts of big reminder waves are
+# rendered in other processes by the render pool.
+
+render_cache = RenderCache()
+
+render_pool = RenderPool(RENDER_WORKERS)
+
+# ----------------------------------------------------------------
+#  @metrics
+# ----------------------------------------------------------------
+
+import metrics
+
+metrics.chats.set_function(lambda: len(repository.chats))
+metrics.active_reminders.set_function(lambda: len(repository.scheduler))
+
+metrics.register_stats(
+    "sender", sender.get_stats, counters={"sent", "retries", "failed"}
+)
+
+metrics.register_stats(
+    "render_cache", render_cache.get_stats, counters={"hits", "misses"}
+)
+
+if local_dictionaries:
+    metrics.register_stats(
+        "local_dictionary",
+        local_dictionaries.get_stats,
+        counters={"hits", "misses"},
+    )
 
 # ----------------------------------------------------------------
 #  @logging
@@ -75,30 +267,20 @@ logger = logging.getLogger(__name__)
 # ----------------------------------------------------------------
 
 
-def get_chat(update: Update) -> Chat:
-    return repository.get_chat(update.effective_chat.id)
-
-
-def to_2d(values: list) -> list[list]:
-    return [values[i : i + 2] for i in range(0, len(values), 2)]
-
+def timed(name: str, callback: callable) -> callable:
+    async def timed_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with metrics.handler_latency.labels(name).time():
+            return await callback(update, context)
 
-def str_dst_values(dst_values: list[str]) -> str:
-    return " / ".join(dst_values)
+    return timed_callback
 
 
-def str_translation(translation: Translation) -> str:
-    dst_str = str_dst_values(translation.get_dst_values())
-    return f"<b>{translation.src}</b> - {dst_str}"
+def command_handler(command: str, callback: callable) -> CommandHandler:
+    return CommandHandler(command, timed(command, callback))
 
 
-def str_examples(examples: list[Example]) -> str:
-    result = [
-        f"<b>{idx + 1}. {example.src}</b>\nTranslation: {example.dst}\n"
-        for idx, example in enumerate(examples)
-    ]
-    result = "\n".join(result)
-    return result
+def get_chat(update: Update) -> Chat:
+    return repository.get_chat(update.effective_chat.id)
 
 
 # ----------------------------------------------------------------
@@ -114,15 +296,18 @@ I can help you learn and remember words or phrases in different languages. By se
 <b>🔔 To manage reminders:</b>
 /show_reminders - show all reminders
 /clear_reminders - clear all reminders
+/add_many - add many reminders at once
 
-To set a new reminder, simply type the word or phrase you want to remember directly in the chat.
+To set a new reminder, simply type the word or phrase you want to remember directly in the chat. To set many reminders, put each word or phrase on a new line.
 
 <b>⏰ To manage intervals:</b>
 /show_intervals - show current intervals
 /set_intervals - set new intervals
 /reset_intervals - reset intervals to default values
 
-Note: Changing intervals will automatically clear all existing reminders, as they rely on the previous intervals.
+Every reminder has "Knew it" and "Forgot" buttons: reminders you know come less often, and reminders you forgot start over.
+
+Note: Changing intervals moves existing reminders to the new intervals, keeping their progress.
 
 <b>🌐 To manage dictionary:</b>
 /show_dictionary - show current dictionary
@@ -139,13 +324,13 @@ Intervals: {str_intervals(chat.reminder_intervals)}
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = get_chat(update)
 
-    await update.message.reply_text(get_help_message(chat), parse_mode="HTML")
+    await send_reply(update, context, get_help_message(chat), parse_mode="HTML")
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = get_chat(update)
 
-    await update.message.reply_text(get_help_message(chat), parse_mode="HTML")
+    await send_reply(update, context, get_help_message(chat), parse_mode="HTML")
 
 
 # ----------------------------------------------------------------
@@ -156,24 +341,24 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def switch_dictionary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = get_chat(update)
 
-    dictionary = Dictionary(chat.dictionary.dst, chat.dictionary.src)
+    dictionary = Dictionary.of(chat.dictionary.dst, chat.dictionary.src)
 
     repository.update_dictionary(chat.id, dictionary)
 
-    await update.message.reply_text(
-        f'Dictionary is set to "{str_dictionary(dictionary)}"'
+    await send_reply(
+        update, context, f'Dictionary is set to "{str_dictionary(dictionary)}"'
     )
 
 
 async def show_dictionary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = get_chat(update)
 
-    await update.message.reply_text(str_dictionary(chat.dictionary))
+    await send_reply(update, context, str_dictionary(chat.dictionary))
 
 
 async def choose_dictionary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     dictionaries = [
-        Dictionary(language, PRIMARY_LANGUAGE)
+        Dictionary.of(language, PRIMARY_LANGUAGE)
         for language in LANGUAGES
         if language != PRIMARY_LANGUAGE
     ]
@@ -188,7 +373,9 @@ async def choose_dictionary_command(update: Update, context: ContextTypes.DEFAUL
 
     keyboard = InlineKeyboardMarkup(to_2d(buttons))
 
-    await update.message.reply_text(
+    await send_reply(
+        update,
+        context,
         "Please choose a dictionary. You can also switch source and destination languages with /switch_dictionary",
         reply_markup=keyboard,
     )
@@ -202,12 +389,12 @@ async def dictionary_callback(args: CallbackArgs):
     src = data[1]
     dst = data[2]
 
-    dictionary = Dictionary(src, dst)
+    dictionary = Dictionary.of(src, dst)
 
     repository.update_dictionary(chat_id, dictionary)
 
-    await context.bot.send_message(
-        chat_id, f'Dictionary is set to "{str_dictionary(dictionary)}"'
+    await sender.send_message(
+        context.bot, chat_id, f'Dictionary is set to "{str_dictionary(dictionary)}"'
     )
 
 
@@ -237,30 +424,30 @@ async def show_intervals_command(update: Update, context: ContextTypes.DEFAULT_T
     intervals = get_chat(update).reminder_intervals
     message = "Current intervals: " + str_intervals(intervals)
 
-    await update.message.reply_text(message)
+    await send_reply(update, context, message)
 
 
 async def set_intervals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     intervals = [str_to_time(arg) for arg in context.args]
 
     if len(intervals) == 0:
-        await update.message.reply_text(set_intervals_usage)
+        await send_reply(update, context, set_intervals_usage)
         return
 
     are_invalid = any(time == -1 for time in intervals)
 
     if are_invalid:
-        await update.message.reply_text("Invalid intervals. Try again")
-        await update.message.reply_text(set_intervals_usage)
+        await send_reply(update, context, "Invalid intervals. Try again")
+        await send_reply(update, context, set_intervals_usage)
         return
 
     chat_id = update.effective_chat.id
 
     repository.update_reminder_intervals(chat_id, intervals)
 
-    await update.message.reply_text(
-        "Success! Intervals are updated to: " + str_intervals(intervals)
-    )
+    message = "Success! Intervals are updated to: " + str_intervals(intervals)
+
+    await send_reply(update, context, message)
 
 
 async def reset_intervals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -268,7 +455,9 @@ async def reset_intervals_command(update: Update, context: ContextTypes.DEFAULT_
 
     repository.update_reminder_intervals(chat_id, DEFAULT_REMINDER_INTERVALS)
 
-    await update.message.reply_text(
+    await send_reply(
+        update,
+        context,
         f"Intervals are reset to default values: {str_intervals(DEFAULT_REMINDER_INTERVALS)}"
     )
 
@@ -291,7 +480,7 @@ async def show_reminders_command(update: Update, context: ContextTypes.DEFAULT_T
     reminders = repository.get_active_reminders(chat.id)
 
     if not reminders:
-        await update.message.reply_text("You have no active reminders")
+        await send_reply(update, context, "You have no active reminders")
         return
 
     reminders = [
@@ -300,7 +489,7 @@ async def show_reminders_command(update: Update, context: ContextTypes.DEFAULT_T
     ]
     reminders = "\n".join(reminders)
 
-    await update.message.reply_text(reminders, parse_mode="HTML")
+    await send_reply(update, context, reminders, parse_mode="HTML")
 
 
 async def clear_reminders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -308,7 +497,7 @@ async def clear_reminders_command(update: Update, context: ContextTypes.DEFAULT_
 
     repository.clear_reminders(chat_id)
 
-    await update.message.reply_text("You no longer have any reminders")
+    await send_reply(update, context, "You no longer have any reminders")
 
 
 # ----------------------------------------------------------------
@@ -321,37 +510,80 @@ async def create_reminder_command(
 ):
     chat = get_chat(update)
 
-    # If the reminder already exists, reset it
+    # If the reminder already exists, it starts over (like a new one)
     reminder = repository.get_reminder_by_value(chat.id, value, chat.dictionary)
 
     if reminder:
-        reminder.last_at = time.time()
-        reminder.left = len(chat.reminder_intervals)
+        repository.restart_reminder(chat.id, reminder.id)
 
-        repository.update_reminder(chat.id, reminder)
+        await send_reminder(context, chat, reminder, INTERACTIVE)
+        return
 
-    # If the reminder does not exist, create a new one
-    else:
-        reminder = await create_reminder(update, chat, value)
+    # If the reminder does not exist, create a new one. Unless the translation
+    # is cached, it's streamed into a placeholder message as it's generated
+    editor = None
+    cached = get_cached_translation(chat, value)
 
-        if not reminder or len(reminder.translation.dst) == 0:
-            await update.message.reply_text(
-                f'The value "{value}" is not valid. Try again'
-            )
-            return
+    if cached is None:
+        editor = await send_translation_placeholder(context, chat, value)
+
+    async def reply(text: str):
+        if editor:
+            await editor.finish(text)
+        else:
+            await send_reply(update, context, text)
 
-        repository.save_reminder(chat.id, reminder)
+    try:
+        reminder = await create_reminder(update, chat, value, editor, cached)
 
-    await send_reminder(context, chat, reminder)
+    except TimeoutError:
+        await reply(f'Translating "{value}" took too long. Try again later')
+        return
 
+    except UpstreamUnavailable:
+        await reply(TRANSLATION_UNAVAILABLE_MESSAGE)
+        return
 
-async def create_reminder(update: Update, chat: Chat, value: str):
-    translation = translate(
+    except Exception:
+        # Never leaves the placeholder on "Translating...", and the error is
+        # still handled by the error handler
+        await reply(TRANSLATION_FAILED_MESSAGE)
+        raise
+
+    if not reminder or len(reminder.translation.dst) == 0:
+        await reply(f'The value "{value}" is not valid. Try again')
+        return
+
+    repository.save_reminder(chat.id, reminder)
+
+    if editor:
+        [[(text, rows)]] = await render_reminders([(chat, [reminder])])
+        keyboard = keyboard_markup(rows)
+
+        await editor.finish(text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await send_reminder(context, chat, reminder, INTERACTIVE)
+
+
+async def create_reminder(
+    update: Update,
+    chat: Chat,
+    value: str,
+    editor: MessageEditor = None,
+    cached: Translation | object | None = translator.NOT_LOOKED_UP,
+):
+    async def show_partial_translation(translation: Translation):
+        text = f"{str_translation(translation)}\n\n<i>Translating...</i>"
+        editor.edit(text, parse_mode="HTML")
+
+    translation = await translate(
         value,
         chat.dictionary.src,
         chat.dictionary.dst,
         TRANSLATIONS_PER_REMINDER,
         EXAMPLES_PER_TRANSLATION,
+        on_partial=show_partial_translation if editor else None,
+        cached=cached,
     )
 
     if not translation:
@@ -362,7 +594,150 @@ async def create_reminder(update: Update, chat: Chat, value: str):
     last_at = time.time()
     left = len(chat.reminder_intervals)
 
-    return Reminder(id, last_at, left, translation, chat.dictionary)
+    return Reminder(id, last_at, left, translation, chat.dictionary, value)
+
+
+def get_cached_translation(chat: Chat, value: str) -> Translation | object | None:
+    return translator.get_cached(
+        value,
+        chat.dictionary.src,
+        chat.dictionary.dst,
+        TRANSLATIONS_PER_REMINDER,
+        EXAMPLES_PER_TRANSLATION,
+    )
+
+
+async def send_translation_placeholder(
+    context: ContextTypes.DEFAULT_TYPE, chat: Chat, value: str
+) -> MessageEditor:
+    text = f'Translating "{value}"...'
+    message = await sender.send_message(context.bot, chat.id, text)
+
+    # Shows that the bot is typing while the translation is streamed
+    context.application.create_task(
+        context.bot.send_chat_action(chat.id, ChatAction.TYPING)
+    )
+
+    return MessageEditor(sender, message)
+
+
+# ----------------------------------------------------------------
+#  @bulk_reminder_creation
+# ----------------------------------------------------------------
+
+add_many_usage = """
+
+Usage: /add_many {words or phrases}
+
+Put each word or phrase on a new line, e.g.
+
+/add_many huis
+boom
+goedemorgen
+
+"""
+
+
+async def add_many_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # The command is followed by a space or a new line
+    text = update.message.text.split(maxsplit=1)
+
+    values = split_values(text[1]) if len(text) > 1 else []
+
+    if len(values) == 0:
+        await send_reply(update, context, add_many_usage)
+        return
+
+    await create_reminders_command(update, context, values)
+
+
+async def create_reminders_command(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, values: list[str]
+):
+    chat = get_chat(update)
+
+    if len(values) > MAX_VALUES_PER_MESSAGE:
+        await send_reply(
+            update,
+            context,
+            f"Too many words or phrases. Add up to {MAX_VALUES_PER_MESSAGE} at once",
+        )
+        return
+
+    known_values = []
+    invalid_values = [value for value in values if len(value) > MAX_VALUE_LENGTH]
+    new_values = []
+
+    for value in values:
+        if len(value) > MAX_VALUE_LENGTH:
+            continue
+
+        if repository.get_reminder_by_value(chat.id, value, chat.dictionary):
+            known_values.append(value)
+        else:
+            new_values.append(value)
+
+    try:
+        translations = await translate_many(
+            new_values,
+            chat.dictionary.src,
+            chat.dictionary.dst,
+            TRANSLATIONS_PER_REMINDER,
+            EXAMPLES_PER_TRANSLATION,
+        )
+
+    except TimeoutError:
+        await send_reply(update, context, "Translating took too long. Try again later")
+        return
+
+    except UpstreamUnavailable:
+        await send_reply(update, context, TRANSLATION_UNAVAILABLE_MESSAGE)
+        return
+
+    reminders = []
+
+    last_at = time.time()
+    left = len(chat.reminder_intervals)
+
+    for value, translation in zip(new_values, translations):
+        if not translation or len(translation.dst) == 0:
+            invalid_values.append(value)
+            continue
+
+        id = chat.reminder_next_id + len(reminders)
+        reminder = Reminder(id, last_at, left, translation, chat.dictionary, value)
+
+        reminders.append(reminder)
+
+    repository.save_reminders(chat.id, reminders)
+
+    await send_reply(
+        update,
+        context,
+        str_created_reminders(reminders, known_values, invalid_values),
+        parse_mode="HTML",
+    )
+
+
+def str_created_reminders(
+    reminders: list[Reminder], known_values: list[str], invalid_values: list[str]
+) -> str:
+    result = []
+
+    if reminders:
+        result.append("New reminders:")
+        result.extend(
+            f"{idx + 1}. {str_translation(reminder.translation)}"
+            for idx, reminder in enumerate(reminders)
+        )
+
+    if known_values:
+        result.append(f"\nAlready added: {html.escape(', '.join(known_values))}")
+
+    if invalid_values:
+        result.append(f"\nNot valid: {html.escape(', '.join(invalid_values))}")
+
+    return "\n".join(result).strip()
 
 
 # ----------------------------------------------------------------
@@ -371,79 +746,180 @@ async def create_reminder(update: Update, chat: Chat, value: str):
 
 
 async def send_reminder(
-    context: ContextTypes.DEFAULT_TYPE, chat: Chat, reminder: Reminder
+    context: ContextTypes.DEFAULT_TYPE,
+    chat: Chat,
+    reminder: Reminder,
+    priority: int = SCHEDULED,
 ):
-    text = str_reminder(chat, reminder)
-    keyboard = reminder_keyboard(reminder)
+    await send_reminders(context, chat, [reminder], priority)
 
-    await context.bot.send_message(
-        chat_id=chat.id, text=text, reply_markup=keyboard, parse_mode="HTML"
-    )
 
+async def send_reminders(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat: Chat,
+    reminders: list[Reminder],
+    priority: int = SCHEDULED,
+):
+    [messages] = await render_reminders([(chat, reminders)])
+    await send_rendered_messages(context, chat, messages, priority)
 
-def str_reminder(chat: Chat, reminder: Reminder) -> str:
-    translation_str = str_translation(reminder.translation)
-    left_str = str_reminder_left(chat, reminder)
 
-    return f"{translation_str}\n\n{left_str}"
+async def send_rendered_messages(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat: Chat,
+    messages: list[RenderedMessage],
+    priority: int = SCHEDULED,
+):
+    for text, rows in messages:
+        keyboard = keyboard_markup(rows)
 
+        await sender.send_message(
+            context.bot, chat.id, text, priority, reply_markup=keyboard, parse_mode="HTML"
+        )
 
-def str_reminder_left(chat: Chat, reminder: Reminder) -> str:
-    if reminder.left == 0:
-        return "** last reminder **"
 
-    next_reminder_str = time_to_str(chat.get_reminder_interval(reminder))
+async def render_reminders(
+    chat_reminders: list[tuple[Chat, list[Reminder]]],
+) -> list[list[RenderedMessage]]:
+    # Returns messages of every chat, rendering parts missing in the cache.
+    # Big waves are rendered in slices, letting the event loop send messages.
+    slicer = RenderSlicer()
+    parts = []
+
+    for chat, reminders in chat_reminders:
+        parts.append(
+            [
+                render_cache.get(chat.id, reminder.id, reminder.translation)
+                for reminder in reminders
+            ]
+        )
+
+        await slicer.add(len(reminders))
+
+    missing = [
+        (chat, reminder, chat_parts, idx)
+        for (chat, reminders), chat_parts in zip(chat_reminders, parts)
+        for idx, reminder in enumerate(reminders)
+        if chat_parts[idx] is None
+    ]
+
+    if missing:
+        rendered = await render_pool.render(
+            [(reminder.id, reminder.translation) for _, reminder, _, _ in missing]
+        )
+
+        for (chat, reminder, chat_parts, idx), reminder_parts in zip(missing, rendered):
+            render_cache.put(chat.id, reminder.id, reminder.translation, reminder_parts)
+            chat_parts[idx] = reminder_parts
+
+            await slicer.add(1)
+
+    messages = []
+
+    for (chat, reminders), chat_parts in zip(chat_reminders, parts):
+        messages.append(get_reminder_messages(chat, reminders, chat_parts))
+        await slicer.add(len(reminders))
+
+    return messages
 
-    return "Next reminder in: {}\nReminders left: {}/{}".format(
-        next_reminder_str, reminder.left, len(chat.reminder_intervals)
-    )
 
+def get_reminder_messages(
+    chat: Chat, reminders: list[Reminder], parts: list[ReminderParts]
+) -> list[RenderedMessage]:
+    composed = [
+        compose_reminder(get_reminder_view(chat, reminder), reminder_parts)
+        for reminder, reminder_parts in zip(reminders, parts)
+    ]
 
-def reminder_keyboard(reminder: Reminder) -> InlineKeyboardMarkup:
-    buttons = []
+    # Reminders due at the same time are sent in batches
+    return [
+        compose_message(composed[i : i + MAX_REMINDERS_PER_MESSAGE])
+        for i in range(0, len(composed), MAX_REMINDERS_PER_MESSAGE)
+    ]
 
-    # Definition button
-    if reminder.translation.definition:
-        data = f"definition|{reminder.id}"
-        btn = InlineKeyboardButton("Definition", callback_data=data)
-        buttons.append(btn)
 
-    # Examples button
-    if len(reminder.translation.get_examples()) > 0:
-        data = f"examples|{reminder.id}"
-        btn = InlineKeyboardButton("Examples", callback_data=data)
-        buttons.append(btn)
+def get_reminder_view(chat: Chat, reminder: Reminder) -> ReminderView:
+    next_interval = chat.get_reminder_interval(reminder) if reminder.left > 0 else -1
 
-    # Stop button
-    if reminder.left > 0:
-        data = f"stop|{reminder.id}"
-        btn = InlineKeyboardButton("Stop Reminder", callback_data=data)
-        buttons.append(btn)
+    return (
+        reminder.id,
+        reminder.translation,
+        reminder.left,
+        len(chat.reminder_intervals),
+        next_interval,
+    )
 
-    return InlineKeyboardMarkup(to_2d(buttons))
+
+def keyboard_markup(rows: list[list[tuple[str, str]]]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton(label, callback_data=data) for label, data in row]
+            for row in rows
+        ]
+    )
 
 
 async def definition_callback(args: CallbackArgs):
     await reminder_callback(
         args,
         repository.get_reminder_by_id,
-        lambda reminder: reminder.translation.definition,
+        lambda reminder: html.escape(reminder.translation.definition),
     )
 
 
 async def examples_callback(args: CallbackArgs):
+    chat_id = args[0].effective_chat.id
+
     await reminder_callback(
         args,
         repository.get_reminder_by_id,
-        lambda reminder: str_examples(reminder.translation.get_examples()),
+        lambda reminder: render_cache.get_examples(
+            chat_id, reminder.id, reminder.translation
+        ),
     )
 
 
+async def review_callback(args: CallbackArgs, knew: bool):
+    (update, context, data) = args
+
+    chat_id = update.effective_chat.id
+    result = repository.review_reminder(chat_id, int(data[1]), knew)
+
+    if not result:
+        await sender.send_message(context.bot, chat_id, "Reminder is not found")
+        return
+
+    (reminder, reviewed) = result
+    src = html.escape(reminder.translation.src)
+
+    if not reviewed:
+        message = f'"{src}" is already reviewed'
+        await sender.send_message(context.bot, chat_id, message, parse_mode="HTML")
+        return
+
+    chat = get_chat(update)
+
+    if reminder.left == 0:
+        message = f'Well done! "{src}" is learned'
+    else:
+        next_due = repository.get_reminder_due(chat, reminder)
+        next_str = time_to_str(max(1, round(next_due - time.time())))
+        message = (
+            f'Well done! Next reminder of "{src}" in {next_str}'
+            if knew
+            else f'"{src}" starts over. Next reminder in {next_str}'
+        )
+
+    await sender.send_message(context.bot, chat_id, message, parse_mode="HTML")
+
+
 async def stop_callback(args: CallbackArgs):
     await reminder_callback(
         args,
         repository.remove_reminder,
-        lambda reminder: f'Reminder "{reminder.translation.src}" is stopped',
+        lambda reminder: (
+            f'Reminder "{html.escape(reminder.translation.src)}" is stopped'
+        ),
     )
 
 
@@ -460,12 +936,12 @@ async def reminder_callback(
     reminder = reminder_action(chat_id, reminder_id)
 
     if not reminder:
-        await context.bot.send_message(chat_id, "Reminder is not found")
+        await sender.send_message(context.bot, chat_id, "Reminder is not found")
         return
 
     message = reminder_message(reminder)
 
-    await context.bot.send_message(chat_id, message, parse_mode="HTML")
+    await sender.send_message(context.bot, chat_id, message, parse_mode="HTML")
 
 
 # ----------------------------------------------------------------
@@ -474,19 +950,168 @@ async def reminder_callback(
 
 
 async def call_reminder(context: ContextTypes.DEFAULT_TYPE):
+    with metrics.reminder_call_duration.time():
+        await call_due_reminders(context)
+
+
+async def call_due_reminders(context: ContextTypes.DEFAULT_TYPE):
     now = time.time()
 
-    for chat in repository.get_all_chats():
-        for reminder in repository.get_active_reminders(chat.id):
+    due_reminders: dict[int, tuple[Chat, list[Reminder]]] = {}
+
+    owns = cluster.owns if cluster else None
+
+    try:
+        for chat, reminder in repository.get_due_reminders(now, owns):
+            # Failed calls are retried later by the repository
+            try:
+                called = repository.handle_reminder_call(chat.id, reminder.id)
+            except Exception:
+                logger.exception(f"Failed to call reminder {reminder.id}")
+                continue
+
+            # The reminder may have been called by another worker already
+            if not called:
+                continue
+
+            (_, reminders) = due_reminders.setdefault(chat.id, (chat, []))
+            reminders.append(reminder)
+
+    finally:
+        # Reminders are handled already, so the next call may overlap with
+        # sending. It's scheduled even after errors, not to stop reminders.
+        schedule_reminder_caller(context.job_queue)
+
+    # Messages of all chats are rendered at once (in the render pool if enabled)
+    chat_reminders = list(due_reminders.values())
+    chat_messages = await render_reminders(chat_reminders)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REMINDER_SENDS)
+
+    async def send(chat: Chat, count: int, messages: list[RenderedMessage]) -> int:
+        async with semaphore:
+            await send_rendered_messages(context, chat, messages)
+            return count
+
+    results = await asyncio.gather(
+        *(
+            send(chat, len(reminders), messages)
+            for (chat, reminders), messages in zip(chat_reminders, chat_messages)
+        ),
+        return_exceptions=True,
+    )
+
+    sent_count = 0
+
+    for result in results:
+        if isinstance(result, int):
+            sent_count += result
+        elif not isinstance(result, Forbidden):
+            logger.error("Failed to send reminders :: ", exc_info=result)
+
+    due_count = sum(len(reminders) for _, reminders in due_reminders.values())
+
+    metrics.reminders_due.observe(due_count)
+    metrics.reminders_sent.observe(sent_count)
+
+
+def schedule_reminder_caller(job_queue: JobQueue) -> None:
+    next_due = repository.scheduler.next_due()
+
+    if next_due is None:
+        delay = REMINDER_CALLER_MAX_DELAY
+    else:
+        delay = min(max(next_due - time.time(), 0), REMINDER_CALLER_MAX_DELAY)
+
+    for job in job_queue.get_jobs_by_name(call_reminder.__name__):
+        job.schedule_removal()
+
+    job_queue.run_once(call_reminder, when=delay, name=call_reminder.__name__)
+
+
+async def start_background_tasks(app: Application) -> None:
+    sender.start()
+    render_pool.start()
+
+    start_openai_transport(app)
+
+    await start_reminder_caller(app)
+
+    startup.mark_ready()
+
+
+async def stop_background_tasks(app: Application) -> None:
+    await sender.stop()
+    render_pool.stop()
+
+    if cluster:
+        cluster.stop()
+
+    repository.storage.close()
+
+
+def start_openai_transport(app: Application) -> None:
+    translator.transport.hedging = OPENAI_HEDGING
+
+    # The developer is told once when OpenAI fails (not about every error)
+    def on_circuit_open() -> None:
+        text = "[LOG] OpenAI is failing, translations are paused"
+        app.create_task(sender.send_message(app.bot, DEVELOPER_CHAT_ID, text))
+
+    translator.transport.breaker.listener = on_circuit_open
+
+
+async def start_reminder_caller(app: Application) -> None:
+    loop = asyncio.get_running_loop()
+
+    # Wake up the reminder caller when an earlier reminder is scheduled
+    def on_schedule(due_at: float) -> None:
+        loop.call_soon_threadsafe(schedule_reminder_caller, app.job_queue)
+
+    repository.scheduler.listener = on_schedule
+
+    schedule_reminder_caller(app.job_queue)
+
+    # Translations prewarmed before a restart are loaded right away, along
+    # with seed terms not prewarmed yet (cache misses once collected)
+    app.job_queue.run_repeating(prewarm_cache, interval=PREWARM_INTERVAL, first=0)
+
+    # Schedules of sharded chats are loaded once their shards are acquired
+    if cluster:
+        cluster.start()
+        return
+
+    # Load the schedule in the background to start handling updates right away
+    threading.Thread(target=repository.load_schedule, daemon=True).start()
+
+
+# ----------------------------------------------------------------
+#  @cache_prewarming
+# ----------------------------------------------------------------
+
+
+# Created on the first prewarm (like the OpenAI client it uses)
+prewarmer: CachePrewarmer | None = None
 
-            reminder_interval = chat.get_reminder_interval(reminder)
-            time_to_remind = (now - reminder.last_at) > reminder_interval
 
-            if time_to_remind:
-                repository.handle_reminder_call(chat.id, reminder.id)
-                await send_reminder(context, chat, reminder)
+async def prewarm_cache(context: ContextTypes.DEFAULT_TYPE):
+    global prewarmer
+
+    if prewarmer is None:
+        prewarmer = CachePrewarmer(
+            # Batches aren't interactive, so they're retried by the SDK
+            translator.get_client().with_options(max_retries=2),
+            translator.cache,
+            TRANSLATIONS_PER_REMINDER,
+            EXAMPLES_PER_TRANSLATION,
+            PREWARM_SEED_DIR,
+            # Prewarmed translations are kept next to the chats
+            path=f"{DATABASE_PATH}.prewarm",
+        )
 
-                break
+    loaded = await prewarmer.run()
+
+    logger.info(f"Prewarmed translation cache with {loaded} translations")
 
 
 # ----------------------------------------------------------------
@@ -495,10 +1120,22 @@ async def call_reminder(context: ContextTypes.DEFAULT_TYPE):
 
 
 async def non_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    value = update.message.text
+    # Many words or phrases can be added at once, each on a new line
+    values = split_values(update.message.text)
+
+    if len(values) > 1:
+        await create_reminders_command(update, context, values)
+        return
+
+    # Blank messages have no value at all
+    if not values:
+        return
+
+    value = values[0]
 
     if len(value) > MAX_VALUE_LENGTH:
-        update.message.reply_text("The word or phrase is too long. Try again")
+        await send_reply(update, context, "The word or phrase is too long. Try again")
+        return
 
     await create_reminder_command(update, context, value)
 
@@ -521,6 +1158,10 @@ async def keyboard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await definition_callback(args)
         case "examples":
             await examples_callback(args)
+        case "knew":
+            await review_callback(args, knew=True)
+        case "forgot":
+            await review_callback(args, knew=False)
         case _:
             return
 
@@ -535,13 +1176,16 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.error("An error occurred :: ", exc_info=context.error)
 
     # Notify the developer about the error
-    await context.bot.send_message(
+    await sender.send_message(
+        context.bot,
         DEVELOPER_CHAT_ID, f"[LOG] An error occurred :: {context.error}, type: {type(context.error)}"
     )
 
 
 async def invalid_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Invalid command. Type /help for more information")
+    message = "Invalid command. Type /help for more information"
+
+    await send_reply(update, context, message)
 
 
 # ----------------------------------------------------------------
@@ -549,11 +1193,24 @@ async def invalid_command_handler(update: Update, context: ContextTypes.DEFAULT_
 # ----------------------------------------------------------------
 
 
-def run_polling(token: str):
-    app = ApplicationBuilder().token(token).build()
+def build_application(token: str, base_url: str = None, updater=True) -> Application:
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(ChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .post_init(start_background_tasks)
+        .post_shutdown(stop_background_tasks)
+    )
 
-    # Call reminders every 5 seconds
-    app.job_queue.run_repeating(call_reminder, interval=5)
+    # Used to connect to a local Telegram stand-in
+    if base_url:
+        builder = builder.base_url(base_url)
+
+    # Updates are pushed into the update queue directly in 'webhook' mode
+    if not updater:
+        builder = builder.updater(None)
+
+    app = builder.build()
 
     # ----------------------------------------------------------------
     # --- Common Handlers ---
@@ -562,38 +1219,87 @@ def run_polling(token: str):
     app.add_error_handler(error_handler)
 
     # Handle callback from keyboards
-    app.add_handler(CallbackQueryHandler(keyboard_handler))
+    app.add_handler(CallbackQueryHandler(timed("keyboard", keyboard_handler)))
 
     # Handle non-command messages
     app.add_handler(
-        MessageHandler(filters.TEXT & (~filters.COMMAND), non_command_handler)
+        MessageHandler(
+            filters.TEXT & (~filters.COMMAND), timed("message", non_command_handler)
+        )
     )
 
     # ----------------------------------------------------------------
     # --- Commands ---
 
     # Handle default commands
-    app.add_handler(CommandHandler("start", start_command))
-    app.add_handler(CommandHandler("help", help_command))
+    app.add_handler(command_handler("start", start_command))
+    app.add_handler(command_handler("help", help_command))
 
     # Handle reminder commands
-    app.add_handler(CommandHandler("show_reminders", show_reminders_command))
-    app.add_handler(CommandHandler("clear_reminders", clear_reminders_command))
+    app.add_handler(command_handler("show_reminders", show_reminders_command))
+    app.add_handler(command_handler("clear_reminders", clear_reminders_command))
+    app.add_handler(command_handler("add_many", add_many_command))
 
     # Handle interval commands
-    app.add_handler(CommandHandler("show_intervals", show_intervals_command))
-    app.add_handler(CommandHandler("set_intervals", set_intervals_command))
-    app.add_handler(CommandHandler("reset_intervals", reset_intervals_command))
+    app.add_handler(command_handler("show_intervals", show_intervals_command))
+    app.add_handler(command_handler("set_intervals", set_intervals_command))
+    app.add_handler(command_handler("reset_intervals", reset_intervals_command))
 
     # Handle dictionary commands
-    app.add_handler(CommandHandler("show_dictionary", show_dictionary_command))
-    app.add_handler(CommandHandler("switch_dictionary", switch_dictionary_command))
-    app.add_handler(CommandHandler("choose_dictionary", choose_dictionary_command))
+    app.add_handler(command_handler("show_dictionary", show_dictionary_command))
+    app.add_handler(command_handler("switch_dictionary", switch_dictionary_command))
+    app.add_handler(command_handler("choose_dictionary", choose_dictionary_command))
 
     # Handle invalid commands
-    app.add_handler(MessageHandler(filters.COMMAND, invalid_command_handler))
+    app.add_handler(
+        MessageHandler(filters.COMMAND, timed("invalid_command", invalid_command_handler))
+    )
 
     # ----------------------------------------------------------------
 
+    return app
+
+
+def run_polling(token: str, base_url: str = None):
+    app = build_application(token, base_url)
+
     # Run the bot using 'polling'
     app.run_polling()
+
+
+def run_webhook(
+    token: str, url: str, receiver: WebhookReceiver, base_url: str = None
+):
+    app = build_application(token, base_url, updater=False)
+
+    # Run the bot using 'webhook' (updates are received by the HTTP server)
+    asyncio.run(serve_webhook(app, url, receiver))
+
+
+async def serve_webhook(app: Application, url: str, receiver: WebhookReceiver):
+    async with app:
+        await app.bot.set_webhook(
+            url, secret_token=receiver.secret_token, allowed_updates=Update.ALL_TYPES
+        )
+
+        await app.post_init(app)
+        await app.start()
+
+        loop = asyncio.get_running_loop()
+        receiver.attach(app, loop)
+
+        # Stopped by 'docker stop' (SIGTERM) or Ctrl+C (SIGINT), so that
+        # pending writes are flushed and shards are left to other workers
+        stopping = asyncio.Event()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+
+        try:
+            await stopping.wait()
+        finally:
+            # Updates received from now on are retried by Telegram
+            receiver.detach()
+
+            await app.stop()
+            await app.post_shutdown(app)
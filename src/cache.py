@@ -0,0 +1,121 @@
+import time
+import threading
+from collections import OrderedDict
+
+from models import Translation
+from utils import normalize_term
+
+type CacheKey = tuple[str, str, str, int, int]
+
+# Marks cached invalid terms, so that they're not confused with cache misses
+INVALID_TERM = object()
+
+# Max number of recently missed keys remembered (e.g. to prewarm them later)
+MAX_MISSED_KEYS = 10_000
+
+
+class TranslationCache:
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Key -> (translation or INVALID_TERM, expiration time)
+        self.entries: OrderedDict[CacheKey, tuple[object, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.missed_keys: OrderedDict[CacheKey, None] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(
+        value: str,
+        src_lang: str,
+        dst_lang: str,
+        translation_count: int,
+        examples_per_translation_count: int,
+    ) -> CacheKey:
+        return (
+            normalize_term(value),
+            src_lang,
+            dst_lang,
+            translation_count,
+            examples_per_translation_count,
+        )
+
+    def get(self, key: CacheKey) -> Translation | object | None:
+        # Returns the translation, INVALID_TERM or None (if not cached)
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.miss(key)
+                return None
+
+            (value, expires_at) = entry
+
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.miss(key)
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def contains(self, key: CacheKey) -> bool:
+        # Unlike 'get', doesn't affect the stats or the eviction order
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[1] >= time.monotonic()
+
+    def pop_missed_keys(self) -> list[CacheKey]:
+        with self.lock:
+            keys = list(self.missed_keys)
+            self.missed_keys.clear()
+
+            return keys
+
+    def miss(self, key: CacheKey) -> None:
+        self.misses += 1
+
+        self.missed_keys[key] = None
+        self.missed_keys.move_to_end(key)
+
+        if len(self.missed_keys) > MAX_MISSED_KEYS:
+            self.missed_keys.popitem(last=False)
+
+    def put(self, key: CacheKey, translation: Translation | None) -> None:
+        value = INVALID_TERM if translation is None else translation
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def get_hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_stats(self) -> dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "hit_rate": self.get_hit_rate(),
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
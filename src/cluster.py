@@ -0,0 +1,234 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable
+
+# Number of shards that chats are partitioned into (by chat id)
+SHARD_COUNT = 256
+
+# Time (in seconds) between worker heartbeats
+HEARTBEAT_INTERVAL = 5
+
+# Time (in seconds) after the last heartbeat when a worker is considered gone
+WORKER_TTL = 15
+
+# Time (in seconds) for which a shard lease is valid unless renewed
+LEASE_TTL = 15
+
+# Time (in seconds) before lease expiry when a worker stops using its shards
+# (so that a stalled worker never overlaps with the next owner)
+LEASE_MARGIN = 3
+
+logger = logging.getLogger(__name__)
+
+
+def get_shard(chat_id: int) -> int:
+    return chat_id % SHARD_COUNT
+
+
+def get_shard_owner(shard: int, worker_ids: list[str]) -> str:
+    # Rendezvous hashing: only the shards of a joining or leaving worker move
+    def weight(worker_id: str) -> bytes:
+        key = f"{worker_id}:{shard}".encode()
+        return hashlib.blake2b(key, digest_size=8).digest()
+
+    return max(worker_ids, key=weight)
+
+
+class Cluster:
+    # Partitions chats between bot workers sharing the same database. Every
+    # worker sends heartbeats, computes which shards it should own from the
+    # live workers, and holds leases on them. A shard is only taken over once
+    # its previous owner releases it or its lease expires, so exactly one
+    # worker owns a chat (i.e. handles its updates and sends its reminders).
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS workers (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            heartbeat_at REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS shard_leases (
+            shard INTEGER PRIMARY KEY,
+            worker_id TEXT,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(
+        self,
+        path: str,
+        worker_id: str,
+        url: str,
+        on_acquire: Callable[[set[int]], None],
+        on_release: Callable[[set[int]], None],
+    ):
+        self.path = path
+        self.worker_id = worker_id
+        self.url = url
+
+        # Called with shards once they're owned (to load their chats) and
+        # after they're no longer
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+
+        self.shards: set[int] = set()
+        self.leased_until = 0.0
+
+        # Owner urls by shard, as of the last heartbeat
+        self.owner_urls: dict[int, str] = {}
+
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+
+    # ----------------------------------------------------------------
+    #  @ownership
+    # ----------------------------------------------------------------
+
+    def owns(self, chat_id: int) -> bool:
+        if time.time() > self.leased_until - LEASE_MARGIN:
+            return False
+
+        return get_shard(chat_id) in self.shards
+
+    def get_owner_url(self, chat_id: int) -> str | None:
+        # Returns None if the chat is owned by this worker (or no one yet)
+        url = self.owner_urls.get(get_shard(chat_id))
+        return None if url == self.url else url
+
+    # ----------------------------------------------------------------
+    #  @heartbeat
+    # ----------------------------------------------------------------
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+        if self.thread:
+            self.thread.join()
+
+        self.leave()
+        self.connection.close()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.heartbeat()
+            except sqlite3.Error:
+                # Leases expire unless renewed, so the worker stops sending
+                logger.exception("Failed to send a heartbeat")
+
+            self.stopped.wait(HEARTBEAT_INTERVAL)
+
+    def heartbeat(self) -> None:
+        now = time.time()
+
+        # Chats of shards whose lease was about to expire weren't used (see
+        # 'owns'), e.g. their due reminders were dropped, so they're loaded
+        # again once the lease is renewed
+        lapsed = now > self.leased_until - LEASE_MARGIN
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO workers (id, url, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                "url = excluded.url, heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, self.url, now),
+            )
+
+            worker_ids = [
+                id
+                for (id,) in self.connection.execute(
+                    "SELECT id FROM workers WHERE heartbeat_at >= ?",
+                    (now - WORKER_TTL,),
+                )
+            ]
+
+        wanted = {
+            shard
+            for shard in range(SHARD_COUNT)
+            if get_shard_owner(shard, worker_ids) == self.worker_id
+        }
+
+        # Shards moving to other workers are released before they're taken
+        self.release(self.shards - wanted)
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO shard_leases (shard, worker_id, expires_at) "
+                "VALUES (?, ?, ?) "
+                "ON CONFLICT (shard) DO UPDATE SET "
+                "worker_id = excluded.worker_id, expires_at = excluded.expires_at "
+                "WHERE shard_leases.worker_id = excluded.worker_id "
+                "OR shard_leases.worker_id IS NULL "
+                "OR shard_leases.expires_at < ?",
+                [(shard, self.worker_id, now + LEASE_TTL, now) for shard in wanted],
+            )
+
+            owners = self.connection.execute(
+                "SELECT shard_leases.shard, shard_leases.worker_id, workers.url "
+                "FROM shard_leases JOIN workers ON workers.id = shard_leases.worker_id "
+                "WHERE shard_leases.expires_at > ?",
+                (now,),
+            ).fetchall()
+
+        leased = {
+            shard for (shard, worker_id, _) in owners if worker_id == self.worker_id
+        }
+
+        self.owner_urls = {shard: url for (shard, _, url) in owners}
+
+        # Leases are lost if they expired before being renewed (e.g. stalls)
+        lost = self.shards - leased
+
+        if lost:
+            self.shards -= lost
+            self.on_release(lost)
+
+        acquired = leased if lapsed else leased - self.shards
+
+        # Owned first, so that reminders loaded by 'on_acquire' are called
+        self.shards |= acquired
+        self.leased_until = now + LEASE_TTL
+
+        if acquired:
+            self.on_acquire(acquired)
+
+            logger.info(f"Worker {self.worker_id} owns {len(self.shards)} shards")
+
+    def release(self, shards: set[int]) -> None:
+        if not shards:
+            return
+
+        # Stop using the shards first, so that they're never used twice
+        self.shards -= shards
+        self.on_release(shards)
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE shard_leases SET worker_id = NULL, expires_at = 0 "
+                "WHERE shard = ? AND worker_id = ?",
+                [(shard, self.worker_id) for shard in shards],
+            )
+
+    def leave(self) -> None:
+        # Lets other workers take over the shards right away
+        try:
+            self.release(set(self.shards))
+
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM workers WHERE id = ?", (self.worker_id,)
+                )
+        except sqlite3.Error:
+            logger.exception("Failed to leave the cluster")
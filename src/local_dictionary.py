@@ -0,0 +1,272 @@
+import os
+import sys
+import mmap
+import array
+import struct
+import marshal
+import threading
+from typing import Iterable, Iterator
+
+from cache import CacheKey
+from models import Translation, Destination
+from models import translation_to_tuple, translation_from_tuple
+from utils import normalize_term
+
+# Index header: magic, version and number of terms
+HEADER = struct.Struct("<4sII")
+
+MAGIC = b"ONLD"
+VERSION = 1
+
+# Max number of terms returned by a prefix lookup
+MAX_COMPLETIONS = 10
+
+# ----------------------------------------------------------------
+#  @index
+# ----------------------------------------------------------------
+# An index is a read-only file of sorted, normalized terms with their
+# translations, which is memory-mapped (i.e. shared by processes and paged in
+# on use) and searched in place. After the header come two arrays of offsets
+# (of terms and of translations, with one more offset for the end of the
+# last one) followed by the UTF-8 encoded terms and by the translations
+# (encoded with 'marshal' like records of the log storage).
+#
+# UTF-8 bytes sort like the code points they encode, so terms are compared
+# as bytes.
+
+
+class LocalDictionary:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.count) = HEADER.unpack_from(self.mmap)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a local dictionary index: {path}")
+
+        offsets_size = (self.count + 1) * 4
+        view = memoryview(self.mmap)
+
+        self.term_offsets = view[HEADER.size : HEADER.size + offsets_size].cast("I")
+        self.translation_offsets = view[
+            HEADER.size + offsets_size : HEADER.size + 2 * offsets_size
+        ].cast("I")
+
+        self.terms_start = HEADER.size + 2 * offsets_size
+        self.translations_start = self.terms_start + self.term_offsets[self.count]
+
+    def close(self) -> None:
+        self.term_offsets.release()
+        self.translation_offsets.release()
+        self.mmap.close()
+        self.file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, term: str) -> Translation | None:
+        encoded = normalize_term(term).encode()
+        idx = self.find(encoded)
+
+        if idx == self.count or self.get_term(idx) != encoded:
+            return None
+
+        start = self.translations_start + self.translation_offsets[idx]
+        end = self.translations_start + self.translation_offsets[idx + 1]
+
+        return translation_from_tuple(marshal.loads(self.mmap[start:end]))
+
+    def complete(self, prefix: str, limit: int = MAX_COMPLETIONS) -> list[str]:
+        # Returns terms starting with the prefix, in order
+        encoded = normalize_term(prefix).encode()
+        start = self.find(encoded)
+
+        terms = []
+
+        for idx in range(start, min(self.count, start + limit)):
+            term = self.get_term(idx)
+
+            if not term.startswith(encoded):
+                break
+
+            terms.append(term.decode())
+
+        return terms
+
+    def find(self, encoded: bytes) -> int:
+        # Returns the index of the first term not less than the given one
+        (low, high) = (0, self.count)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.get_term(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def get_term(self, idx: int) -> bytes:
+        start = self.terms_start + self.term_offsets[idx]
+        end = self.terms_start + self.term_offsets[idx + 1]
+
+        return self.mmap[start:end]
+
+
+def build(entries: Iterable[tuple[str, Translation]], path: str) -> int:
+    # Writes an index of the entries (the first one of a term wins) and
+    # returns the number of terms. The index replaces the file at once, so
+    # running bots keep reading the old one until they reopen it.
+    translations: dict[bytes, Translation] = {}
+
+    for term, translation in entries:
+        translations.setdefault(normalize_term(term).encode(), translation)
+
+    terms = sorted(translations)
+
+    term_offsets = array.array("I", [0])
+    translation_offsets = array.array("I", [0])
+    encoded_translations = []
+
+    for term in terms:
+        encoded = marshal.dumps(translation_to_tuple(translations[term]))
+        encoded_translations.append(encoded)
+
+        term_offsets.append(term_offsets[-1] + len(term))
+        translation_offsets.append(translation_offsets[-1] + len(encoded))
+
+    # Offsets are read in the native byte order, i.e. indexes are built on
+    # the platform they're used on
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(terms)))
+        file.write(term_offsets.tobytes())
+        file.write(translation_offsets.tobytes())
+        file.write(b"".join(terms))
+        file.write(b"".join(encoded_translations))
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(f"{path}.tmp", path)
+
+    return len(terms)
+
+
+# ----------------------------------------------------------------
+#  @backend
+# ----------------------------------------------------------------
+
+
+class LocalDictionaries:
+    # Translation backend answering from the indexes of a directory, named
+    # '{src}-{dst}.idx' like seed word lists. Indexes are opened on first
+    # use, and language pairs without one are passed on to the next tier.
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+        self.dictionaries: dict[tuple[str, str], LocalDictionary | None] = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, key: CacheKey) -> Translation | None:
+        (term, src_lang, dst_lang, translation_count, examples_count) = key
+
+        dictionary = self.get_dictionary(src_lang, dst_lang)
+        translation = dictionary.get(term) if dictionary else None
+
+        if translation is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        # Indexes may have more translations (and examples) than requested
+        return Translation(
+            translation.src,
+            tuple(
+                Destination(dst.value, dst.examples[:examples_count])
+                for dst in translation.dst[:translation_count]
+            ),
+            translation.definition,
+        )
+
+    def get_dictionary(self, src_lang: str, dst_lang: str) -> LocalDictionary | None:
+        if (src_lang, dst_lang) in self.dictionaries:
+            return self.dictionaries[(src_lang, dst_lang)]
+
+        with self.lock:
+            if (src_lang, dst_lang) not in self.dictionaries:
+                path = os.path.join(self.directory, f"{src_lang}-{dst_lang}.idx")
+
+                self.dictionaries[(src_lang, dst_lang)] = (
+                    LocalDictionary(path) if os.path.exists(path) else None
+                )
+
+        return self.dictionaries[(src_lang, dst_lang)]
+
+    def get_stats(self) -> dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "terms": sum(len(d) for d in self.dictionaries.values() if d),
+        }
+
+
+# ----------------------------------------------------------------
+#  @word_lists
+# ----------------------------------------------------------------
+# Word lists have a term per line, followed by a tab, a translation and
+# (optionally) another tab and a definition. Terms with more translations
+# are repeated on more lines.
+
+
+def read_word_list(path: str) -> Iterator[tuple[str, Translation]]:
+    # By normalized terms, which keep the first spelling of the term
+    terms: dict[str, str] = {}
+    values: dict[str, list[str]] = {}
+    definitions: dict[str, str] = {}
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            fields = [field.strip() for field in line.split("\t")]
+
+            if len(fields) < 2 or not fields[0] or not fields[1]:
+                continue
+
+            key = normalize_term(fields[0])
+
+            terms.setdefault(key, fields[0])
+            term_values = values.setdefault(key, [])
+
+            if fields[1] not in term_values:
+                term_values.append(fields[1])
+
+            if len(fields) > 2 and fields[2]:
+                definitions.setdefault(key, fields[2])
+
+    for key, term in terms.items():
+        yield (term, create_translation(term, values[key], definitions.get(key, "")))
+
+
+def create_translation(term: str, values: list[str], definition: str) -> Translation:
+    return Translation(
+        term, tuple(Destination(value, ()) for value in values), definition
+    )
+
+
+# Usage: python local_dictionary.py {word_list} {index}
+#
+# E.g. 'python local_dictionary.py nl-en.tsv dictionaries/nl-en.idx', then
+# run the bot with LOCAL_DICTIONARY_DIR=dictionaries.
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        raise SystemExit("Usage: python local_dictionary.py {word_list} {index}")
+
+    count = build(read_word_list(sys.argv[1]), sys.argv[2])
+
+    print(f"Indexed {count} terms")
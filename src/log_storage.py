@@ -0,0 +1,575 @@
+import os
+import gc
+import time
+import zlib
+import struct
+import marshal
+import logging
+import threading
+from typing import Iterator
+
+import srs
+from models import Chat, Reminder, Dictionary, Translation
+from models import translation_to_tuple, translation_from_tuple
+from storage import Storage, ScheduleEntry, dictionary_to_str, dictionary_from_str
+
+# Time (in seconds) between writes of logged operations, i.e. the operations
+# of this interval are written with a single fsync (and lost on a crash)
+GROUP_COMMIT_INTERVAL = 0.01
+
+# Time (in seconds) between checks whether a snapshot is due
+SNAPSHOT_CHECK_INTERVAL = 60
+
+# Log size (in bytes) after which a snapshot is taken and the log is truncated
+SNAPSHOT_LOG_SIZE = 64 * 1024 * 1024
+
+# Log record header: payload length and CRC32 of the payload
+RECORD_HEADER = struct.Struct("<II")
+
+SNAPSHOT_VERSION = 3
+
+# Operation codes of log records
+SAVE_CHAT = 0
+ADD_REMINDERS = 1
+SAVE_REMINDERS = 2
+CLEAR_REMINDERS = 3
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------
+#  @encoding
+# ----------------------------------------------------------------
+# Records are tuples of plain values, encoded with 'marshal' (the fastest
+# encoding of such values in the standard library).
+
+
+def chat_to_tuple(chat: Chat) -> tuple:
+    return (
+        chat.id,
+        chat.reminder_next_id,
+        list(chat.reminder_intervals),
+        dictionary_to_str(chat.dictionary),
+    )
+
+
+def get_reminder_states(reminders: list[Reminder]) -> list[tuple]:
+    # The part of reminders that changes after creation
+    return [
+        (
+            reminder.id,
+            reminder.last_at,
+            reminder.left,
+            reminder.ease,
+            reminder.reviewed_at,
+        )
+        for reminder in reminders
+    ]
+
+
+def encode_record(record: tuple) -> bytes:
+    payload = marshal.dumps(record)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path: str) -> Iterator[tuple]:
+    # Stops at the first incomplete or corrupted record (i.e. a torn write)
+    with open(path, "rb") as file:
+        data = file.read()
+
+    offset = 0
+
+    while offset + RECORD_HEADER.size <= len(data):
+        (length, crc) = RECORD_HEADER.unpack_from(data, offset)
+
+        start = offset + RECORD_HEADER.size
+        payload = data[start : start + length]
+
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning(f"Skipped a torn record at {offset} of {path}")
+            return
+
+        yield marshal.loads(payload)
+
+        offset = start + length
+
+
+class LogStorage(Storage):
+    # Keeps chats in memory (the same objects as the repository) and makes
+    # them durable with an append-only log of changes, plus snapshots of all
+    # chats taken once the log grows. On startup, the latest snapshot is
+    # loaded and the log written after it is replayed.
+    #
+    # Records hold the resulting state (not deltas), so replaying a record
+    # already reflected by the snapshot is harmless. Logged operations are
+    # written by a background thread, every 'GROUP_COMMIT_INTERVAL', with a
+    # single fsync (like SQLite with 'synchronous=NORMAL', a crash loses the
+    # last operations, but never leaves a partial one behind).
+    #
+    # Files: '{path}.snapshot' and the log segments '{path}.log.{seq}'. The
+    # snapshot holds the sequence number of the first segment not in it.
+
+    def __init__(
+        self,
+        path: str,
+        group_commit_interval: float = GROUP_COMMIT_INTERVAL,
+        snapshot_log_size: int = SNAPSHOT_LOG_SIZE,
+    ):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.group_commit_interval = group_commit_interval
+        self.snapshot_log_size = snapshot_log_size
+
+        self.chats: dict[int, Chat] = {}
+
+        # Encoded records not written yet (guarded by 'lock'), and the log
+        # segment they're written to (guarded by 'write_lock')
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending: list[bytes] = []
+
+        self.recover()
+
+        self.log_size = 0
+        self.log_file = open(self.get_log_path(self.log_seq), "ab")
+
+        self.stopped = threading.Event()
+        self.threads = [
+            threading.Thread(target=self.run_writer, daemon=True),
+            threading.Thread(target=self.run_snapshots, daemon=True),
+        ]
+
+        for thread in self.threads:
+            thread.start()
+
+    def get_log_path(self, seq: int) -> str:
+        return f"{self.path}.log.{seq}"
+
+    def get_log_seqs(self) -> list[int]:
+        directory = os.path.dirname(self.path) or "."
+        prefix = f"{os.path.basename(self.path)}.log."
+
+        return sorted(
+            int(name[len(prefix) :])
+            for name in os.listdir(directory)
+            if name.startswith(prefix) and name[len(prefix) :].isdigit()
+        )
+
+    # ----------------------------------------------------------------
+    #  @loading
+    # ----------------------------------------------------------------
+
+    def load_chat(self, chat_id: int) -> Chat | None:
+        return self.chats.get(chat_id)
+
+    def load_schedule(self) -> Iterator[ScheduleEntry]:
+        for chat in list(self.chats.values()):
+            yield from self.get_chat_schedule(chat)
+
+    def load_chat_schedule(self, chat_id: int) -> list[ScheduleEntry]:
+        chat = self.chats.get(chat_id)
+        return self.get_chat_schedule(chat) if chat else []
+
+    def get_chat_schedule(self, chat: Chat) -> list[ScheduleEntry]:
+        reminders = list(chat.reminders.values())
+        next_dues = srs.get_next_dues(chat, reminders)
+
+        return [
+            (chat.id, reminder.id, next_due)
+            for reminder, next_due in zip(reminders, next_dues)
+            if next_due is not None
+        ]
+
+    # ----------------------------------------------------------------
+    #  @writing
+    # ----------------------------------------------------------------
+
+    def save_chat(self, chat: Chat) -> None:
+        self.chats[chat.id] = chat
+        self.append((SAVE_CHAT, chat_to_tuple(chat)))
+
+    def add_reminder(self, chat: Chat, reminder: Reminder, next_due: float) -> None:
+        self.add_reminders(chat, [reminder], [next_due])
+
+    def add_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float]
+    ) -> None:
+        self.chats[chat.id] = chat
+
+        encoded = [
+            (
+                reminder.id,
+                reminder.last_at,
+                reminder.left,
+                translation_to_tuple(reminder.translation),
+                dictionary_to_str(reminder.dictionary),
+                reminder.value,
+                reminder.ease,
+                reminder.reviewed_at,
+            )
+            for reminder in reminders
+        ]
+
+        self.append((ADD_REMINDERS, chat_to_tuple(chat), encoded))
+
+    def save_reminder(
+        self, chat_id: int, reminder: Reminder, next_due: float | None
+    ) -> None:
+        self.save_reminders(chat_id, [reminder], [next_due])
+
+    def save_reminders(
+        self, chat_id: int, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        self.append((SAVE_REMINDERS, chat_id, get_reminder_states(reminders)))
+
+    def save_chat_and_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        # Appended at once, i.e. written by the same group commit
+        self.chats[chat.id] = chat
+        self.append(
+            (SAVE_CHAT, chat_to_tuple(chat)),
+            (SAVE_REMINDERS, chat.id, get_reminder_states(reminders)),
+        )
+
+    def call_reminder(
+        self,
+        chat_id: int,
+        reminder: Reminder,
+        called: tuple[float, int],
+        next_due: float | None,
+    ) -> bool:
+        # Only this process writes the log, so no one else calls reminders
+        self.save_reminder(chat_id, reminder, next_due)
+        return True
+
+    def clear_reminders(self, chat_id: int) -> None:
+        self.append((CLEAR_REMINDERS, chat_id))
+
+    def append(self, *records: tuple) -> None:
+        encoded = [encode_record(record) for record in records]
+
+        with self.lock:
+            self.pending.extend(encoded)
+
+    def close(self) -> None:
+        self.stopped.set()
+
+        for thread in self.threads:
+            thread.join()
+
+        with self.write_lock:
+            self.flush()
+            self.log_file.close()
+
+    # ----------------------------------------------------------------
+    #  @group_commit
+    # ----------------------------------------------------------------
+
+    def run_writer(self) -> None:
+        while not self.stopped.wait(self.group_commit_interval):
+            with self.write_lock:
+                try:
+                    self.flush()
+                except OSError:
+                    # Records are kept and written with the next group
+                    logger.exception("Failed to write the log")
+
+    def flush(self) -> None:
+        # Expects 'write_lock' to be held by the caller
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+
+        if not pending:
+            return
+
+        data = b"".join(pending)
+
+        try:
+            self.log_file.write(data)
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+        except OSError:
+            with self.lock:
+                self.pending = pending + self.pending
+            raise
+
+        self.log_size += len(data)
+
+    # ----------------------------------------------------------------
+    #  @snapshots
+    # ----------------------------------------------------------------
+
+    def run_snapshots(self) -> None:
+        while not self.stopped.wait(SNAPSHOT_CHECK_INTERVAL):
+            if self.log_size < self.snapshot_log_size:
+                continue
+
+            try:
+                self.snapshot()
+            except OSError:
+                logger.exception("Failed to take a snapshot")
+
+    def snapshot(self) -> None:
+        started_at = time.perf_counter()
+
+        # Later records go to a new segment. Changes made meanwhile may or
+        # may not be in the snapshot, but they're replayed from it anyway.
+        with self.write_lock:
+            self.flush()
+            self.log_file.close()
+
+            self.log_seq += 1
+            self.log_size = 0
+            self.log_file = open(self.get_log_path(self.log_seq), "ab")
+
+        data = marshal.dumps(self.encode_snapshot(self.log_seq))
+
+        snapshot_path = f"{self.path}.snapshot"
+        temp_path = f"{snapshot_path}.tmp"
+
+        with open(temp_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, snapshot_path)
+        self.sync_directory()
+
+        # Segments in the snapshot are no longer needed
+        for seq in self.get_log_seqs():
+            if seq < self.log_seq:
+                os.remove(self.get_log_path(seq))
+
+        duration = time.perf_counter() - started_at
+        logger.info(f"Took a snapshot of {len(data)} bytes in {duration:.2f}s")
+
+    def encode_snapshot(self, log_seq: int) -> tuple:
+        # Translations and dictionaries are shared by reminders, so they're
+        # stored once and referred to by their index
+        translation_ids: dict[int, int] = {}
+        translations = []
+        dictionary_ids: dict[Dictionary, int] = {}
+        dictionaries = []
+        chats = []
+
+        for chat in list(self.chats.values()):
+            reminders = []
+
+            for reminder in list(chat.reminders.values()):
+                translation = reminder.translation
+                translation_id = translation_ids.get(id(translation))
+
+                if translation_id is None:
+                    translation_id = len(translations)
+                    translation_ids[id(translation)] = translation_id
+                    translations.append(translation_to_tuple(translation))
+
+                dictionary_id = dictionary_ids.get(reminder.dictionary)
+
+                if dictionary_id is None:
+                    dictionary_id = len(dictionaries)
+                    dictionary_ids[reminder.dictionary] = dictionary_id
+                    dictionaries.append(dictionary_to_str(reminder.dictionary))
+
+                reminders.append(
+                    (
+                        reminder.id,
+                        reminder.last_at,
+                        reminder.left,
+                        translation_id,
+                        dictionary_id,
+                        reminder.value,
+                        reminder.ease,
+                        reminder.reviewed_at,
+                    )
+                )
+
+            chats.append((*chat_to_tuple(chat), reminders))
+
+        return (SNAPSHOT_VERSION, log_seq, translations, dictionaries, chats)
+
+    def sync_directory(self) -> None:
+        # Makes the snapshot rename durable
+        fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ----------------------------------------------------------------
+    #  @recovery
+    # ----------------------------------------------------------------
+
+    def recover(self) -> None:
+        started_at = time.perf_counter()
+
+        # Shared instances by their encoded value, as when loaded from SQLite
+        dictionaries: dict[str, Dictionary] = {}
+        translations: dict[tuple, Translation] = {}
+
+        def get_dictionary(value: str) -> Dictionary:
+            dictionary = dictionaries.get(value)
+
+            if dictionary is None:
+                dictionary = dictionaries[value] = dictionary_from_str(value)
+
+            return dictionary
+
+        def get_translation(value: tuple) -> Translation:
+            translation = translations.get(value)
+
+            if translation is None:
+                translation = translations[value] = translation_from_tuple(value)
+
+            return translation
+
+        # The cyclic GC would scan the growing heap over and over while
+        # millions of objects are created (none of which is garbage)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        try:
+            first_seq = self.load_snapshot(get_dictionary)
+            seqs = [seq for seq in self.get_log_seqs() if seq >= first_seq]
+            record_count = 0
+
+            for seq in seqs:
+                for record in read_records(self.get_log_path(seq)):
+                    self.replay(record, get_dictionary, get_translation)
+                    record_count += 1
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # The recovered chats live as long as the bot, so they're left out of
+        # later collections, which would stall the event loop while scanning
+        # them (e.g. while a reminder wave is rendered)
+        gc.freeze()
+
+        # Appends go to a new segment, as the last one may end with a torn write
+        self.log_seq = max([first_seq, *seqs]) + (1 if seqs else 0)
+
+        duration = time.perf_counter() - started_at
+        logger.info(
+            f"Recovered {len(self.chats)} chats ({record_count} log records) "
+            f"in {duration:.2f}s"
+        )
+
+    def load_snapshot(self, get_dictionary) -> int:
+        # Returns the sequence number of the first segment not in the snapshot
+        try:
+            with open(f"{self.path}.snapshot", "rb") as file:
+                # Much faster than 'marshal.load', which reads in small chunks
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+
+        (version, log_seq, translations, dictionaries, chats) = marshal.loads(data)
+
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {version}")
+
+        translations = [translation_from_tuple(value) for value in translations]
+        dictionaries = [get_dictionary(value) for value in dictionaries]
+
+        for id, reminder_next_id, intervals, dictionary, reminders in chats:
+            self.chats[id] = Chat(
+                id,
+                {
+                    reminder_id: Reminder(
+                        reminder_id,
+                        last_at,
+                        left,
+                        translations[translation_id],
+                        dictionaries[dictionary_id],
+                        value,
+                        ease,
+                        reviewed_at,
+                    )
+                    for (
+                        reminder_id,
+                        last_at,
+                        left,
+                        translation_id,
+                        dictionary_id,
+                        value,
+                        ease,
+                        reviewed_at,
+                    ) in reminders
+                },
+                reminder_next_id,
+                intervals,
+                get_dictionary(dictionary),
+            )
+
+        return log_seq
+
+    def replay(self, record: tuple, get_dictionary, get_translation) -> None:
+        op = record[0]
+
+        if op == SAVE_CHAT:
+            self.replay_chat(record[1], get_dictionary)
+
+        elif op == ADD_REMINDERS:
+            chat = self.replay_chat(record[1], get_dictionary)
+
+            for (
+                id,
+                last_at,
+                left,
+                translation,
+                dictionary,
+                value,
+                ease,
+                reviewed_at,
+            ) in record[2]:
+                chat.reminders[id] = Reminder(
+                    id,
+                    last_at,
+                    left,
+                    get_translation(translation),
+                    get_dictionary(dictionary),
+                    value,
+                    ease,
+                    reviewed_at,
+                )
+
+        elif op == SAVE_REMINDERS:
+            chat = self.chats.get(record[1])
+
+            for reminder_id, last_at, left, ease, reviewed_at in (
+                record[2] if chat else ()
+            ):
+                reminder = chat.reminders.get(reminder_id)
+
+                if reminder:
+                    reminder.last_at = last_at
+                    reminder.left = left
+                    reminder.ease = ease
+                    reminder.reviewed_at = reviewed_at
+
+        elif op == CLEAR_REMINDERS:
+            chat = self.chats.get(record[1])
+
+            if chat:
+                chat.reminders.clear()
+
+    def replay_chat(self, chat_tuple: tuple, get_dictionary) -> Chat:
+        (id, reminder_next_id, intervals, dictionary) = chat_tuple
+
+        chat = self.chats.get(id)
+
+        if chat is None:
+            chat = self.chats[id] = Chat(id, {}, 0, [], None)
+
+        chat.reminder_next_id = reminder_next_id
+        chat.reminder_intervals = intervals
+        chat.dictionary = get_dictionary(dictionary)
+
+        return chat
@@ -1,36 +1,68 @@
+# Boots in two steps: the HTTP server is up first (answering health checks
+# and the startup profile), then the bot and the rest of the app are loaded.
+# Requests to the app are answered with 503 until it's loaded.
+
+import startup
+
 import sys
-import os
+import json
 import threading
 
 from waitress import serve
-from dotenv import load_dotenv
-from flask import Flask, jsonify
 
-import bot
+# The app (see 'server.py') once it's loaded
+app = None
 
-# Load environment variables
-load_dotenv()
+UNAVAILABLE = "503 Service Unavailable"
 
-# Initialize Flask app
-app = Flask(__name__)
 
+def respond(start_response, status: str, body: dict) -> list[bytes]:
+    data = json.dumps(body).encode()
+    headers = [
+        ("Content-Type", "application/json"),
+        ("Content-Length", str(len(data))),
+    ]
 
-@app.route("/", methods=["GET"])
-def health_check():
-    return jsonify(status="UP"), 200
+    start_response(status, headers)
 
+    return [data]
 
-def run_flask_in_background() -> None:
-    port = 80 if len(sys.argv) == 1 else int(sys.argv[1])
-    run_serve = lambda: serve(app, host="0.0.0.0", port=port)
-    threading.Thread(target=run_serve).start()
 
+def dispatch(environ, start_response):
+    path = environ.get("PATH_INFO")
+
+    if path == "/":
+        return respond(start_response, "200 OK", {"status": "UP"})
+
+    if path == "/ready":
+        if startup.ready.is_set():
+            return respond(start_response, "200 OK", {"status": "READY"})
+
+        return respond(start_response, UNAVAILABLE, {"status": "STARTING"})
+
+    if path == "/startup":
+        return respond(start_response, "200 OK", startup.get_profile())
 
-def run_bot_polling() -> None:
-    token = os.environ["TOKEN"]
-    bot.run_polling(token)
+    if app is None:
+        return respond(start_response, UNAVAILABLE, {"status": "STARTING"})
+
+    return app(environ, start_response)
+
+
+def run_server_in_background() -> None:
+    port = 80 if len(sys.argv) == 1 else int(sys.argv[1])
+    run_serve = lambda: serve(dispatch, host="0.0.0.0", port=port)
+    # Doesn't keep the process alive if the app fails to load or the bot stops
+    threading.Thread(target=run_serve, daemon=True).start()
 
 
 if __name__ == "__main__":
-    run_flask_in_background()
-    run_bot_polling()
+    with startup.phase("server"):
+        run_server_in_background()
+
+    with startup.phase("app"):
+        import server
+
+    app = server.app
+
+    server.run_bot()
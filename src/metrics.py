@@ -0,0 +1,115 @@
+from typing import Callable
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Buckets for the number of reminders per reminder call
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, float("inf"))
+
+# ----------------------------------------------------------------
+#  @translation
+# ----------------------------------------------------------------
+
+translation_latency = Histogram(
+    "oneling_translation_seconds",
+    "Time spent waiting for OpenAI translations",
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30, float("inf")),
+)
+
+translation_first_content = Histogram(
+    "oneling_translation_first_content_seconds",
+    "Time until the first useful content of streamed OpenAI translations",
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30, float("inf")),
+)
+
+translation_tokens = Counter(
+    "oneling_translation_tokens",
+    "Tokens used by OpenAI translations",
+    ["type"],
+)
+
+translation_prompt_tokens = Histogram(
+    "oneling_translation_prompt_tokens",
+    "Prompt tokens (and the cached part of them) per OpenAI translation",
+    ["type"],
+    buckets=(0, 128, 256, 512, 1024, 1536, 2048, 4096, 8192, float("inf")),
+)
+
+# ----------------------------------------------------------------
+#  @reminder_caller
+# ----------------------------------------------------------------
+
+reminder_call_duration = Histogram(
+    "oneling_reminder_call_seconds",
+    "Time spent on a single reminder call",
+)
+
+reminders_due = Histogram(
+    "oneling_reminders_due",
+    "Number of reminders due per reminder call",
+    buckets=COUNT_BUCKETS,
+)
+
+reminders_sent = Histogram(
+    "oneling_reminders_sent",
+    "Number of reminders sent per reminder call",
+    buckets=COUNT_BUCKETS,
+)
+
+# ----------------------------------------------------------------
+#  @handlers
+# ----------------------------------------------------------------
+
+handler_latency = Histogram(
+    "oneling_handler_seconds",
+    "Time spent handling updates",
+    ["handler"],
+)
+
+# ----------------------------------------------------------------
+#  @repository
+# ----------------------------------------------------------------
+
+lock_wait = Histogram(
+    "oneling_repository_lock_wait_seconds",
+    "Time spent waiting for repository chat locks",
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1, float("inf")),
+)
+
+chats = Gauge("oneling_chats", "Number of chats loaded into memory")
+
+active_reminders = Gauge("oneling_active_reminders", "Number of scheduled reminders")
+
+# ----------------------------------------------------------------
+#  @stats
+# ----------------------------------------------------------------
+# Components that keep their own stats (e.g. the sender) are collected
+# on every scrape instead of being updated on their hot paths.
+
+
+class StatsCollector:
+    def __init__(self):
+        self.sources: list[tuple[str, Callable[[], dict], set[str]]] = []
+
+    def add(self, name: str, get_stats: Callable[[], dict], counters: set[str]):
+        self.sources.append((name, get_stats, counters))
+
+    def collect(self):
+        for name, get_stats, counters in self.sources:
+            for key, value in get_stats().items():
+                metric_name = f"oneling_{name}_{key}"
+                documentation = f"{name.capitalize()} {key.replace('_', ' ')}"
+
+                if key in counters:
+                    yield CounterMetricFamily(metric_name, documentation, value)
+                else:
+                    yield GaugeMetricFamily(metric_name, documentation, value)
+
+
+stats_collector = StatsCollector()
+
+REGISTRY.register(stats_collector)
+
+
+def register_stats(name: str, get_stats: Callable[[], dict], counters: set[str]):
+    stats_collector.add(name, get_stats, counters)
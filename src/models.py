@@ -1,28 +1,51 @@
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 
+import srs
+from utils import normalize_term
 
-@dataclass
+type TermKey = tuple[str, str, str]
+
+# Models are slotted to save memory, as there may be millions of reminders.
+# Translations are frozen, so that they can be shared between reminders.
+
+
+@dataclass(frozen=True, slots=True)
 class Dictionary:
     src: str
     dst: str
 
+    @staticmethod
+    def of(src: str, dst: str) -> "Dictionary":
+        # Returns the shared dictionary instance for the language pair
+        dictionary = dictionaries.get((src, dst))
+
+        if not dictionary:
+            dictionary = Dictionary(sys.intern(src), sys.intern(dst))
+            dictionaries[(dictionary.src, dictionary.dst)] = dictionary
+
+        return dictionary
+
 
-@dataclass
+dictionaries: dict[tuple[str, str], Dictionary] = {}
+
+
+@dataclass(frozen=True, slots=True)
 class Example:
     src: str
     dst: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Destination:
     value: str
-    examples: list[Example]
+    examples: tuple[Example, ...]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Translation:
     src: str
-    dst: list[Destination]
+    dst: tuple[Destination, ...]
     definition: str
 
     def get_dst_values(self) -> list[str]:
@@ -32,22 +55,74 @@ class Translation:
         return [example for dst in self.dst for example in dst.examples]
 
 
-@dataclass
+@dataclass(slots=True)
 class Reminder:
     id: int
     last_at: int
     left: int
     translation: Translation
     dictionary: Dictionary
+    value: str
+
+    # Scales the chat intervals for this reminder (see 'srs.py')
+    ease: float = srs.DEFAULT_EASE
+
+    # Time of the last review, i.e. a reminder is reviewed once per call
+    reviewed_at: float = 0
 
+    def get_term_keys(self) -> list[TermKey]:
+        # Both the user input and the corrected term lead to the reminder
+        return [
+            get_term_key(self.value, self.dictionary),
+            get_term_key(self.translation.src, self.dictionary),
+        ]
 
-@dataclass
+
+@dataclass(slots=True)
 class Chat:
     id: int
     reminders: dict[int, Reminder]
     reminder_next_id: int
     reminder_intervals: list[int]
     dictionary: Dictionary
+    reminder_index: dict[TermKey, int] = field(default_factory=dict)
 
     def get_reminder_interval(self, reminder: Reminder) -> int:
-        return self.reminder_intervals[-reminder.left]
+        return srs.get_interval(self.reminder_intervals, reminder.left, reminder.ease)
+
+    def index_reminder(self, reminder: Reminder) -> None:
+        for key in reminder.get_term_keys():
+            self.reminder_index[key] = reminder.id
+
+    def find_reminder_id(self, value: str, dictionary: Dictionary) -> int | None:
+        return self.reminder_index.get(get_term_key(value, dictionary))
+
+
+def get_term_key(value: str, dictionary: Dictionary) -> TermKey:
+    return (dictionary.src, dictionary.dst, normalize_term(value))
+
+
+def translation_to_tuple(translation: Translation) -> tuple:
+    # Plain values, e.g. to be encoded with 'marshal' (by the log storage and
+    # local dictionaries)
+    return (
+        translation.src,
+        tuple(
+            (dst.value, tuple((example.src, example.dst) for example in dst.examples))
+            for dst in translation.dst
+        ),
+        translation.definition,
+    )
+
+
+def translation_from_tuple(value: tuple) -> Translation:
+    (src, dst, definition) = value
+
+    return Translation(
+        src,
+        tuple(
+            Destination(dst_value, tuple(Example(*example) for example in examples))
+            for dst_value, examples in dst
+        ),
+        definition,
+    )
@@ -0,0 +1,86 @@
+import json
+
+# Containers closed by the matching characters
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class PartialJsonParser:
+    # Parses JSON incrementally, as it's streamed. Text is cut at the last
+    # complete string value (or container) and open containers are closed,
+    # so incomplete strings, numbers and keys are never returned.
+
+    def __init__(self):
+        self.text: list[str] = []
+        self.length = 0
+
+        self.stack: list[str] = []
+        self.in_string = False
+        self.escaped = False
+        self.expects_key = False
+        self.is_key = False
+
+        # Text length and closers of the last position JSON can be cut at
+        self.cut: tuple[int, str] | None = None
+        self.parsed_cut: tuple[int, str] | None = None
+        self.parsed = None
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk:
+            self.length += 1
+            self.scan(char)
+
+        self.text.append(chunk)
+
+    def get(self) -> object | None:
+        # Returns the longest complete part of the JSON fed so far
+        if self.cut is None or self.cut == self.parsed_cut:
+            return self.parsed
+
+        (length, closers) = self.cut
+        text = "".join(self.text)[:length] + closers
+
+        try:
+            self.parsed = json.loads(text)
+        except ValueError:
+            return self.parsed
+
+        self.parsed_cut = self.cut
+
+        return self.parsed
+
+    def scan(self, char: str) -> None:
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                self.in_string = False
+
+                if not self.is_key:
+                    self.mark_cut()
+
+            return
+
+        match char:
+            case '"':
+                self.in_string = True
+                self.is_key = self.expects_key
+            case "{" | "[":
+                self.stack.append(char)
+                self.expects_key = char == "{"
+                self.mark_cut()
+            case "}" | "]":
+                if self.stack:
+                    self.stack.pop()
+
+                self.expects_key = False
+                self.mark_cut()
+            case ",":
+                self.expects_key = bool(self.stack) and self.stack[-1] == "{"
+            case ":":
+                self.expects_key = False
+
+    def mark_cut(self) -> None:
+        closers = "".join(CLOSERS[char] for char in reversed(self.stack))
+        self.cut = (self.length, closers)
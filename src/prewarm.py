@@ -0,0 +1,301 @@
+import os
+import json
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+import translator
+from cache import CacheKey, TranslationCache
+from log_storage import encode_record, read_records
+from models import Translation, translation_to_tuple, translation_from_tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Time (in seconds) between checks of a submitted batch
+BATCH_POLL_INTERVAL = 60
+
+# Max number of requests in a single batch (limited by OpenAI)
+MAX_BATCH_REQUESTS = 50_000
+
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+logger = logging.getLogger(__name__)
+
+
+class CachePrewarmer:
+    # Translates popular terms with the OpenAI Batch API (at half the price
+    # and outside of the interactive rate limits) and loads them into the
+    # translation cache. Terms come from seed word lists, i.e. files named
+    # '{src}-{dst}.txt' with a term per line, and from recent cache misses.
+    #
+    # With a 'path', prewarmed translations are kept in that file (as records
+    # like the ones of the log storage), so that they're loaded again after
+    # a restart instead of being paid for again. The batch in progress is
+    # kept in '{path}.batch', so that a restart waits for it as well.
+
+    def __init__(
+        self,
+        client: "AsyncOpenAI",
+        cache: TranslationCache,
+        translation_count: int,
+        examples_per_translation_count: int,
+        seed_dir: str | None = None,
+        poll_interval: float = BATCH_POLL_INTERVAL,
+        path: str | None = None,
+    ):
+        self.client = client
+        self.cache = cache
+        self.translation_count = translation_count
+        self.examples_per_translation_count = examples_per_translation_count
+        self.seed_dir = seed_dir
+        self.poll_interval = poll_interval
+        self.path = path
+
+        # Keys of the translations in 'path'
+        self.saved_keys: set[CacheKey] = set()
+
+        self.running = False
+
+    async def run(self) -> int:
+        # Returns the number of translations loaded into the cache. Batches
+        # may take up to a day, so runs overlapping one in progress are skipped.
+        if self.running:
+            logger.info("Skipped prewarming, the previous batch is in progress")
+            return 0
+
+        self.running = True
+
+        try:
+            return self.load_saved() + await self.prewarm()
+        finally:
+            self.running = False
+
+    async def prewarm(self) -> int:
+        pending = self.read_pending_batch()
+
+        if pending:
+            (batch_id, keys) = pending
+        else:
+            keys = self.collect_keys()[:MAX_BATCH_REQUESTS]
+
+            if not keys:
+                return 0
+
+            batch_id = await self.submit(keys)
+            self.write_pending_batch(batch_id, keys)
+
+        batch = await self.wait(batch_id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.warning(f"Batch {batch_id} is not completed: {batch.status}")
+            loaded = 0
+        else:
+            loaded = await self.load_results(batch.output_file_id, keys)
+
+        self.remove_pending_batch()
+
+        return loaded
+
+    # ----------------------------------------------------------------
+    #  @collecting
+    # ----------------------------------------------------------------
+
+    def collect_keys(self) -> list[CacheKey]:
+        keys = {}
+
+        for key in self.read_seed_keys() + self.cache.pop_missed_keys():
+            (_, _, _, translation_count, examples_count) = key
+
+            if translation_count != self.translation_count:
+                continue
+
+            if examples_count != self.examples_per_translation_count:
+                continue
+
+            if key not in self.saved_keys and not self.cache.contains(key):
+                keys[key] = None
+
+        return list(keys)
+
+    def read_seed_keys(self) -> list[CacheKey]:
+        if not self.seed_dir:
+            return []
+
+        keys = []
+
+        for filename in sorted(os.listdir(self.seed_dir)):
+            (name, extension) = os.path.splitext(filename)
+
+            if extension != ".txt" or name.count("-") != 1:
+                continue
+
+            (src_lang, dst_lang) = name.split("-")
+
+            with open(os.path.join(self.seed_dir, filename), encoding="utf-8") as file:
+                keys.extend(
+                    self.cache.key(
+                        line,
+                        src_lang,
+                        dst_lang,
+                        self.translation_count,
+                        self.examples_per_translation_count,
+                    )
+                    for line in file
+                    if line.strip()
+                )
+
+        return keys
+
+    # ----------------------------------------------------------------
+    #  @batch
+    # ----------------------------------------------------------------
+
+    def build_batch(self, keys: list[CacheKey]) -> bytes:
+        lines = []
+
+        # Requests are the same as the ones of interactive translations
+        for idx, key in enumerate(keys):
+            messages = translator.get_translation_messages(*key)
+
+            request = {
+                "custom_id": str(idx),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": translator.get_completion_params(messages, 1),
+            }
+
+            lines.append(json.dumps(request, ensure_ascii=False))
+
+        return "\n".join(lines).encode("utf-8")
+
+    async def submit(self, keys: list[CacheKey]) -> str:
+        input_file = await self.client.files.create(
+            file=("prewarm.jsonl", self.build_batch(keys)), purpose="batch"
+        )
+
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+
+        return batch.id
+
+    async def wait(self, batch_id: str):
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+
+            if batch.status in BATCH_FINAL_STATUSES:
+                return batch
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def load_results(self, output_file_id: str, keys: list[CacheKey]) -> int:
+        output = await self.client.files.content(output_file_id)
+
+        loaded = 0
+        records = []
+
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+
+            result = json.loads(line)
+            response = result.get("response") or {}
+
+            if response.get("status_code") != 200:
+                continue
+
+            content = response["body"]["choices"][0]["message"]["content"]
+
+            try:
+                translation = translator.parse_translation(json.loads(content))
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            key = keys[int(result["custom_id"])]
+
+            self.cache.put(key, translation)
+            records.append((key, to_saved_value(translation)))
+
+            loaded += 1
+
+        self.save(records)
+
+        return loaded
+
+    # ----------------------------------------------------------------
+    #  @saving
+    # ----------------------------------------------------------------
+
+    def load_saved(self) -> int:
+        # Loads saved translations that aren't cached (anymore) into the cache
+        if not self.path or not os.path.exists(self.path):
+            return 0
+
+        loaded = 0
+
+        for key, value in read_records(self.path):
+            self.saved_keys.add(key)
+
+            if not self.cache.contains(key):
+                self.cache.put(key, from_saved_value(value))
+                loaded += 1
+
+        return loaded
+
+    def save(self, records: list[tuple[CacheKey, tuple | None]]) -> None:
+        if not self.path:
+            return
+
+        # The file is replaced at once, so that it's never left torn
+        with open(f"{self.path}.tmp", "wb") as file:
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as saved:
+                    file.write(saved.read())
+
+            file.write(b"".join(encode_record(record) for record in records))
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(f"{self.path}.tmp", self.path)
+
+        self.saved_keys.update(key for key, _ in records)
+
+    def read_pending_batch(self) -> tuple[str, list[CacheKey]] | None:
+        if not self.path or not os.path.exists(f"{self.path}.batch"):
+            return None
+
+        with open(f"{self.path}.batch", encoding="utf-8") as file:
+            pending = json.load(file)
+
+        return (pending["batch_id"], [tuple(key) for key in pending["keys"]])
+
+    def write_pending_batch(self, batch_id: str, keys: list[CacheKey]) -> None:
+        if not self.path:
+            return
+
+        with open(f"{self.path}.batch.tmp", "w", encoding="utf-8") as file:
+            json.dump({"batch_id": batch_id, "keys": keys}, file, ensure_ascii=False)
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(f"{self.path}.batch.tmp", f"{self.path}.batch")
+
+    def remove_pending_batch(self) -> None:
+        if self.path and os.path.exists(f"{self.path}.batch"):
+            os.remove(f"{self.path}.batch")
+
+
+# Invalid terms are saved as None (like they're cached as 'INVALID_TERM')
+
+
+def to_saved_value(translation: Translation | None) -> tuple | None:
+    return translation and translation_to_tuple(translation)
+
+
+def from_saved_value(value: tuple | None) -> Translation | None:
+    return value and translation_from_tuple(value)
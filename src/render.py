@@ -0,0 +1,334 @@
+import html
+import asyncio
+import functools
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from models import Translation, Example
+from utils import time_to_str
+
+# Reminder state needed to render it, as plain (picklable) data:
+# (reminder id, translation, reminders left, interval count, next interval)
+type ReminderView = tuple[int, Translation, int, int, int]
+
+# Inline keyboard button as (label, callback data)
+type Button = tuple[str, str]
+
+# Parts of a rendered reminder that only depend on its translation:
+# (translation text, buttons except 'Stop', 'Stop' button)
+type ReminderParts = tuple[str, list[Button], Button]
+
+# The part of a reminder its parts are rendered from, as sent to the render
+# pool (pickling whole translations, with examples, takes longer than
+# rendering them): (reminder id, source, destination values, whether there's
+# a definition, whether there are examples)
+type PartsInput = tuple[int, str, tuple[str, ...], bool, bool]
+
+# Message text and inline keyboard rows
+type RenderedMessage = tuple[str, list[list[Button]]]
+
+type ReminderKey = tuple[int, int]
+
+# Max number of reminders with cached rendered parts
+RENDER_CACHE_SIZE = 100_000
+
+# Min number of reminders rendered by the pool (fewer are rendered in place,
+# as sending them to worker processes takes longer than rendering them)
+MIN_POOL_REMINDERS = 1000
+
+# Max number of reminders rendered by a single pool task
+POOL_CHUNK_REMINDERS = 2000
+
+# Max number of reminders rendered (or composed) on the event loop at once,
+# which is yielded to in between, so that big reminder waves don't stall it
+RENDER_SLICE_REMINDERS = 250
+
+# ----------------------------------------------------------------
+#  @rendering
+# ----------------------------------------------------------------
+
+
+def to_2d(values: list) -> list[list]:
+    return [values[i : i + 2] for i in range(0, len(values), 2)]
+
+
+def str_dst_values(dst_values: list[str]) -> str:
+    return " / ".join(dst_values)
+
+
+# Translations are made up by OpenAI (or by users, for their terms), so they're
+# escaped in messages sent as HTML
+
+
+def str_translation(translation: Translation) -> str:
+    return str_translation_values(translation.src, translation.get_dst_values())
+
+
+def str_translation_values(src: str, dst_values: list[str]) -> str:
+    dst_str = html.escape(str_dst_values(dst_values))
+    return f"<b>{html.escape(src)}</b> - {dst_str}"
+
+
+def str_examples(examples: list[Example]) -> str:
+    result = [
+        f"<b>{idx + 1}. {html.escape(example.src)}</b>\n"
+        f"Translation: {html.escape(example.dst)}\n"
+        for idx, example in enumerate(examples)
+    ]
+    result = "\n".join(result)
+    return result
+
+
+@functools.lru_cache(maxsize=4096)
+def str_reminder_left(left: int, interval_count: int, next_interval: int) -> str:
+    # Depends on a handful of values only, so it's cached by them
+    if left == 0:
+        return "** last reminder **"
+
+    next_reminder_str = time_to_str(next_interval)
+
+    return "Next reminder in: {}\nReminders left: {}/{}".format(
+        next_reminder_str, left, interval_count
+    )
+
+
+def get_parts_input(reminder_id: int, translation: Translation) -> PartsInput:
+    return (
+        reminder_id,
+        translation.src,
+        tuple(dst.value for dst in translation.dst),
+        bool(translation.definition),
+        any(dst.examples for dst in translation.dst),
+    )
+
+
+def render_parts(reminder_id: int, translation: Translation) -> ReminderParts:
+    return render_input_parts(get_parts_input(reminder_id, translation))
+
+
+def render_input_parts(parts_input: PartsInput) -> ReminderParts:
+    (reminder_id, src, dst_values, has_definition, has_examples) = parts_input
+
+    buttons = []
+
+    # Definition button
+    if has_definition:
+        buttons.append(("Definition", f"definition|{reminder_id}"))
+
+    # Examples button (without collecting the examples)
+    if has_examples:
+        buttons.append(("Examples", f"examples|{reminder_id}"))
+
+    # Review buttons, which adapt the reminder intervals (see 'srs.py')
+    buttons.append(("✅ Knew it", f"knew|{reminder_id}"))
+    buttons.append(("❌ Forgot", f"forgot|{reminder_id}"))
+
+    # Stop button (only shown while reminders are left)
+    stop_button = ("Stop Reminder", f"stop|{reminder_id}")
+
+    return (str_translation_values(src, dst_values), buttons, stop_button)
+
+
+def render_many_parts(parts_inputs: list[PartsInput]) -> list[ReminderParts]:
+    return [render_input_parts(parts_input) for parts_input in parts_inputs]
+
+
+def compose_reminder(
+    view: ReminderView, parts: ReminderParts
+) -> tuple[str, list[Button]]:
+    (_, _, left, interval_count, next_interval) = view
+    (translation_str, buttons, stop_button) = parts
+
+    left_str = str_reminder_left(left, interval_count, next_interval)
+
+    if left > 0:
+        buttons = [*buttons, stop_button]
+
+    return (f"{translation_str}\n\n{left_str}", buttons)
+
+
+def compose_message(reminders: list[tuple[str, list[Button]]]) -> RenderedMessage:
+    if len(reminders) == 1:
+        (text, buttons) = reminders[0]
+        return (text, to_2d(buttons))
+
+    # Reminders sent together are numbered, with a row of buttons each
+    text = "\n\n".join(
+        f"{idx + 1}. {text}" for idx, (text, _) in enumerate(reminders)
+    )
+    rows = [
+        [(f"{idx + 1}. {label}", data) for label, data in buttons]
+        for idx, (_, buttons) in enumerate(reminders)
+    ]
+
+    return (text, rows)
+
+
+# ----------------------------------------------------------------
+#  @cache
+# ----------------------------------------------------------------
+
+
+class RenderCache:
+    # Rendered parts of reminders by (chat id, reminder id), which are valid
+    # as long as the reminder keeps the same translation. Parts depending on
+    # reminders left or intervals are cached by their values instead (see
+    # 'str_reminder_left'), as they change on every reminder call.
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+
+        # Key -> [translation, parts, examples (rendered on first use)]
+        self.entries: OrderedDict[ReminderKey, list] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, chat_id: int, reminder_id: int, translation: Translation
+    ) -> ReminderParts | None:
+        entry = self.get_entry(chat_id, reminder_id, translation)
+        return entry[1] if entry else None
+
+    def put(
+        self,
+        chat_id: int,
+        reminder_id: int,
+        translation: Translation,
+        parts: ReminderParts,
+    ) -> None:
+        self.entries[(chat_id, reminder_id)] = [translation, parts, None]
+        self.entries.move_to_end((chat_id, reminder_id))
+
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_examples(
+        self, chat_id: int, reminder_id: int, translation: Translation
+    ) -> str:
+        entry = self.get_entry(chat_id, reminder_id, translation)
+
+        if not entry:
+            parts = render_parts(reminder_id, translation)
+            self.put(chat_id, reminder_id, translation, parts)
+
+            entry = self.entries[(chat_id, reminder_id)]
+
+        if entry[2] is None:
+            entry[2] = str_examples(translation.get_examples())
+
+        return entry[2]
+
+    def get_entry(
+        self, chat_id: int, reminder_id: int, translation: Translation
+    ) -> list | None:
+        key = (chat_id, reminder_id)
+        entry = self.entries.get(key)
+
+        # Translations are shared and immutable, so identity is enough
+        if entry is None or entry[0] is not translation:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return entry
+
+    def get_stats(self) -> dict[str, float]:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+# ----------------------------------------------------------------
+#  @pool
+# ----------------------------------------------------------------
+
+
+class RenderSlicer:
+    # Yields to the event loop once 'slice_reminders' reminders were rendered
+    # (or composed) since the last time, i.e. while rendering big waves
+
+    def __init__(self, slice_reminders: int = RENDER_SLICE_REMINDERS):
+        self.slice_reminders = slice_reminders
+        self.rendered = 0
+
+    async def add(self, count: int) -> None:
+        self.rendered += count
+
+        if self.rendered >= self.slice_reminders:
+            self.rendered = 0
+            await asyncio.sleep(0)
+
+
+class RenderPool:
+    # Renders reminder parts in worker processes, so that big reminder waves
+    # (e.g. after a restart, with nothing in the render cache) are rendered
+    # by many cores. Without workers (or for fewer reminders than it takes to
+    # pay off), parts are rendered in place, in slices.
+
+    def __init__(
+        self,
+        workers: int = 0,
+        min_reminders: int = MIN_POOL_REMINDERS,
+        chunk_reminders: int = POOL_CHUNK_REMINDERS,
+        slice_reminders: int = RENDER_SLICE_REMINDERS,
+    ):
+        self.workers = workers
+        self.min_reminders = min_reminders
+        self.chunk_reminders = chunk_reminders
+        self.slice_reminders = slice_reminders
+
+        self.executor: ProcessPoolExecutor | None = None
+
+    def start(self) -> None:
+        if self.workers == 0:
+            return
+
+        # Forking a process with running threads (e.g. the HTTP server) is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context)
+
+        # Start the workers right away, instead of on the first reminder wave
+        for _ in range(self.workers):
+            self.executor.submit(render_many_parts, [])
+
+    def stop(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def render(
+        self, reminders: list[tuple[int, Translation]]
+    ) -> list[ReminderParts]:
+        slicer = RenderSlicer(self.slice_reminders)
+
+        if not self.executor or len(reminders) < self.min_reminders:
+            result = []
+
+            for i in range(0, len(reminders), self.slice_reminders):
+                result.extend(
+                    render_parts(*reminder)
+                    for reminder in reminders[i : i + self.slice_reminders]
+                )
+
+                await slicer.add(self.slice_reminders)
+
+            return result
+
+        loop = asyncio.get_running_loop()
+        tasks = []
+
+        for i in range(0, len(reminders), self.chunk_reminders):
+            parts_inputs = []
+
+            for reminder in reminders[i : i + self.chunk_reminders]:
+                parts_inputs.append(get_parts_input(*reminder))
+                await slicer.add(1)
+
+            tasks.append(
+                loop.run_in_executor(self.executor, render_many_parts, parts_inputs)
+            )
+
+        results = await asyncio.gather(*tasks)
+
+        return [parts for result in results for parts in result]
@@ -1,100 +1,376 @@
 import time
 import threading
+from contextlib import contextmanager
+from typing import Callable
+
+import srs
+import metrics
 
 from models import Chat, Reminder, Dictionary
+from scheduler import ReminderScheduler
+from storage import Storage
 
 DEFAULT_REMINDER_INTERVALS = [h * 60 for h in [5, 30, 120, 720, 2880]]
 
-DEFAULT_DICTIONARY = Dictionary("nl", "en")
+DEFAULT_DICTIONARY = Dictionary.of("nl", "en")
+
+# Number of locks that chats are distributed over (by chat id)
+LOCK_SHARDS = 64
+
+# Time (in seconds) after which due reminders that couldn't be called (e.g.
+# on storage errors) are tried again
+CALL_RETRY_DELAY = 5
 
 
 class Repository:
-    def __init__(self):
+    def __init__(self, storage: Storage = None):
         self.chats: dict[int, Chat] = {}
-        self.lock = threading.RLock()
+        self.scheduler = ReminderScheduler()
+        self.storage = storage or Storage()
+
+        # Chats in different shards never contend with each other
+        self.locks = [threading.RLock() for _ in range(LOCK_SHARDS)]
+        self.chats_lock = threading.Lock()
+
+        # Read-only snapshots, which are rebuilt on the next read once outdated
+        self.chats_snapshot: list[Chat] | None = None
+        self.active_reminders_snapshots: dict[int, list[Reminder]] = {}
+
+    @contextmanager
+    def chat_lock(self, chat_id: int):
+        lock = self.locks[chat_id % LOCK_SHARDS]
+        started_at = time.perf_counter()
+
+        with lock:
+            metrics.lock_wait.observe(time.perf_counter() - started_at)
+            yield
+
+    def load_schedule(self, owns: Callable[[int], bool] = None) -> None:
+        # Chats themselves are loaded lazily, on first access
+        for chat_id, reminder_id, next_due in self.storage.load_schedule():
+
+            # Only chats owned by this worker are scheduled (if sharded)
+            if owns and not owns(chat_id):
+                continue
+
+            # Keep reminders that were already rescheduled in the meantime
+            self.scheduler.schedule(chat_id, reminder_id, next_due, replace=False)
+
+    def unload_chats(self, matches: Callable[[int], bool]) -> None:
+        # Forgets matching chats (e.g. owned by other workers now), so that
+        # they're loaded from storage again if needed
+        with self.chats_lock:
+            chat_ids = {id for id in self.chats if matches(id)}
+
+        chat_ids.update(id for id in self.scheduler.get_chat_ids() if matches(id))
+
+        for chat_id in chat_ids:
+            self.unload_chat(chat_id)
+
+    def unload_chat(self, chat_id: int) -> None:
+        with self.chat_lock(chat_id):
+            self.scheduler.unschedule_chat(chat_id)
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            with self.chats_lock:
+                self.chats.pop(chat_id, None)
+                self.chats_snapshot = None
+
+    def reload_chat(self, chat_id: int) -> None:
+        # Reads the schedule of this chat only (the chat is loaded lazily)
+        with self.chat_lock(chat_id):
+            self.unload_chat(chat_id)
+
+            for _, reminder_id, next_due in self.storage.load_chat_schedule(chat_id):
+                self.scheduler.schedule(chat_id, reminder_id, next_due)
 
     # ----------------------------------------------------------------
     #  @reminders
     # ----------------------------------------------------------------
 
     def get_active_reminders(self, chat_id: int) -> list[Reminder]:
-        with self.lock:
+        reminders = self.active_reminders_snapshots.get(chat_id)
+
+        if reminders is not None:
+            return reminders
+
+        with self.chat_lock(chat_id):
             chat = self.get_chat(chat_id)
 
             reminders = chat.reminders.values()
             reminders = [reminder for reminder in reminders if reminder.left > 0]
 
+            self.active_reminders_snapshots[chat_id] = reminders
+
             return reminders
 
     def get_reminder_by_id(self, chat_id: int, reminder_id: int) -> Reminder:
-        with self.lock:
+        with self.chat_lock(chat_id):
             reminder = self.get_chat(chat_id).reminders.get(reminder_id)
             return reminder
 
     def get_reminder_by_value(
         self, chat_id: int, src: str, dictionary: Dictionary
     ) -> Reminder:
-        with self.lock:
+        with self.chat_lock(chat_id):
             chat = self.get_chat(chat_id)
 
-            for reminder in chat.reminders.values():
-                if (
-                    reminder.translation.src == src
-                    and reminder.dictionary == dictionary
-                ):
-                    return reminder
+            reminder_id = chat.find_reminder_id(src, dictionary)
 
-            return None
+            if reminder_id is None:
+                return None
+
+            return chat.reminders.get(reminder_id)
+
+    def get_due_reminders(
+        self, now: float, owns: Callable[[int], bool] = None
+    ) -> list[tuple[Chat, Reminder]]:
+        result = []
+        keys = self.scheduler.pop_due(now)
+
+        for idx, (chat_id, reminder_id) in enumerate(keys):
+            # Chats of other workers are left to them (e.g. while rebalancing),
+            # and scheduled again once owned by this worker (see 'load_schedule')
+            if owns and not owns(chat_id):
+                self.unload_chat(chat_id)
+                continue
+
+            try:
+                due = self.get_due_reminder(chat_id, reminder_id, now)
+            except Exception:
+                # Popped reminders are kept (e.g. if the chat failed to load)
+                self.retry_reminder_calls(keys[idx:], now)
+                raise
+
+            if due:
+                result.append(due)
+
+        return result
+
+    def get_due_reminder(
+        self, chat_id: int, reminder_id: int, now: float
+    ) -> tuple[Chat, Reminder] | None:
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            reminder = chat.reminders.get(reminder_id)
+
+            if not reminder or reminder.left == 0:
+                return None
+
+            # The schedule may be outdated (e.g. if loaded from storage)
+            due_at = self.get_reminder_due(chat, reminder)
+
+            if due_at > now:
+                self.scheduler.schedule(chat_id, reminder_id, due_at)
+                return None
+
+            return (chat, reminder)
+
+    def retry_reminder_calls(self, keys: list[tuple[int, int]], now: float) -> None:
+        # Schedules popped reminders again, unless rescheduled in the meantime
+        for chat_id, reminder_id in keys:
+            retry_at = now + CALL_RETRY_DELAY
+            self.scheduler.schedule(chat_id, reminder_id, retry_at, replace=False)
 
     def update_reminder(self, chat_id: int, reminder: Reminder) -> None:
-        with self.lock:
-            self.get_chat(chat_id).reminders[reminder.id] = reminder
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            chat.reminders[reminder.id] = reminder
+            chat.index_reminder(reminder)
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            next_due = self.schedule_reminder(chat, reminder)
+            self.storage.save_reminder(chat_id, reminder, next_due)
 
     def save_reminder(self, chat_id: int, reminder: Reminder) -> None:
-        with self.lock:
+        with self.chat_lock(chat_id):
             chat = self.get_chat(chat_id)
             chat.reminders[reminder.id] = reminder
             chat.reminder_next_id += 1
+            chat.index_reminder(reminder)
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            next_due = self.schedule_reminder(chat, reminder)
+            self.storage.add_reminder(chat, reminder, next_due)
+
+    def save_reminders(self, chat_id: int, reminders: list[Reminder]) -> None:
+        # Saves all reminders at once (i.e. in a single storage transaction)
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+
+            next_dues = []
+
+            for reminder in reminders:
+                chat.reminders[reminder.id] = reminder
+                chat.reminder_next_id += 1
+                chat.index_reminder(reminder)
+
+                next_dues.append(self.schedule_reminder(chat, reminder))
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            self.storage.add_reminders(chat, reminders, next_dues)
 
     def remove_reminder(self, chat_id: int, reminder_id: int) -> Reminder:
-        with self.lock:
+        with self.chat_lock(chat_id):
             chat = self.get_chat(chat_id)
 
             reminder = chat.reminders[reminder_id]
             reminder.left = 0
 
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            self.scheduler.unschedule(chat_id, reminder_id)
+            self.storage.save_reminder(chat_id, reminder, None)
+
             return reminder
 
     def clear_reminders(self, chat_id: int) -> None:
-        with self.lock:
-            self.get_chat(chat_id).reminders.clear()
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            chat.reminders.clear()
+            chat.reminder_index.clear()
 
-    def handle_reminder_call(self, chat_id: int, reminder_id: int) -> None:
-        with self.lock:
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            self.scheduler.unschedule_chat(chat_id)
+            self.storage.clear_reminders(chat_id)
+
+    def handle_reminder_call(self, chat_id: int, reminder_id: int) -> bool:
+        # Returns False if the reminder was called elsewhere (e.g. by another
+        # worker), in which case the chat is reloaded from storage
+        with self.chat_lock(chat_id):
             chat = self.get_chat(chat_id)
 
             reminder = chat.reminders[reminder_id]
+            called = (reminder.last_at, reminder.left)
+
             reminder.last_at = time.time()
             reminder.left -= 1
 
+            if reminder.left == 0:
+                self.active_reminders_snapshots.pop(chat_id, None)
+
+            next_due = self.schedule_reminder(chat, reminder)
+
+            try:
+                stored = self.storage.call_reminder(chat_id, reminder, called, next_due)
+            except Exception:
+                # Undone, so that the call is retried (and not lost)
+                (reminder.last_at, reminder.left) = called
+                self.active_reminders_snapshots.pop(chat_id, None)
+
+                retry_at = time.time() + CALL_RETRY_DELAY
+                self.scheduler.schedule(chat_id, reminder_id, retry_at)
+                raise
+
+            if stored:
+                return True
+
+            self.reload_chat(chat_id)
+
+            return False
+
+    def review_reminder(
+        self, chat_id: int, reminder_id: int, knew: bool
+    ) -> tuple[Reminder, bool] | None:
+        # Adapts the reminder schedule to whether the user knew the reminder,
+        # and tells whether the review counted (i.e. wasn't a repeated one)
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            reminder = chat.reminders.get(reminder_id)
+
+            if not reminder:
+                return None
+
+            if not srs.review(chat, reminder, knew, time.time()):
+                return (reminder, False)
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            next_due = self.schedule_reminder(chat, reminder)
+            self.storage.save_reminder(chat_id, reminder, next_due)
+
+            return (reminder, True)
+
+    def restart_reminder(self, chat_id: int, reminder_id: int) -> Reminder | None:
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            reminder = chat.reminders.get(reminder_id)
+
+            if not reminder:
+                return None
+
+            srs.restart(chat, reminder, time.time())
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            next_due = self.schedule_reminder(chat, reminder)
+            self.storage.save_reminder(chat_id, reminder, next_due)
+
+            return reminder
+
+    def schedule_reminder(self, chat: Chat, reminder: Reminder) -> float | None:
+        if reminder.left == 0:
+            self.scheduler.unschedule(chat.id, reminder.id)
+            return None
+
+        due_at = self.get_reminder_due(chat, reminder)
+        self.scheduler.schedule(chat.id, reminder.id, due_at)
+
+        return due_at
+
+    def get_reminder_due(self, chat: Chat, reminder: Reminder) -> float:
+        return reminder.last_at + chat.get_reminder_interval(reminder)
+
     # ----------------------------------------------------------------
     #  @chats
     # ----------------------------------------------------------------
 
     def get_chat(self, id: int) -> Chat:
-        with self.lock:
+        chat = self.chats.get(id)
+
+        if chat:
+            return chat
+
+        with self.chat_lock(id):
 
-            if id not in self.chats:
+            if id in self.chats:
+                return self.chats[id]
+
+            chat = self.storage.load_chat(id)
+
+            if not chat:
                 return self.create_chat(id)
 
-            return self.chats[id]
+            for reminder in chat.reminders.values():
+                chat.index_reminder(reminder)
+
+            self.add_chat(chat)
+
+            return chat
 
     def get_all_chats(self) -> list[Chat]:
-        with self.lock:
-            return self.chats.values()
+        chats = self.chats_snapshot
+
+        if chats is not None:
+            return chats
+
+        with self.chats_lock:
+            chats = list(self.chats.values())
+            self.chats_snapshot = chats
+
+            return chats
+
+    def add_chat(self, chat: Chat) -> None:
+        with self.chats_lock:
+            self.chats[chat.id] = chat
+            self.chats_snapshot = None
 
     def create_chat(self, id: int) -> Chat:
-        with self.lock:
+        with self.chat_lock(id):
 
             reminders = {}
             reminder_next_id = 0
@@ -106,19 +382,41 @@ class Repository:
                 DEFAULT_REMINDER_INTERVALS,
                 DEFAULT_DICTIONARY,
             )
-            self.chats[id] = chat
+            self.add_chat(chat)
+            self.storage.save_chat(chat)
 
             return chat
 
     def update_reminder_intervals(
         self, chat_id: int, reminder_intervals: list[int]
     ) -> None:
-        with self.lock:
-            self.get_chat(chat_id).reminder_intervals = reminder_intervals
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+
+            old_count = len(chat.reminder_intervals)
+            chat.reminder_intervals = reminder_intervals
 
-            # Clear entries as they use old intervals
-            self.clear_reminders(chat_id)
+            # Reminders keep their progress, but move to the new intervals
+            reminders = list(chat.reminders.values())
+            srs.migrate(reminders, old_count, len(reminder_intervals))
+
+            next_dues = srs.get_next_dues(chat, reminders)
+
+            self.active_reminders_snapshots.pop(chat_id, None)
+
+            self.scheduler.schedule_many(
+                chat_id,
+                [
+                    (reminder.id, next_due)
+                    for reminder, next_due in zip(reminders, next_dues)
+                    if next_due is not None
+                ],
+            )
+            self.storage.save_chat_and_reminders(chat, reminders, next_dues)
 
     def update_dictionary(self, chat_id: int, dictionary: Dictionary) -> None:
-        with self.lock:
-            self.get_chat(chat_id).dictionary = dictionary
+        with self.chat_lock(chat_id):
+            chat = self.get_chat(chat_id)
+            chat.dictionary = dictionary
+
+            self.storage.save_chat(chat)
@@ -0,0 +1,143 @@
+import heapq
+import threading
+from typing import Callable
+
+type ReminderKey = tuple[int, int]
+
+
+class ReminderScheduler:
+    # Min-heap of (due_at, chat_id, reminder_id). Rescheduled or removed
+    # reminders leave stale heap entries behind, which are skipped on pop
+    # by comparing them against the current due time in 'self.due'.
+
+    def __init__(self):
+        self.heap: list[tuple[float, int, int]] = []
+        self.due: dict[int, dict[int, float]] = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+        # Called with the new due time when it becomes the earliest one
+        self.listener: Callable[[float], None] | None = None
+
+    def schedule(
+        self, chat_id: int, reminder_id: int, due_at: float, replace: bool = True
+    ) -> None:
+        with self.lock:
+            chat_due = self.due.setdefault(chat_id, {})
+
+            if reminder_id not in chat_due:
+                self.size += 1
+            elif not replace:
+                return
+
+            chat_due[reminder_id] = due_at
+            heapq.heappush(self.heap, (due_at, chat_id, reminder_id))
+
+            self.compact()
+            is_earliest = self.peek() == due_at
+
+        if is_earliest and self.listener:
+            self.listener(due_at)
+
+    def schedule_many(self, chat_id: int, entries: list[tuple[int, float]]) -> None:
+        # Schedules many reminders of a chat at once, as (reminder id, due time)
+        if not entries:
+            return
+
+        with self.lock:
+            chat_due = self.due.setdefault(chat_id, {})
+
+            for reminder_id, due_at in entries:
+                if reminder_id not in chat_due:
+                    self.size += 1
+
+                chat_due[reminder_id] = due_at
+
+            # Pushing one by one is slower once the entries outnumber the heap
+            if len(entries) > len(self.heap):
+                self.heap.extend((due_at, chat_id, id) for id, due_at in entries)
+                heapq.heapify(self.heap)
+            else:
+                for reminder_id, due_at in entries:
+                    heapq.heappush(self.heap, (due_at, chat_id, reminder_id))
+
+            self.compact()
+
+            earliest = self.peek()
+            is_earliest = earliest == min(due_at for _, due_at in entries)
+
+        if is_earliest and self.listener:
+            self.listener(earliest)
+
+    def unschedule(self, chat_id: int, reminder_id: int) -> None:
+        with self.lock:
+            chat_due = self.due.get(chat_id)
+
+            if chat_due and chat_due.pop(reminder_id, None) is not None:
+                self.size -= 1
+
+    def unschedule_chat(self, chat_id: int) -> None:
+        with self.lock:
+            chat_due = self.due.pop(chat_id, None)
+
+            if chat_due:
+                self.size -= len(chat_due)
+
+    def pop_due(self, now: float) -> list[ReminderKey]:
+        result = []
+
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                (due_at, chat_id, reminder_id) = heapq.heappop(self.heap)
+
+                if not self.is_current(due_at, chat_id, reminder_id):
+                    continue
+
+                chat_due = self.due[chat_id]
+                del chat_due[reminder_id]
+                self.size -= 1
+
+                if not chat_due:
+                    del self.due[chat_id]
+
+                result.append((chat_id, reminder_id))
+
+        return result
+
+    def get_chat_ids(self) -> list[int]:
+        with self.lock:
+            return list(self.due)
+
+    def next_due(self) -> float | None:
+        with self.lock:
+            return self.peek()
+
+    def __len__(self) -> int:
+        return self.size
+
+    # ----------------------------------------------------------------
+    #  @internal
+    # ----------------------------------------------------------------
+    # The methods below expect 'self.lock' to be held by the caller.
+
+    def is_current(self, due_at: float, chat_id: int, reminder_id: int) -> bool:
+        chat_due = self.due.get(chat_id)
+        return chat_due is not None and chat_due.get(reminder_id) == due_at
+
+    def peek(self) -> float | None:
+        while self.heap and not self.is_current(*self.heap[0]):
+            heapq.heappop(self.heap)
+
+        return self.heap[0][0] if self.heap else None
+
+    def compact(self) -> None:
+        # Rebuild the heap once stale entries outnumber the live ones
+        if len(self.heap) <= 2 * self.size + 64:
+            return
+
+        self.heap = [
+            (due_at, chat_id, reminder_id)
+            for chat_id, chat_due in self.due.items()
+            for reminder_id, due_at in chat_due.items()
+        ]
+        heapq.heapify(self.heap)
@@ -0,0 +1,344 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from telegram import Bot, Message
+from telegram.error import BadRequest, RetryAfter
+
+# Message priorities (lower is sent first)
+INTERACTIVE = 0
+SCHEDULED = 1
+
+# Telegram limits: ~30 messages per second overall, ~1 per second per chat
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+CHAT_MESSAGES_BURST = 3
+
+# Max number of attempts to send a message hitting flood limits
+MAX_SEND_ATTEMPTS = 3
+
+# Time window (in seconds) used to measure throughput
+THROUGHPUT_WINDOW = 10
+
+# Number of chat buckets kept before idle ones are dropped
+MAX_CHAT_BUCKETS = 10_000
+
+# Min time (in seconds) between edits of the same message
+MESSAGE_EDIT_INTERVAL = 1.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def get_delay(self, now: float) -> float:
+        # Returns the time to wait until a token is available
+        self.refill(now)
+
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        if self.tokens >= 1:
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+
+@dataclass(order=True)
+class OutboundMessage:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    request: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class MessageSender:
+    # Sends messages from a priority queue, while keeping within the global
+    # and per-chat rate limits. Messages of rate-limited chats are delayed
+    # without blocking messages of other chats.
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_MESSAGES_PER_SECOND,
+        chat_rate: float = CHAT_MESSAGES_PER_SECOND,
+        chat_burst: float = CHAT_MESSAGES_BURST,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self.ready: list[OutboundMessage] = []
+        self.delayed: list[tuple[float, OutboundMessage]] = []
+        self.seq = itertools.count()
+
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.deliveries: set[asyncio.Task] = set()
+
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+
+        # Enough to hold every message sent within the window
+        max_sent_times = int(global_rate * THROUGHPUT_WINDOW)
+        self.sent_times: deque[float] = deque(maxlen=max_sent_times)
+
+    # ----------------------------------------------------------------
+    #  @sending
+    # ----------------------------------------------------------------
+
+    async def send(
+        self,
+        chat_id: int,
+        request: Callable[[], Awaitable[Any]],
+        priority: int = INTERACTIVE,
+    ) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        message = OutboundMessage(priority, next(self.seq), chat_id, request, future)
+
+        heapq.heappush(self.ready, message)
+        self.wakeup.set()
+
+        return await future
+
+    async def send_message(
+        self,
+        bot: Bot,
+        chat_id: int,
+        text: str,
+        priority: int = INTERACTIVE,
+        **kwargs,
+    ) -> Any:
+        request = lambda: bot.send_message(chat_id, text, **kwargs)
+        return await self.send(chat_id, request, priority)
+
+    # ----------------------------------------------------------------
+    #  @worker
+    # ----------------------------------------------------------------
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+
+    async def run(self) -> None:
+        while True:
+            now = time.monotonic()
+
+            self.release_delayed(now)
+
+            if not self.ready:
+                await self.wait(self.delayed[0][0] - now if self.delayed else None)
+                continue
+
+            message = heapq.heappop(self.ready)
+
+            # The sender is no longer waiting for the message
+            if message.future.done():
+                continue
+
+            chat_bucket = self.get_chat_bucket(message.chat_id)
+            chat_delay = chat_bucket.get_delay(now)
+
+            if chat_delay > 0:
+                heapq.heappush(self.delayed, (now + chat_delay, message))
+                continue
+
+            global_delay = self.global_bucket.get_delay(now)
+
+            if global_delay > 0:
+                heapq.heappush(self.ready, message)
+                await asyncio.sleep(global_delay)
+                continue
+
+            chat_bucket.take()
+            self.global_bucket.take()
+
+            delivery = asyncio.create_task(self.deliver(message))
+            delivery.add_done_callback(self.deliveries.discard)
+
+            self.deliveries.add(delivery)
+
+    async def deliver(self, message: OutboundMessage) -> None:
+        message.attempts += 1
+
+        try:
+            result = await message.request()
+
+        except RetryAfter as error:
+            if message.attempts >= MAX_SEND_ATTEMPTS:
+                self.fail(message, error)
+                return
+
+            self.retries += 1
+
+            # Flood limits may be global as well, so all chats wait for it
+            retry_at = time.monotonic() + error.retry_after
+            self.get_chat_bucket(message.chat_id).pause(retry_at)
+            self.global_bucket.pause(retry_at)
+
+            heapq.heappush(self.delayed, (retry_at, message))
+            self.wakeup.set()
+
+        except Exception as error:
+            self.fail(message, error)
+
+        else:
+            self.sent += 1
+            self.sent_times.append(time.monotonic())
+
+            if not message.future.done():
+                message.future.set_result(result)
+
+    def fail(self, message: OutboundMessage, error: Exception) -> None:
+        self.failed += 1
+
+        if not message.future.done():
+            message.future.set_exception(error)
+
+    async def wait(self, timeout: float | None) -> None:
+        self.wakeup.clear()
+
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    def release_delayed(self, now: float) -> None:
+        while self.delayed and self.delayed[0][0] <= now:
+            (_, message) = heapq.heappop(self.delayed)
+            heapq.heappush(self.ready, message)
+
+    def get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+
+        if bucket:
+            return bucket
+
+        if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+            self.drop_idle_buckets()
+
+        bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self.chat_buckets[chat_id] = bucket
+
+        return bucket
+
+    def drop_idle_buckets(self) -> None:
+        now = time.monotonic()
+
+        self.chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self.chat_buckets.items()
+            if not bucket.is_full(now)
+        }
+
+    # ----------------------------------------------------------------
+    #  @stats
+    # ----------------------------------------------------------------
+
+    def get_queue_depth(self) -> int:
+        return len(self.ready) + len(self.delayed)
+
+    def get_throughput(self) -> float:
+        # Messages sent per second during the last 'THROUGHPUT_WINDOW'
+        window_start = time.monotonic() - THROUGHPUT_WINDOW
+
+        while self.sent_times and self.sent_times[0] < window_start:
+            self.sent_times.popleft()
+
+        return len(self.sent_times) / THROUGHPUT_WINDOW
+
+    def get_stats(self) -> dict[str, float]:
+        return {
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "queue_depth": self.get_queue_depth(),
+            "throughput": self.get_throughput(),
+        }
+
+
+class MessageEditor:
+    # Edits a message progressively (e.g. while its content is streamed),
+    # at most once per 'interval'. Edits are sent through the sender, and
+    # texts replaced before they're sent are skipped.
+
+    def __init__(
+        self,
+        sender: MessageSender,
+        message: Message,
+        interval: float = MESSAGE_EDIT_INTERVAL,
+    ):
+        self.sender = sender
+        self.message = message
+        self.interval = interval
+
+        self.text = message.text
+        self.edited_at = 0.0
+
+        self.pending: tuple[str, dict] | None = None
+        self.task: asyncio.Task | None = None
+
+    def edit(self, text: str, **kwargs) -> None:
+        self.pending = (text, kwargs)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.flush())
+
+    async def finish(self, text: str, **kwargs) -> None:
+        # Unlike intermediate edits, the final one is never skipped
+        self.edit(text, **kwargs)
+        await self.task
+
+    async def flush(self) -> None:
+        while self.pending:
+            delay = self.edited_at + self.interval - time.monotonic()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            (text, kwargs) = self.pending
+            self.pending = None
+
+            if text == self.text and not kwargs.get("reply_markup"):
+                continue
+
+            request = lambda: self.message.edit_text(text, **kwargs)
+
+            try:
+                await self.sender.send(self.message.chat_id, request)
+            except BadRequest as error:
+                # E.g. the message is deleted or its content is not modified
+                if "not modified" not in str(error):
+                    raise
+
+            self.text = text
+            self.edited_at = time.monotonic()
@@ -0,0 +1,77 @@
+import os
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+# Load environment variables (before the bot reads them)
+load_dotenv()
+
+import bot
+from webhook import FORWARDED_HEADER, WebhookReceiver
+
+# Updates are received by webhook (instead of polling) if 'WEBHOOK_URL' is set
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+
+# Telegram Bot API URL, e.g. to use a local Telegram stand-in
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL")
+
+# URL of this worker (reachable by other workers) in multi-worker mode, in
+# which workers sharing 'DATABASE_PATH' split chats between them
+WORKER_URL = os.environ.get("WORKER_URL")
+
+# Telegram sends 'WEBHOOK_SECRET' with every update to prove its origin
+receiver = (
+    WebhookReceiver(os.environ["WEBHOOK_SECRET"], router=bot.route_update)
+    if WEBHOOK_URL
+    else None
+)
+
+# Only one worker could poll for updates, so all of them use the webhook
+if WORKER_URL and not receiver:
+    raise SystemExit("Multi-worker mode ('WORKER_URL') requires 'WEBHOOK_URL'")
+
+# The log storage belongs to a single process, unlike the SQLite database
+if WORKER_URL and bot.STORAGE == "log":
+    raise SystemExit("Multi-worker mode ('WORKER_URL') requires 'STORAGE=sqlite'")
+
+# Initialize Flask app (health checks are answered by 'main.py' while booting)
+app = Flask(__name__)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+@app.route("/telegram", methods=["POST"])
+def telegram_webhook():
+    if not receiver:
+        return jsonify(status="NOT_FOUND"), 404
+
+    secret_token = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+    forwarded = FORWARDED_HEADER in request.headers
+
+    status = receiver.receive(secret_token, request.get_json(force=True), forwarded)
+
+    return "", status
+
+
+def run_bot_polling() -> None:
+    token = os.environ["TOKEN"]
+    bot.run_polling(token, TELEGRAM_API_URL)
+
+
+def run_bot_webhook() -> None:
+    token = os.environ["TOKEN"]
+    bot.run_webhook(token, WEBHOOK_URL, receiver, TELEGRAM_API_URL)
+
+
+def run_bot() -> None:
+    if WORKER_URL:
+        bot.enable_cluster(WORKER_URL)
+
+    if receiver:
+        run_bot_webhook()
+    else:
+        run_bot_polling()
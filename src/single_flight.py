@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+# Called with intermediate results of a call (e.g. partial translations)
+type Listener = Callable[[Any], Awaitable[None]]
+
+# Notifies the listeners of every caller waiting for the call
+type Notify = Callable[[Any], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+        self.listeners: list[Listener] = []
+
+    async def notify(self, value: Any) -> None:
+        for listener in list(self.listeners):
+            # A failing listener belongs to one caller, so the others go on
+            try:
+                await listener(value)
+            except Exception:
+                logger.exception("Failed to notify a listener")
+
+
+class SingleFlight:
+    # Runs at most one call per key at a time. Callers with the same key as
+    # a running call wait for its result (or its error) instead.
+    #
+    # The call runs in its own task, so a caller being cancelled (e.g. by
+    # its timeout) doesn't cancel the call for the others. The call is only
+    # cancelled once every caller is gone.
+
+    def __init__(self):
+        self.flights: dict[Hashable, Flight] = {}
+
+        self.calls = 0
+        self.deduplicated = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.flights
+
+    async def run(
+        self,
+        key: Hashable,
+        call: Callable[[Notify], Awaitable[Any]],
+        listener: Listener | None = None,
+    ) -> Any:
+        flight = self.flights.get(key)
+
+        if flight is None:
+            flight = self.start(key, call)
+            self.calls += 1
+        else:
+            self.deduplicated += 1
+
+        flight.waiters += 1
+
+        if listener:
+            flight.listeners.append(listener)
+
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+
+            if listener:
+                flight.listeners.remove(listener)
+
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self.forget(key, flight)
+
+    def start(self, key: Hashable, call: Callable[[Notify], Awaitable[Any]]) -> Flight:
+        flight = Flight()
+        flight.task = asyncio.ensure_future(call(flight.notify))
+        flight.task.add_done_callback(lambda _: self.forget(key, flight))
+
+        self.flights[key] = flight
+
+        return flight
+
+    def forget(self, key: Hashable, flight: Flight) -> None:
+        # Later callers start a new call (unless a new one is running already)
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def get_stats(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self.flights),
+        }
@@ -0,0 +1,94 @@
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from models import Chat, Reminder
+
+# Spaced repetition in the spirit of SM-2 (as tuned by Anki). The intervals
+# of a chat are the schedule of an average reminder. Every reminder scales
+# them by its ease, which grows when the user knew it and shrinks when the
+# user forgot it (in which case the reminder also starts over).
+
+# Ease of new reminders, i.e. the chat intervals are used as is
+DEFAULT_EASE = 2.5
+
+MIN_EASE = 1.3
+MAX_EASE = 5.0
+
+# Ease change when the user knew a reminder
+KNEW_EASE_BONUS = 0.15
+
+# Ease change when the user forgot a reminder
+FORGOT_EASE_PENALTY = 0.2
+
+
+def get_interval(intervals: list[int], left: int, ease: float) -> int:
+    # Interval (in seconds) until the next reminder, with 'left' reminders left
+    return round(intervals[-left] * ease / DEFAULT_EASE)
+
+
+def get_next_due(chat: "Chat", reminder: "Reminder") -> float | None:
+    if reminder.left == 0:
+        return None
+
+    return reminder.last_at + get_interval(
+        chat.reminder_intervals, reminder.left, reminder.ease
+    )
+
+
+def get_next_dues(
+    chat: "Chat", reminders: Iterable["Reminder"]
+) -> list[float | None]:
+    # Same as 'get_next_due' for many reminders (e.g. a whole chat at once)
+    intervals = chat.reminder_intervals
+
+    return [
+        (
+            reminder.last_at + get_interval(intervals, reminder.left, reminder.ease)
+            if reminder.left > 0
+            else None
+        )
+        for reminder in reminders
+    ]
+
+
+def review(chat: "Chat", reminder: "Reminder", knew: bool, now: float) -> bool:
+    # Updates the reminder after the user told whether they knew it. Returns
+    # False if it was reviewed since its last call already (e.g. buttons
+    # pressed twice) or if it's stopped or finished.
+    if reminder.left == 0 or reminder.reviewed_at >= reminder.last_at:
+        return False
+
+    reminder.reviewed_at = now
+
+    if knew:
+        reminder.ease = min(MAX_EASE, reminder.ease + KNEW_EASE_BONUS)
+        return True
+
+    reminder.ease = max(MIN_EASE, reminder.ease - FORGOT_EASE_PENALTY)
+
+    reminder.last_at = now
+    reminder.left = len(chat.reminder_intervals)
+
+    return True
+
+
+def restart(chat: "Chat", reminder: "Reminder", now: float) -> None:
+    # Starts the reminder over like a new one (e.g. when its term is added
+    # again), forgetting what was learned about it
+    reminder.last_at = now
+    reminder.left = len(chat.reminder_intervals)
+    reminder.ease = DEFAULT_EASE
+    reminder.reviewed_at = 0
+
+
+def migrate(reminders: Iterable["Reminder"], old_count: int, new_count: int) -> None:
+    # Moves reminders to new intervals, keeping their progress (i.e. the share
+    # of reminders already sent). Finished reminders stay finished.
+    for reminder in reminders:
+        if reminder.left == 0:
+            continue
+
+        sent = old_count - reminder.left
+        new_sent = min(new_count - 1, round(sent * new_count / old_count))
+
+        reminder.left = new_count - new_sent
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import builtins
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# Loaded before the settings below, as this module is imported first (before
+# 'server.py' loads them for the rest of the app)
+load_dotenv()
+
+# Set to profile the import time of every top-level package during startup
+PROFILE_STARTUP = os.environ.get("PROFILE_STARTUP") == "1"
+
+# Number of slowest imports reported by the startup profile
+MAX_PROFILED_IMPORTS = 20
+
+started_at = time.perf_counter()
+
+# Duration (in seconds) of every startup phase, in order
+phases: dict[str, float] = {}
+
+# Duration (in seconds) of the first import of top-level packages, including
+# the packages they import in turn
+imports: dict[str, float] = {}
+
+ready = threading.Event()
+ready_in: float | None = None
+
+# ----------------------------------------------------------------
+#  @phases
+# ----------------------------------------------------------------
+
+
+@contextmanager
+def phase(name: str):
+    phase_started_at = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - phase_started_at
+
+
+def mark_ready() -> None:
+    global ready_in
+
+    if not ready.is_set():
+        ready_in = time.perf_counter() - started_at
+        ready.set()
+
+
+# ----------------------------------------------------------------
+#  @imports
+# ----------------------------------------------------------------
+
+
+def profile_imports() -> None:
+    # Times imports of packages that aren't loaded yet (which is only done
+    # during startup, as later imports find them in 'sys.modules')
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        package = name.partition(".")[0]
+
+        if level > 0 or package in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+
+        import_started_at = time.perf_counter()
+
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            imports[package] = time.perf_counter() - import_started_at
+
+    builtins.__import__ = timed_import
+
+
+def get_profile() -> dict:
+    slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)
+
+    to_ms = lambda seconds: round(seconds * 1000, 1)
+
+    return {
+        "uptime_ms": to_ms(time.perf_counter() - started_at),
+        "ready_in_ms": to_ms(ready_in) if ready_in is not None else None,
+        "phases_ms": {name: to_ms(duration) for name, duration in phases.items()},
+        "imports_ms": {
+            package: to_ms(duration)
+            for package, duration in slowest[:MAX_PROFILED_IMPORTS]
+        },
+    }
+
+
+if PROFILE_STARTUP:
+    profile_imports()
@@ -0,0 +1,413 @@
+import os
+import json
+import sqlite3
+import weakref
+import threading
+from dataclasses import asdict
+from typing import Iterator
+
+import srs
+from models import Chat, Reminder, Dictionary, Translation, Destination, Example
+
+type ScheduleEntry = tuple[int, int, float]
+
+# Loaded translations by their JSON, so that reminders share equal ones
+translations: weakref.WeakValueDictionary[str, Translation] = (
+    weakref.WeakValueDictionary()
+)
+
+# ----------------------------------------------------------------
+#  @serialization
+# ----------------------------------------------------------------
+
+
+def translation_to_json(translation: Translation) -> str:
+    return json.dumps(asdict(translation), ensure_ascii=False)
+
+
+def translation_from_json(value: str) -> Translation:
+    translation = translations.get(value)
+
+    if translation:
+        return translation
+
+    json_object = json.loads(value)
+
+    translation = Translation(
+        src=json_object["src"],
+        dst=tuple(
+            Destination(
+                value=dst["value"],
+                examples=tuple(
+                    Example(src=example["src"], dst=example["dst"])
+                    for example in dst["examples"]
+                ),
+            )
+            for dst in json_object["dst"]
+        ),
+        definition=json_object["definition"],
+    )
+
+    translations[value] = translation
+
+    return translation
+
+
+def dictionary_to_str(dictionary: Dictionary) -> str:
+    return f"{dictionary.src}:{dictionary.dst}"
+
+
+def dictionary_from_str(value: str) -> Dictionary:
+    (src, dst) = value.split(":")
+    return Dictionary.of(src, dst)
+
+
+# ----------------------------------------------------------------
+#  @storage
+# ----------------------------------------------------------------
+
+
+class Storage:
+    # Storage that keeps nothing, i.e. the repository is in-memory only.
+    # Persistent backends override every method below.
+
+    def load_chat(self, chat_id: int) -> Chat | None:
+        return None
+
+    def load_schedule(self) -> Iterator[ScheduleEntry]:
+        return iter(())
+
+    def load_chat_schedule(self, chat_id: int) -> list[ScheduleEntry]:
+        return []
+
+    def call_reminder(
+        self,
+        chat_id: int,
+        reminder: Reminder,
+        called: tuple[float, int],
+        next_due: float | None,
+    ) -> bool:
+        return True
+
+    def save_chat(self, chat: Chat) -> None:
+        pass
+
+    def add_reminder(self, chat: Chat, reminder: Reminder, next_due: float) -> None:
+        pass
+
+    def add_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float]
+    ) -> None:
+        pass
+
+    def save_reminder(
+        self, chat_id: int, reminder: Reminder, next_due: float | None
+    ) -> None:
+        pass
+
+    def save_reminders(
+        self, chat_id: int, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        pass
+
+    def save_chat_and_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        pass
+
+    def clear_reminders(self, chat_id: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStorage(Storage):
+    # Every write is a separate transaction touching only the changed rows.
+    # WAL mode lets readers (e.g. the schedule loader) run next to writers,
+    # and a crash never leaves a partially applied write behind.
+
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY,
+            reminder_next_id INTEGER NOT NULL,
+            reminder_intervals TEXT NOT NULL,
+            dictionary TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS reminders (
+            chat_id INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            last_at REAL NOT NULL,
+            reminders_left INTEGER NOT NULL,
+            ease REAL NOT NULL DEFAULT {srs.DEFAULT_EASE},
+            reviewed_at REAL NOT NULL DEFAULT 0,
+            next_due REAL,
+            dictionary TEXT NOT NULL,
+            src TEXT NOT NULL,
+            value TEXT NOT NULL,
+            translation TEXT NOT NULL,
+            PRIMARY KEY (chat_id, id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS reminders_next_due
+            ON reminders (chat_id, next_due);
+
+        CREATE INDEX IF NOT EXISTS reminders_src
+            ON reminders (chat_id, dictionary, src);
+    """
+
+    # Columns added after the table was created, with their definitions
+    MIGRATIONS = {
+        "ease": f"REAL NOT NULL DEFAULT {srs.DEFAULT_EASE}",
+        "reviewed_at": "REAL NOT NULL DEFAULT 0",
+    }
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.connection = self.connect()
+        self.connection.executescript(self.SCHEMA)
+        self.migrate()
+
+    def connect(self) -> sqlite3.Connection:
+        # Waits for the locks held by other workers sharing the database
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+        return connection
+
+    def migrate(self) -> None:
+        columns = {
+            name
+            for (_, name, *_) in self.connection.execute("PRAGMA table_info(reminders)")
+        }
+
+        with self.connection:
+            for name, definition in self.MIGRATIONS.items():
+                if name not in columns:
+                    self.connection.execute(
+                        f"ALTER TABLE reminders ADD COLUMN {name} {definition}"
+                    )
+
+    # ----------------------------------------------------------------
+    #  @loading
+    # ----------------------------------------------------------------
+
+    def load_chat(self, chat_id: int) -> Chat | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT reminder_next_id, reminder_intervals, dictionary "
+                "FROM chats WHERE id = ?",
+                (chat_id,),
+            ).fetchone()
+
+            if not row:
+                return None
+
+            reminder_rows = self.connection.execute(
+                "SELECT id, last_at, reminders_left, dictionary, translation, value, "
+                "ease, reviewed_at FROM reminders WHERE chat_id = ?",
+                (chat_id,),
+            ).fetchall()
+
+        (reminder_next_id, reminder_intervals, dictionary) = row
+
+        reminders = {
+            id: Reminder(
+                id,
+                last_at,
+                left,
+                translation_from_json(translation),
+                dictionary_from_str(reminder_dictionary),
+                value,
+                ease,
+                reviewed_at,
+            )
+            for (
+                id,
+                last_at,
+                left,
+                reminder_dictionary,
+                translation,
+                value,
+                ease,
+                reviewed_at,
+            ) in reminder_rows
+        }
+
+        return Chat(
+            chat_id,
+            reminders,
+            reminder_next_id,
+            json.loads(reminder_intervals),
+            dictionary_from_str(dictionary),
+        )
+
+    def load_schedule(self) -> Iterator[ScheduleEntry]:
+        # Uses its own connection, so that writes are not blocked meanwhile
+        connection = self.connect()
+
+        try:
+            yield from connection.execute(
+                "SELECT chat_id, id, next_due FROM reminders "
+                "WHERE next_due IS NOT NULL"
+            )
+        finally:
+            connection.close()
+
+    def load_chat_schedule(self, chat_id: int) -> list[ScheduleEntry]:
+        # Covered by the 'reminders_next_due' index, i.e. reads no other chats
+        with self.lock:
+            return self.connection.execute(
+                "SELECT chat_id, id, next_due FROM reminders "
+                "WHERE chat_id = ? AND next_due IS NOT NULL",
+                (chat_id,),
+            ).fetchall()
+
+    # ----------------------------------------------------------------
+    #  @writing
+    # ----------------------------------------------------------------
+
+    def save_chat(self, chat: Chat) -> None:
+        with self.lock, self.connection:
+            self.upsert_chat(chat)
+
+    def add_reminder(self, chat: Chat, reminder: Reminder, next_due: float) -> None:
+        with self.lock, self.connection:
+            self.upsert_chat(chat)
+            self.insert_reminder(chat.id, reminder, next_due)
+
+    def add_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float]
+    ) -> None:
+        with self.lock, self.connection:
+            self.upsert_chat(chat)
+
+            for reminder, next_due in zip(reminders, next_dues):
+                self.insert_reminder(chat.id, reminder, next_due)
+
+    def save_reminder(
+        self, chat_id: int, reminder: Reminder, next_due: float | None
+    ) -> None:
+        # Only the reminder state changes after creation, not its translation
+        self.save_reminders(chat_id, [reminder], [next_due])
+
+    def save_reminders(
+        self, chat_id: int, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        with self.lock, self.connection:
+            self.update_reminders(chat_id, reminders, next_dues)
+
+    def save_chat_and_reminders(
+        self, chat: Chat, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        # A single transaction, i.e. reminders never outlive the intervals
+        # they were moved to
+        with self.lock, self.connection:
+            self.upsert_chat(chat)
+            self.update_reminders(chat.id, reminders, next_dues)
+
+    def call_reminder(
+        self,
+        chat_id: int,
+        reminder: Reminder,
+        called: tuple[float, int],
+        next_due: float | None,
+    ) -> bool:
+        # Saves the reminder only if it's still in the 'called' state, i.e.
+        # (last_at, left), so that other workers can't call it as well
+        (last_at, left) = called
+
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "UPDATE reminders SET last_at = ?, reminders_left = ?, next_due = ? "
+                "WHERE chat_id = ? AND id = ? AND last_at = ? AND reminders_left = ?",
+                (
+                    reminder.last_at,
+                    reminder.left,
+                    next_due,
+                    chat_id,
+                    reminder.id,
+                    last_at,
+                    left,
+                ),
+            )
+
+            return cursor.rowcount == 1
+
+    def clear_reminders(self, chat_id: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM reminders WHERE chat_id = ?", (chat_id,)
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def upsert_chat(self, chat: Chat) -> None:
+        self.connection.execute(
+            "INSERT INTO chats (id, reminder_next_id, reminder_intervals, dictionary) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "reminder_next_id = excluded.reminder_next_id, "
+            "reminder_intervals = excluded.reminder_intervals, "
+            "dictionary = excluded.dictionary",
+            (
+                chat.id,
+                chat.reminder_next_id,
+                json.dumps(chat.reminder_intervals),
+                dictionary_to_str(chat.dictionary),
+            ),
+        )
+
+    def insert_reminder(
+        self, chat_id: int, reminder: Reminder, next_due: float | None
+    ) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO reminders "
+            "(chat_id, id, last_at, reminders_left, ease, reviewed_at, next_due, "
+            "dictionary, src, value, translation) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                chat_id,
+                reminder.id,
+                reminder.last_at,
+                reminder.left,
+                reminder.ease,
+                reminder.reviewed_at,
+                next_due,
+                dictionary_to_str(reminder.dictionary),
+                reminder.translation.src,
+                reminder.value,
+                translation_to_json(reminder.translation),
+            ),
+        )
+
+    def update_reminders(
+        self, chat_id: int, reminders: list[Reminder], next_dues: list[float | None]
+    ) -> None:
+        self.connection.executemany(
+            "UPDATE reminders SET last_at = ?, reminders_left = ?, ease = ?, "
+            "reviewed_at = ?, next_due = ? WHERE chat_id = ? AND id = ?",
+            [
+                (
+                    reminder.last_at,
+                    reminder.left,
+                    reminder.ease,
+                    reminder.reviewed_at,
+                    next_due,
+                    chat_id,
+                    reminder.id,
+                )
+                for reminder, next_due in zip(reminders, next_dues)
+            ],
+        )
@@ -1,81 +1,637 @@
 import json
+import time
+import asyncio
+import functools
+from typing import TYPE_CHECKING, Awaitable, Callable
 
-from openai import OpenAI
-
+import metrics
+from cache import CacheKey, TranslationCache, INVALID_TERM
 from models import Translation, Destination, Example
+from partial_json import PartialJsonParser
+from single_flight import Notify, SingleFlight
+from transport import Transport, create_http_client
+from utils import normalize_term
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Max number of translations requested from OpenAI at the same time
+MAX_CONCURRENT_TRANSLATIONS = 16
+
+# Max time (in seconds) to wait for a single translation
+TRANSLATION_TIMEOUT = 30
+
+# Max number of terms translated by a single request (in batch translations)
+MAX_TERMS_PER_REQUEST = 10
+
+# Max time (in seconds) to wait for a batch translation
+BATCH_TRANSLATION_TIMEOUT = 90
+
+# Max time (in seconds) of a single OpenAI request, including its retries
+REQUEST_DEADLINE = 25
+
+# Max time (in seconds) of a batch translation request, including its retries
+BATCH_REQUEST_DEADLINE = 80
+
+# Max number of tokens per translated term
+MAX_TOKENS_PER_TERM = 400
+
+# Max number of cached translations (shared by all chats)
+TRANSLATION_CACHE_SIZE = 100_000
+
+# Time (in seconds) after which a cached translation expires
+TRANSLATION_CACHE_TTL = 7 * 86400
+
+# Created on first use (see 'get_client'), as the OpenAI SDK is slow to import
+client: "AsyncOpenAI | None" = None
 
-client = OpenAI()
+cache = TranslationCache(TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL)
+
+metrics.register_stats(
+    "translation_cache", cache.get_stats, counters={"hits", "misses", "evictions"}
+)
+
+# Looks up translations without OpenAI (e.g. in a local dictionary), or
+# returns None to pass the term on to the next tier
+type Backend = Callable[[CacheKey], Translation | None]
+
+# Tiers tried before the cache and OpenAI, in order (see 'add_backend')
+backends: list[Backend] = []
+
+semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSLATIONS)
+
+# Retries, hedges and fails fast OpenAI requests (hedging is enabled by the bot)
+transport = Transport()
+
+metrics.register_stats(
+    "openai_transport",
+    transport.get_stats,
+    counters={
+        "requests",
+        "retries",
+        "hedged",
+        "failures",
+        "rejected",
+        "circuit_opens",
+    },
+)
+
+# Requests in flight by cache key (or by the keys of a batch chunk), which
+# concurrent translations of the same terms wait for instead of requesting
+flights = SingleFlight()
+
+metrics.register_stats(
+    "translation_flights", flights.get_stats, counters={"calls", "deduplicated"}
+)
+
+EXAMPLE_SCHEMA = {
+    "type": "object",
+    "properties": {"src": {"type": "string"}, "dst": {"type": "string"}},
+    "required": ["src", "dst"],
+    "additionalProperties": False,
+}
+
+DESTINATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "value": {"type": "string"},
+        "examples": {"type": "array", "items": EXAMPLE_SCHEMA},
+    },
+    "required": ["value", "examples"],
+    "additionalProperties": False,
+}
+
+# Strict schemas require every field, so invalid terms are marked by 'valid'
+# (which comes first, so streamed translations are known to be valid early)
+TRANSLATION_PROPERTIES = {
+    "valid": {"type": "boolean"},
+    "corrected_term": {"type": "string"},
+    "translations": {"type": "array", "items": DESTINATION_SCHEMA},
+    "definition": {"type": "string"},
+}
 
 JSON_SCHEMA = {
-    "corrected_term": "string",
-    "translations": [
-        {
-            "value": "string",
-            "examples": [{"src": "string", "dst": "string"}],
-        }
-    ],
-    "definition": "string",
+    "name": "translation",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": TRANSLATION_PROPERTIES,
+        "required": list(TRANSLATION_PROPERTIES),
+        "additionalProperties": False,
+    },
+}
+
+BATCH_JSON_SCHEMA = {
+    "name": "translations",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "terms": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "term": {"type": "string"},
+                        **TRANSLATION_PROPERTIES,
+                    },
+                    "required": ["term", *TRANSLATION_PROPERTIES],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["terms"],
+        "additionalProperties": False,
+    },
 }
 
+# Called with partial translations, as they're streamed
+type PartialCallback = Callable[[Translation], Awaitable[None]]
+
+# Passed to 'translate' unless the caller looked the term up already
+NOT_LOOKED_UP = object()
+
 
-def translate(
+async def translate(
     value: str,
     src_lang: str,
     dst_lang: str,
     translation_count: int,
     examples_per_translation_count: int,
+    timeout: float = TRANSLATION_TIMEOUT,
+    on_partial: PartialCallback | None = None,
+    cached: Translation | object | None = NOT_LOOKED_UP,
 ) -> Translation:
-    
-    json_schema_str = json.dumps(JSON_SCHEMA)
-
-    system_message = (
-        "Given a term, source and destination languages, "
-        "correct all errors, including typos, grammatical errors, incorrect collocations, improper word choices, and non-idiomatic expressions. "
-        "For example, if the input is 'ik ben hunger', correct it to 'ik heb honger'. "
-        f"Translate the corrected term or phrase using up to {translation_count} unique and non-redundant translations. "
-        "Each translation must be distinct in wording, phrasing, or style, and must not simply be a rewording or synonym substitution of the same translation. "
-        f"For each translation, provide {examples_per_translation_count} unique and non-redundant examples. "
-        "Each example must be provided in both the source language (marked as 'src') and the destination language (marked as 'dst'). "
-        "Ensure that each example offers a distinct context, scenario, or usage, avoiding repetition of similar sentences or ideas. "
-        "Include the term's definition in the source language. "
-        "If the term is not in the source language, is invalid, or unrecognized, return an empty JSON object. "
-        f"Format the response as JSON: {{{json_schema_str}}}"
+    # If 'on_partial' is set, the translation is streamed and the callback
+    # is called whenever more of it is known (only if it's not cached). The
+    # result of 'get_cached' may be passed as 'cached', so that the tiers
+    # aren't asked (and their hits and misses counted) twice.
+
+    key = cache.key(
+        value, src_lang, dst_lang, translation_count, examples_per_translation_count
+    )
+
+    if cached is NOT_LOOKED_UP:
+        cached = lookup(key)
+
+    if cached is INVALID_TERM:
+        return None
+
+    if cached:
+        return cached
+
+    # Streamed flights serve every caller, but non-streamed ones have no
+    # partial translations, so callers wanting them never join those
+    streamed = on_partial is not None or get_stream_key(key) in flights
+
+    async def request(notify: PartialCallback) -> Translation:
+        async with semaphore:
+            translation = await request_translation(
+                value,
+                src_lang,
+                dst_lang,
+                translation_count,
+                examples_per_translation_count,
+                notify if streamed else None,
+            )
+
+        cache.put(key, translation)
+
+        return translation
+
+    flight_key = get_stream_key(key) if streamed else key
+
+    # Waiting for a free slot (or for the same translation requested by
+    # another chat) counts towards the timeout as well
+    async with asyncio.timeout(timeout):
+        return await flights.run(flight_key, request, on_partial)
+
+
+def get_stream_key(key: CacheKey) -> tuple:
+    # Flight key of a streamed translation
+    return (key, "stream")
+
+
+def is_in_flight(key: CacheKey) -> bool:
+    return key in flights or get_stream_key(key) in flights
+
+
+def get_cached(
+    value: str,
+    src_lang: str,
+    dst_lang: str,
+    translation_count: int,
+    examples_per_translation_count: int,
+) -> Translation | object | None:
+    # Returns the translation known without OpenAI (like 'lookup')
+    key = cache.key(
+        value, src_lang, dst_lang, translation_count, examples_per_translation_count
+    )
+
+    return lookup(key)
+
+
+def add_backend(backend: Backend) -> None:
+    backends.append(backend)
+
+
+def lookup(key: CacheKey) -> Translation | object | None:
+    # Returns the translation of the first tier knowing the term (and
+    # INVALID_TERM or None like the cache)
+    for backend in backends:
+        translation = backend(key)
+
+        if translation:
+            return translation
+
+    return cache.get(key)
+
+
+async def translate_many(
+    values: list[str],
+    src_lang: str,
+    dst_lang: str,
+    translation_count: int,
+    examples_per_translation_count: int,
+    timeout: float = BATCH_TRANSLATION_TIMEOUT,
+) -> list[Translation | None]:
+
+    keys = [
+        cache.key(
+            value, src_lang, dst_lang, translation_count, examples_per_translation_count
+        )
+        for value in values
+    ]
+
+    translations = {}
+    missing_values = {}
+
+    for value, key in zip(values, keys):
+        cached = lookup(key)
+
+        if cached is INVALID_TERM:
+            translations[key] = None
+        elif cached:
+            translations[key] = cached
+        else:
+            missing_values.setdefault(key, value)
+
+    # Missing terms are translated in chunks, which are requested in parallel
+    missing = list(missing_values.items())
+
+    chunks = [
+        missing[i : i + MAX_TERMS_PER_REQUEST]
+        for i in range(0, len(missing), MAX_TERMS_PER_REQUEST)
+    ]
+
+    async def request_chunk(chunk: list[tuple[CacheKey, str]]) -> dict:
+        values = [value for _, value in chunk]
+
+        async with semaphore:
+            chunk_translations = await request_translations(
+                values,
+                src_lang,
+                dst_lang,
+                translation_count,
+                examples_per_translation_count,
+            )
+
+        result = {}
+
+        for key, value in chunk:
+            # Terms skipped in the response are not cached as invalid
+            if normalize_term(value) not in chunk_translations:
+                continue
+
+            translation = chunk_translations[normalize_term(value)]
+
+            cache.put(key, translation)
+            result[key] = translation
+
+        return result
+
+    async def translate_chunk(chunk: list[tuple[CacheKey, str]]) -> dict:
+        # Terms being translated already are waited for, instead of requested
+        joined = [(key, value) for key, value in chunk if is_in_flight(key)]
+        requested = [(key, value) for key, value in chunk if not is_in_flight(key)]
+
+        async def join(key: CacheKey, value: str) -> dict:
+            return {
+                key: await translate(
+                    value,
+                    src_lang,
+                    dst_lang,
+                    translation_count,
+                    examples_per_translation_count,
+                    # Missed already, i.e. the tiers aren't asked again
+                    cached=None,
+                )
+            }
+
+        async def request(notify: Notify) -> dict:
+            return await request_chunk(requested)
+
+        # Identical chunks (e.g. the same list added by many chats) are
+        # requested once as well
+        chunk_key = tuple(key for key, _ in requested)
+
+        results = await asyncio.gather(
+            *(join(key, value) for key, value in joined),
+            *([flights.run(chunk_key, request)] if requested else []),
+        )
+
+        return {key: value for result in results for key, value in result.items()}
+
+    async with asyncio.timeout(timeout):
+        results = await asyncio.gather(*(translate_chunk(chunk) for chunk in chunks))
+
+    for result in results:
+        translations.update(result)
+
+    return [translations.get(key) for key in keys]
+
+
+# Instructions shared by all requests. OpenAI caches prompt prefixes, so
+# everything that varies (counts, then terms and languages) comes after them.
+INSTRUCTIONS = (
+    "Given a term, source and destination languages, "
+    "correct all errors, including typos, grammatical errors, incorrect collocations, improper word choices, and non-idiomatic expressions. "
+    "For example, if the input is 'ik ben hunger', correct it to 'ik heb honger'. "
+    "Translate the corrected term or phrase using unique and non-redundant translations. "
+    "Each translation must be distinct in wording, phrasing, or style, and must not simply be a rewording or synonym substitution of the same translation. "
+    "For each translation, provide unique and non-redundant examples. "
+    "Each example must be provided in both the source language (marked as 'src') and the destination language (marked as 'dst'). "
+    "Ensure that each example offers a distinct context, scenario, or usage, avoiding repetition of similar sentences or ideas. "
+    "Include the term's definition in the source language. "
+)
+
+SINGLE_INSTRUCTIONS = (
+    INSTRUCTIONS
+    + "If the term is not in the source language, is invalid, or unrecognized, set 'valid' to false and leave the other fields empty. "
+)
+
+BATCH_INSTRUCTIONS = (
+    INSTRUCTIONS
+    + "You are given a list of terms. Handle each term separately as described above, "
+    "and return it in 'term' exactly as given. "
+    "If a term is not in the source language, is invalid, or unrecognized, set its 'valid' to false and leave its other fields empty. "
+)
+
+
+@functools.cache
+def get_system_message(
+    instructions: str, translation_count: int, examples_per_translation_count: int
+) -> str:
+    # Built once per counts, so the prompt is the same (byte for byte) for
+    # every request with them
+    return (
+        instructions
+        + f"Provide up to {translation_count} translations, "
+        f"with {examples_per_translation_count} examples each."
+    )
+
+
+async def request_translation(
+    value: str,
+    src_lang: str,
+    dst_lang: str,
+    translation_count: int,
+    examples_per_translation_count: int,
+    on_partial: PartialCallback | None = None,
+) -> Translation:
+
+    messages = get_translation_messages(
+        value, src_lang, dst_lang, translation_count, examples_per_translation_count
+    )
+
+    if on_partial:
+        json_object = await request_completion_stream(
+            messages, 1, JSON_SCHEMA, on_partial
+        )
+    else:
+        json_object = await request_completion(messages, 1, JSON_SCHEMA)
+
+    return parse_translation(json_object)
+
+
+def get_translation_messages(
+    value: str,
+    src_lang: str,
+    dst_lang: str,
+    translation_count: int,
+    examples_per_translation_count: int,
+) -> list[dict]:
+
+    system_message = get_system_message(
+        SINGLE_INSTRUCTIONS, translation_count, examples_per_translation_count
     )
 
     user_message = f"Term: {value}; Source language: {src_lang}; Destination language: {dst_lang}"
 
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def request_translations(
+    values: list[str],
+    src_lang: str,
+    dst_lang: str,
+    translation_count: int,
+    examples_per_translation_count: int,
+) -> dict[str, Translation | None]:
+    # Returns translations by normalized terms (None for invalid terms)
+
+    system_message = get_system_message(
+        BATCH_INSTRUCTIONS, translation_count, examples_per_translation_count
+    )
+
+    terms_str = json.dumps(values, ensure_ascii=False)
+    user_message = f"Terms: {terms_str}; Source language: {src_lang}; Destination language: {dst_lang}"
+
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": user_message},
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        response_format={"type": "json_object"},
-        temperature=0,
-        max_tokens=400,
-        top_p=1,
+    json_object = await request_completion(
+        messages, len(values), BATCH_JSON_SCHEMA
+    )
+
+    return {
+        normalize_term(item["term"]): parse_translation(item)
+        for item in json_object["terms"]
+    }
+
+
+def get_client() -> "AsyncOpenAI":
+    global client
+
+    if client is None:
+        from openai import AsyncOpenAI
+
+        # Requests are retried by the transport (and not by the SDK as well)
+        client = AsyncOpenAI(http_client=create_http_client(), max_retries=0)
+
+    return client
+
+
+async def request_completion(
+    messages: list[dict], term_count: int, json_schema: dict
+) -> dict:
+    params = get_completion_params(messages, term_count, json_schema)
+
+    async def request():
+        return await get_client().chat.completions.create(**params)
+
+    (kind, deadline) = (
+        ("completion", REQUEST_DEADLINE)
+        if term_count == 1
+        else ("batch_completion", BATCH_REQUEST_DEADLINE)
     )
 
+    with metrics.translation_latency.time():
+        response = await transport.call(request, kind, deadline)
+
+    if response.usage:
+        record_usage(response.usage)
+
     content = response.choices[0].message.content
 
-    json_object = json.loads(content)
+    return json.loads(content)
+
+
+async def request_completion_stream(
+    messages: list[dict],
+    term_count: int,
+    json_schema: dict,
+    on_partial: PartialCallback,
+) -> dict:
+    params = get_completion_params(messages, term_count, json_schema)
+
+    parser = PartialJsonParser()
+    partial = None
+
+    started_at = time.monotonic()
+
+    # Only opening the stream is retried, as partial translations may have
+    # been reported once it's read
+    async def request():
+        return await get_client().chat.completions.create(
+            **params, stream=True, stream_options={"include_usage": True}
+        )
+
+    with metrics.translation_latency.time():
+        stream = await transport.call(request, "stream", REQUEST_DEADLINE)
+
+        async for chunk in stream:
+            if chunk.usage:
+                record_usage(chunk.usage)
+
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+
+            parser.feed(chunk.choices[0].delta.content)
+
+            translation = parse_partial_translation(parser.get())
+
+            # Only translations with more of the content known are reported
+            if translation is None or translation == partial:
+                continue
+
+            if partial is None:
+                metrics.translation_first_content.observe(time.monotonic() - started_at)
+
+            partial = translation
+
+            await on_partial(translation)
+
+    return json.loads("".join(parser.text))
+
+
+def get_cached_tokens(usage) -> int:
+    # Prompt tokens of a prefix cached by OpenAI (which older SDKs don't parse)
+    details = getattr(usage, "prompt_tokens_details", None)
+
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+
+    return (details and details.cached_tokens) or 0
+
+
+def record_usage(usage) -> None:
+    cached_tokens = get_cached_tokens(usage)
+
+    tokens = metrics.translation_tokens
+    tokens.labels("prompt").inc(usage.prompt_tokens)
+    tokens.labels("cached").inc(cached_tokens)
+    tokens.labels("completion").inc(usage.completion_tokens)
+
+    metrics.translation_prompt_tokens.labels("prompt").observe(usage.prompt_tokens)
+    metrics.translation_prompt_tokens.labels("cached").observe(cached_tokens)
+
+
+def get_completion_params(
+    messages: list[dict], term_count: int, json_schema: dict = JSON_SCHEMA
+) -> dict:
+    return {
+        "model": "gpt-4o-mini",
+        "messages": messages,
+        "response_format": {"type": "json_schema", "json_schema": json_schema},
+        "temperature": 0,
+        "max_tokens": MAX_TOKENS_PER_TERM * term_count,
+        "top_p": 1,
+    }
+
+
+def parse_partial_translation(json_object: dict | None) -> Translation | None:
+    # Known once the corrected term and the first translation are complete
+    if not isinstance(json_object, dict) or not json_object.get("valid"):
+        return None
 
     if not "corrected_term" in json_object:
         return None
 
+    dst = tuple(
+        Destination(
+            value=dst["value"],
+            examples=tuple(
+                Example(src=example["src"], dst=example["dst"])
+                for example in dst.get("examples", [])
+                if "src" in example and "dst" in example
+            ),
+        )
+        for dst in json_object.get("translations", [])
+        if "value" in dst
+    )
+
+    if len(dst) == 0:
+        return None
+
+    return Translation(
+        src=json_object["corrected_term"],
+        dst=dst,
+        definition=json_object.get("definition", ""),
+    )
+
+
+def parse_translation(json_object: dict) -> Translation | None:
+    # The response follows the strict schema, so every field is there
+    if not json_object["valid"]:
+        return None
+
     return Translation(
         src=json_object["corrected_term"],
-        dst=[
+        dst=tuple(
             Destination(
                 value=dst["value"],
-                examples=[
+                examples=tuple(
                     Example(src=example["src"], dst=example["dst"])
                     for example in dst["examples"]
-                ],
+                ),
             )
             for dst in json_object["translations"]
-        ],
+        ),
         definition=json_object["definition"],
     )
@@ -0,0 +1,386 @@
+import time
+import random
+import asyncio
+import logging
+import importlib.util
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+# Max number of open connections to OpenAI (translations and their hedges)
+MAX_CONNECTIONS = 64
+
+# Max number of idle connections kept open, and for how long (in seconds)
+MAX_KEEPALIVE_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 120
+
+# Timeouts (in seconds) of a single attempt. Non-streamed batch completions
+# only respond once complete, so reads may take long (the deadline of the
+# whole request cuts them short).
+TIMEOUT = httpx.Timeout(connect=5, read=60, write=10, pool=10)
+
+# Max number of attempts per request (i.e. the first one and retries)
+MAX_ATTEMPTS = 4
+
+# Retries wait a random time up to the base delay (doubled by every retry)
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8
+
+# Status codes worth retrying (timeouts, conflicts, rate limits, and errors
+# of OpenAI itself)
+RETRY_STATUSES = {408, 409, 429}
+
+# Status codes meaning that no request can succeed (e.g. a revoked API key),
+# which aren't retried but count as failures of OpenAI, unlike other errors
+# of requests
+FATAL_STATUSES = {401, 403}
+
+# Quantile of recent latencies after which a request is hedged
+HEDGE_QUANTILE = 0.95
+
+# Number of recent latencies (per kind of request) the quantile is taken of,
+# and the number needed before requests are hedged
+HEDGE_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+
+# The circuit opens (i.e. requests fail right away) once at least this share
+# of recent requests failed (after their retries), and stays open for a while
+# (in seconds)
+CIRCUIT_FAILURE_RATIO = 0.5
+CIRCUIT_OPEN_DURATION = 30
+
+# Number of recent requests the failure ratio is taken of, and the number
+# needed before the circuit opens
+CIRCUIT_WINDOW = 50
+CIRCUIT_MIN_REQUESTS = 20
+
+# HTTP/2 needs the optional 'h2' package
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    # Raised while the circuit is open, and once retries of a request are
+    # exhausted (with the last error as its cause)
+    pass
+
+
+def create_http_client() -> httpx.AsyncClient:
+    # Shared by all requests, so connections are reused (and multiplexed
+    # over HTTP/2)
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_retry_after(error: Exception) -> float | None:
+    # Delay (in seconds) requested by OpenAI, e.g. when rate limited
+    response = getattr(error, "response", None)
+
+    if response is None:
+        return None
+
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    # Network errors, timeouts and errors of OpenAI itself (not of requests)
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, (APIConnectionError, httpx.TransportError)):
+        return True
+
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUSES or error.status_code >= 500
+
+    return False
+
+
+def is_fatal(error: Exception) -> bool:
+    from openai import APIStatusError
+
+    return isinstance(error, APIStatusError) and error.status_code in FATAL_STATUSES
+
+
+# ----------------------------------------------------------------
+#  @circuit_breaker
+# ----------------------------------------------------------------
+
+
+class CircuitBreaker:
+    # Closed while most requests succeed. Opens when many recent requests
+    # failed (i.e. retries didn't help), and then rejects requests until the
+    # open duration passes. Then a single request probes OpenAI (half-open),
+    # which closes the circuit again if it succeeds.
+
+    def __init__(
+        self,
+        failure_ratio: float = CIRCUIT_FAILURE_RATIO,
+        open_duration: float = CIRCUIT_OPEN_DURATION,
+    ):
+        self.failure_ratio = failure_ratio
+        self.open_duration = open_duration
+
+        # Outcomes of recent requests (True if failed)
+        self.outcomes: deque[bool] = deque(maxlen=CIRCUIT_WINDOW)
+        self.opened_at: float | None = None
+
+        # Start of the probe (a probe of a cancelled request is given up on
+        # after the open duration as well)
+        self.probed_at: float | None = None
+
+        # Called when the circuit opens (e.g. to tell the developer once)
+        self.listener: Callable[[], None] | None = None
+
+        self.opens = 0
+
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        now = time.monotonic()
+
+        if now - self.opened_at < self.open_duration:
+            return False
+
+        if self.probed_at and now - self.probed_at < self.open_duration:
+            return False
+
+        self.probed_at = now
+
+        return True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("OpenAI circuit closed")
+            self.outcomes.clear()
+
+        self.outcomes.append(False)
+        self.opened_at = None
+        self.probed_at = None
+
+    def record_failure(self) -> None:
+        self.outcomes.append(True)
+
+        # A failed probe opens the circuit for another duration
+        if self.probed_at or (self.opened_at is None and self.is_failing()):
+            self.open()
+
+    def is_failing(self) -> bool:
+        if len(self.outcomes) < CIRCUIT_MIN_REQUESTS:
+            return False
+
+        return sum(self.outcomes) >= self.failure_ratio * len(self.outcomes)
+
+    def open(self) -> None:
+        was_open = self.opened_at is not None
+
+        self.opened_at = time.monotonic()
+        self.probed_at = None
+
+        if was_open:
+            return
+
+        self.opens += 1
+
+        failures = sum(self.outcomes)
+        logger.error(f"OpenAI circuit opened after {failures} recent failures")
+
+        if self.listener:
+            self.listener()
+
+
+# ----------------------------------------------------------------
+#  @transport
+# ----------------------------------------------------------------
+
+
+class Transport:
+    # Runs OpenAI requests with jittered retries within a deadline, hedges
+    # slow ones (if enabled) with a second request and fails fast while the
+    # circuit is open. Requests are functions making a single attempt (with
+    # a client without retries of its own).
+
+    def __init__(self, hedging: bool = False, breaker: CircuitBreaker | None = None):
+        self.hedging = hedging
+        self.breaker = breaker or CircuitBreaker()
+
+        # Kind of request -> recent latencies of successful attempts
+        self.latencies: dict[str, deque[float]] = {}
+
+        self.requests = 0
+        self.retries = 0
+        self.hedged = 0
+        self.failures = 0
+        self.rejected = 0
+
+    async def call(
+        self, request: Callable[[], Awaitable[Any]], kind: str, deadline: float
+    ) -> Any:
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise UpstreamUnavailable("OpenAI is unavailable")
+
+        self.requests += 1
+
+        deadline_at = time.monotonic() + deadline
+
+        # The breaker sees a single outcome per request, i.e. failed attempts
+        # that were retried successfully don't count
+        try:
+            async with asyncio.timeout(deadline):
+                result = await self.retry(request, kind, deadline_at)
+        except TimeoutError:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        except UpstreamUnavailable:
+            self.breaker.record_failure()
+            raise
+        except Exception as error:
+            # A bad request doesn't mean OpenAI is unhealthy, but a bad API key
+            # fails every request (so the circuit opens, instead of every
+            # message making a failing request)
+            if is_fatal(error):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            raise
+
+        self.breaker.record_success()
+
+        return result
+
+    async def retry(
+        self, request: Callable[[], Awaitable[Any]], kind: str, deadline_at: float
+    ) -> Any:
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                result = await self.attempt(request, kind)
+            except Exception as error:
+                if not is_retryable(error):
+                    raise
+
+                self.failures += 1
+
+                delay = self.get_retry_delay(attempt, error)
+
+                last = attempt == MAX_ATTEMPTS - 1
+
+                # No use waiting for a retry past the deadline
+                if last or self.breaker.is_open() or (
+                    time.monotonic() + delay > deadline_at
+                ):
+                    raise UpstreamUnavailable("OpenAI is unavailable") from error
+
+                logger.warning(f"Retrying OpenAI request in {delay:.2f}s: {error}")
+
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+
+            return result
+
+    async def attempt(self, request: Callable[[], Awaitable[Any]], kind: str) -> Any:
+        delay = self.get_hedge_delay(kind)
+
+        started_at = time.monotonic()
+
+        if delay is None:
+            result = await request()
+        else:
+            result = await self.hedge(request, delay)
+
+        latencies = self.latencies.setdefault(kind, deque(maxlen=HEDGE_SAMPLES))
+        latencies.append(time.monotonic() - started_at)
+
+        return result
+
+    async def hedge(self, request: Callable[[], Awaitable[Any]], delay: float) -> Any:
+        # Starts a second request if the first one is slower than usual, and
+        # returns the first successful result (or the last error)
+        tasks = [asyncio.ensure_future(request())]
+
+        (done, pending) = await asyncio.wait(tasks, timeout=delay)
+
+        if not done:
+            self.hedged += 1
+            tasks.append(asyncio.ensure_future(request()))
+            pending = set(tasks)
+
+        winner = None
+
+        try:
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result()
+
+                if not pending:
+                    raise task.exception()
+
+                (done, pending) = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    await self.discard(task)
+
+    async def discard(self, task: asyncio.Future) -> None:
+        # Cancels a losing request, or closes its stream if it's done as well
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            close = getattr(task.result(), "close", None)
+
+            if close:
+                await close()
+
+    def get_hedge_delay(self, kind: str) -> float | None:
+        latencies = self.latencies.get(kind)
+
+        if not self.hedging or not latencies or len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+
+        ordered = sorted(latencies)
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_QUANTILE))]
+
+    def get_retry_delay(self, attempt: int, error: Exception) -> float:
+        # Full jitter, i.e. retries of many requests are spread out
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+        retry_after = get_retry_after(error)
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+
+        return delay
+
+    def get_stats(self) -> dict[str, float]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "circuit_opens": self.breaker.opens,
+            "circuit_open": int(self.breaker.is_open()),
+        }
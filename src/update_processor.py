@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Max number of updates waiting for earlier updates of their chat (more wait
+# in the update queue)
+MAX_WAITING_UPDATES = 10_000
+
+
+def get_chat_id(update: object) -> int | None:
+    # Like 'get_update_chat_id', updates without a chat go by the user
+    if not isinstance(update, Update):
+        return None
+
+    if update.effective_chat:
+        return update.effective_chat.id
+
+    if update.effective_user:
+        return update.effective_user.id
+
+    return None
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    # Handles updates of different chats concurrently, but updates of the
+    # same chat one after another, in order (e.g. so that two quick messages
+    # with the same term never both create a reminder). Updates waiting for
+    # their chat don't count towards 'max_concurrent_updates', so a chat
+    # sending many at once doesn't hold up the others.
+
+    def __init__(self, max_concurrent_updates: int):
+        # The limit of the base class is held while waiting for the chat
+        super().__init__(MAX_WAITING_UPDATES)
+
+        self.semaphore = asyncio.Semaphore(max_concurrent_updates)
+
+        # Locks of chats with updates being handled, and their number
+        self.chat_locks: dict[int, asyncio.Lock] = {}
+        self.chat_updates: dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        chat_id = get_chat_id(update)
+
+        if chat_id is None:
+            async with self.semaphore:
+                await coroutine
+            return
+
+        # Locks are fair, i.e. acquired in the order of the updates
+        lock = self.chat_locks.get(chat_id)
+
+        if lock is None:
+            lock = self.chat_locks[chat_id] = asyncio.Lock()
+
+        self.chat_updates[chat_id] = self.chat_updates.get(chat_id, 0) + 1
+
+        try:
+            async with lock, self.semaphore:
+                await coroutine
+        finally:
+            self.chat_updates[chat_id] -= 1
+
+            if self.chat_updates[chat_id] == 0:
+                del self.chat_updates[chat_id]
+                del self.chat_locks[chat_id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
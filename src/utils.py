@@ -49,3 +49,20 @@ def str_to_time(str: str) -> int:
                 return str_to_time_by_unit(str, unit)
 
     return -1
+
+
+def normalize_term(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+def split_values(text: str) -> list[str]:
+    values = {}
+
+    # Duplicates are skipped (in the order of appearance)
+    for line in text.splitlines():
+        value = line.strip()
+
+        if value:
+            values.setdefault(normalize_term(value), value)
+
+    return list(values.values())
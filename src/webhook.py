@@ -0,0 +1,122 @@
+import hmac
+import json
+import asyncio
+import urllib.error
+import urllib.request
+from typing import Callable
+
+from telegram import Update
+from telegram.ext import Application
+
+# Max number of received updates waiting to be handled
+MAX_PENDING_UPDATES = 1000
+
+# Max time (in seconds) to wait for another worker to accept an update
+FORWARD_TIMEOUT = 5
+
+# Marks updates forwarded by other workers (so that they're never forwarded again)
+FORWARDED_HEADER = "X-Oneling-Forwarded"
+
+# Returns the URL of the worker that should handle the update (None if local)
+type UpdateRouter = Callable[[dict], str | None]
+
+
+def get_update_chat_id(data: dict) -> int | None:
+    # The chat is nested into the update, e.g. 'message' or 'callback_query'
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+
+        if chat:
+            return chat["id"]
+
+        # Updates without a chat (e.g. inline queries) go by the user
+        if "from" in value:
+            return value["from"]["id"]
+
+    return None
+
+
+class WebhookReceiver:
+    # Receives updates from the HTTP server thread and feeds them into the
+    # update queue of the application, which runs in its own event loop.
+
+    def __init__(
+        self,
+        secret_token: str,
+        max_pending_updates=MAX_PENDING_UPDATES,
+        router: UpdateRouter | None = None,
+    ):
+        self.secret_token = secret_token
+        self.max_pending_updates = max_pending_updates
+        self.router = router
+
+        self.app: Application | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def attach(self, app: Application, loop: asyncio.AbstractEventLoop) -> None:
+        self.app = app
+        self.loop = loop
+
+    def detach(self) -> None:
+        self.app = None
+        self.loop = None
+
+    def receive(
+        self, secret_token: str | None, data: dict, forwarded: bool = False
+    ) -> int:
+        # Returns the HTTP status code for the response to Telegram
+
+        if not hmac.compare_digest(secret_token or "", self.secret_token):
+            return 403
+
+        # Updates of chats owned by other workers are handled by them
+        if self.router and not forwarded:
+            url = self.router(data)
+
+            if url:
+                return self.forward(url, data)
+
+        # Read once, as the application may be detached meanwhile
+        (app, loop) = (self.app, self.loop)
+
+        if not app:
+            return 503
+
+        # Telegram retries failed deliveries, so it's safe to reject them
+        if app.update_queue.qsize() >= self.max_pending_updates:
+            return 429
+
+        update = Update.de_json(data, app.bot)
+
+        try:
+            loop.call_soon_threadsafe(app.update_queue.put_nowait, update)
+        except RuntimeError:
+            # The event loop is closed, i.e. the bot has stopped
+            return 503
+
+        return 200
+
+    def forward(self, url: str, data: dict) -> int:
+        request = urllib.request.Request(
+            f"{url}/telegram",
+            data=json.dumps(data).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "X-Telegram-Bot-Api-Secret-Token": self.secret_token,
+                FORWARDED_HEADER: "1",
+            },
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=FORWARD_TIMEOUT) as response:
+                return response.status
+
+        except urllib.error.HTTPError as error:
+            return error.code
+
+        # Telegram retries the update later, e.g. once the shard has moved
+        except OSError:
+            return 503
@@ -0,0 +1,170 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+from telegram.error import Forbidden
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# The bot opens its database on import
+directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(directory.name, "chats.db")
+
+import bot
+from storage import Storage
+from sender import MessageSender
+from repository import Repository
+from models import Reminder, Translation, Destination, Dictionary
+
+
+def tearDownModule():
+    bot.repository.storage.close()
+    directory.cleanup()
+
+
+class FakeBot:
+    # Records sent messages, taking 'latency' seconds per message
+    def __init__(self, latency: float = 0.1, blocked: set[int] = frozenset()):
+        self.latency = latency
+        self.blocked = blocked
+
+        self.messages: list[tuple[int, str]] = []
+        self.sending = 0
+        self.max_sending = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+
+        self.sending += 1
+        self.max_sending = max(self.max_sending, self.sending)
+
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.sending -= 1
+
+        self.messages.append((chat_id, text))
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.delays = []
+
+    def get_jobs_by_name(self, name: str) -> list:
+        return []
+
+    def run_once(self, callback, when: float, name: str):
+        self.delays.append(when)
+
+
+class CallDueRemindersTest(unittest.TestCase):
+    def setUp(self):
+        self.repository = Repository(Storage())
+
+        patches = [
+            mock.patch.object(bot, "repository", self.repository),
+            mock.patch.object(bot, "render_cache", bot.RenderCache()),
+        ]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def add_reminders(self, chat_id: int, count: int) -> None:
+        # Due right away
+        last_at = time.time() - 365 * 86400
+
+        for _ in range(count):
+            chat = self.repository.get_chat(chat_id)
+            translation = Translation(
+                f"term {chat.reminder_next_id}", (Destination("dog", ()),), ""
+            )
+            reminder = Reminder(
+                chat.reminder_next_id,
+                last_at,
+                len(chat.reminder_intervals),
+                translation,
+                Dictionary.of("nl", "en"),
+                translation.src,
+            )
+
+            self.repository.save_reminder(chat_id, reminder)
+
+    def call(self, fake_bot: FakeBot) -> FakeJobQueue:
+        job_queue = FakeJobQueue()
+        context = SimpleNamespace(bot=fake_bot, job_queue=job_queue)
+
+        async def run():
+            sender = MessageSender(global_rate=1000, chat_rate=1000, chat_burst=1000)
+
+            with mock.patch.object(bot, "sender", sender):
+                sender.start()
+
+                try:
+                    await bot.call_due_reminders(context)
+                finally:
+                    await sender.stop()
+
+        asyncio.run(run())
+
+        return job_queue
+
+    def test_chats_are_sent_to_concurrently(self):
+        for chat_id in range(20):
+            self.add_reminders(chat_id, 1)
+
+        fake_bot = FakeBot(latency=0.2)
+
+        started_at = time.perf_counter()
+        job_queue = self.call(fake_bot)
+
+        self.assertLess(time.perf_counter() - started_at, 2)
+
+        self.assertEqual(sorted(id for id, _ in fake_bot.messages), list(range(20)))
+        self.assertGreater(fake_bot.max_sending, 1)
+
+        # Called already, so nothing is due until the next interval
+        [delay] = job_queue.delays
+        self.assertGreater(delay, 0)
+
+    def test_reminders_of_a_chat_are_batched(self):
+        self.add_reminders(1, bot.MAX_REMINDERS_PER_MESSAGE + 2)
+
+        fake_bot = FakeBot(latency=0)
+        self.call(fake_bot)
+
+        [first, second] = [text for _, text in fake_bot.messages]
+
+        self.assertIn(f"{bot.MAX_REMINDERS_PER_MESSAGE}. ", first)
+        self.assertIn("2. ", second)
+        self.assertNotIn("3. ", second)
+
+    def test_blocked_chat_does_not_stop_the_others(self):
+        for chat_id in range(3):
+            self.add_reminders(chat_id, 1)
+
+        fake_bot = FakeBot(latency=0, blocked={1})
+        self.call(fake_bot)
+
+        self.assertEqual(sorted(id for id, _ in fake_bot.messages), [0, 2])
+
+        # The reminders were called all the same
+        for chat_id in range(3):
+            [reminder] = self.repository.get_chat(chat_id).reminders.values()
+            self.assertEqual(reminder.left, len(bot.DEFAULT_REMINDER_INTERVALS) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
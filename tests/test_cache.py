@@ -0,0 +1,99 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cache
+from models import Translation
+from cache import TranslationCache, INVALID_TERM
+
+
+def get_key(value: str):
+    return TranslationCache.key(value, "nl", "en", 3, 2)
+
+
+class TranslationCacheTest(unittest.TestCase):
+    def setUp(self):
+        # Time only moves when told to
+        self.now = 1000.0
+
+        clock = mock.Mock(monotonic=lambda: self.now)
+        patcher = mock.patch.object(cache, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keys_are_normalized(self):
+        translation = Translation("fiets", (), "")
+
+        entries = TranslationCache(10)
+        entries.put(get_key("Fiets "), translation)
+
+        self.assertIs(entries.get(get_key("fiets")), translation)
+        self.assertIsNone(entries.get(TranslationCache.key("fiets", "nl", "de", 3, 2)))
+
+    def test_least_recently_used_is_evicted(self):
+        entries = TranslationCache(2)
+
+        for term in ["fiets", "boom"]:
+            entries.put(get_key(term), Translation(term, (), ""))
+
+        # Used last, so kept over 'boom'
+        entries.get(get_key("fiets"))
+        entries.put(get_key("huis"), Translation("huis", (), ""))
+
+        self.assertTrue(entries.contains(get_key("fiets")))
+        self.assertFalse(entries.contains(get_key("boom")))
+        self.assertTrue(entries.contains(get_key("huis")))
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries.get_stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        entries = TranslationCache(10, ttl=60)
+        entries.put(get_key("fiets"), Translation("fiets", (), ""))
+
+        self.now += 60
+        self.assertIsNotNone(entries.get(get_key("fiets")))
+
+        self.now += 1
+        self.assertFalse(entries.contains(get_key("fiets")))
+        self.assertIsNone(entries.get(get_key("fiets")))
+
+        # Expired entries are dropped on lookup
+        self.assertEqual(len(entries), 0)
+
+    def test_invalid_terms_are_cached(self):
+        entries = TranslationCache(10)
+        entries.put(get_key("xyzzy"), None)
+
+        self.assertIs(entries.get(get_key("xyzzy")), INVALID_TERM)
+
+    def test_missed_keys_are_kept_once(self):
+        entries = TranslationCache(10)
+
+        for term in ["fiets", "boom", "fiets"]:
+            entries.get(get_key(term))
+
+        stats = entries.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 3))
+
+        # Most recently missed last
+        self.assertEqual(entries.pop_missed_keys(), [get_key("boom"), get_key("fiets")])
+        self.assertEqual(entries.pop_missed_keys(), [])
+
+    def test_missed_keys_are_bounded(self):
+        entries = TranslationCache(10)
+
+        with mock.patch.object(cache, "MAX_MISSED_KEYS", 2):
+            for term in ["fiets", "boom", "huis"]:
+                entries.get(get_key(term))
+
+        self.assertEqual(entries.pop_missed_keys(), [get_key("boom"), get_key("huis")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cluster
+from cluster import Cluster, SHARD_COUNT
+
+
+class ClusterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, "chats.db")
+
+        # Shards acquired and released by worker id, in order
+        self.events: dict[str, list[tuple[str, set[int]]]] = {}
+
+    def join(self, worker_id: str) -> Cluster:
+        events = self.events.setdefault(worker_id, [])
+
+        worker = Cluster(
+            self.path,
+            worker_id,
+            f"http://{worker_id}",
+            on_acquire=lambda shards: events.append(("acquire", shards)),
+            on_release=lambda shards: events.append(("release", shards)),
+        )
+        self.addCleanup(worker.connection.close)
+
+        return worker
+
+    def test_shards_are_split_between_workers(self):
+        first = self.join("first")
+        first.heartbeat()
+
+        self.assertEqual(len(first.shards), SHARD_COUNT)
+        self.assertTrue(all(first.owns(chat_id) for chat_id in range(10)))
+
+        second = self.join("second")
+        second.heartbeat()
+
+        # Shards of the second worker are released by the first one first
+        self.assertEqual(second.shards, set())
+
+        first.heartbeat()
+        second.heartbeat()
+
+        self.assertEqual(first.shards | second.shards, set(range(SHARD_COUNT)))
+        self.assertEqual(first.shards & second.shards, set())
+
+        [_, (event, released)] = self.events["first"]
+
+        self.assertEqual(event, "release")
+        self.assertEqual(self.events["second"], [("acquire", released)])
+
+        # Updates of chats owned by the other worker go to it
+        first.heartbeat()
+        chat_id = min(released)
+
+        self.assertFalse(first.owns(chat_id))
+        self.assertEqual(first.get_owner_url(chat_id), "http://second")
+        self.assertIsNone(second.get_owner_url(chat_id))
+
+    def test_shards_are_loaded_again_after_lapsed_lease(self):
+        worker = self.join("first")
+        worker.heartbeat()
+
+        # E.g. the heartbeat thread was stalled, so chats weren't used
+        worker.leased_until -= cluster.LEASE_TTL - cluster.LEASE_MARGIN + 1
+
+        self.assertFalse(worker.owns(0))
+
+        worker.heartbeat()
+
+        self.assertTrue(worker.owns(0))
+        self.assertEqual(
+            self.events["first"],
+            [("acquire", set(range(SHARD_COUNT)))] * 2,
+        )
+
+    def test_renewed_leases_are_not_loaded_again(self):
+        worker = self.join("first")
+
+        worker.heartbeat()
+        worker.heartbeat()
+
+        self.assertEqual(len(self.events["first"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import translator
+from models import Translation, Destination, Example
+from local_dictionary import LocalDictionary, LocalDictionaries, build
+
+TERMS = ["hond", "honderd", "hondje", "fiets", "Gezellig", "één", "uitwaaien"]
+
+
+def create_translation(term: str) -> Translation:
+    return Translation(
+        term,
+        (
+            Destination(f"{term} 1", (Example(term, "a"), Example(term, "b"))),
+            Destination(f"{term} 2", ()),
+        ),
+        f"definition of {term}",
+    )
+
+
+class LocalDictionaryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "nl-en.idx")
+
+        count = build(((term, create_translation(term)) for term in TERMS), self.path)
+        self.assertEqual(count, len(TERMS))
+
+    def create_backend(self) -> LocalDictionaries:
+        backend = LocalDictionaries(self.directory)
+
+        def close():
+            for dictionary in backend.dictionaries.values():
+                if dictionary:
+                    dictionary.close()
+
+        self.addCleanup(close)
+
+        return backend
+
+    def open(self) -> LocalDictionary:
+        dictionary = LocalDictionary(self.path)
+        self.addCleanup(dictionary.close)
+
+        return dictionary
+
+    def test_get(self):
+        dictionary = self.open()
+
+        for term in TERMS:
+            self.assertEqual(dictionary.get(term), create_translation(term))
+
+        # Terms are normalized
+        self.assertEqual(dictionary.get(" gezellig "), create_translation("Gezellig"))
+
+        self.assertIsNone(dictionary.get("kat"))
+        self.assertIsNone(dictionary.get("zzz"))
+
+    def test_complete(self):
+        dictionary = self.open()
+
+        self.assertEqual(dictionary.complete("hond"), ["hond", "honderd", "hondje"])
+        self.assertEqual(dictionary.complete("HONDE"), ["honderd"])
+        self.assertEqual(dictionary.complete("hond", limit=2), ["hond", "honderd"])
+        self.assertEqual(dictionary.complete("é"), ["één"])
+
+        self.assertEqual(dictionary.complete("kat"), [])
+        self.assertEqual(dictionary.complete("zzz"), [])
+
+    def test_first_entry_of_term_wins(self):
+        entries = [("hond", create_translation("a")), ("Hond", create_translation("b"))]
+        build(entries, self.path)
+
+        self.assertEqual(self.open().get("hond"), create_translation("a"))
+
+    def test_backend_trims_translations(self):
+        backend = self.create_backend()
+
+        translation = backend(("hond", "nl", "en", 1, 1))
+
+        self.assertEqual(translation.get_dst_values(), ["hond 1"])
+        self.assertEqual(len(translation.get_examples()), 1)
+
+        # Language pairs without an index are passed on
+        self.assertIsNone(backend(("hond", "de", "en", 1, 1)))
+        self.assertEqual((backend.hits, backend.misses), (1, 1))
+
+    def test_translation_is_looked_up_once(self):
+        backend = self.create_backend()
+        args = ("hond", "nl", "en", 2, 2)
+
+        with mock.patch.object(translator, "backends", [backend]):
+            cached = translator.get_cached(*args)
+            translation = asyncio.run(translator.translate(*args, cached=cached))
+
+        self.assertEqual(translation, create_translation("hond"))
+        self.assertEqual((backend.hits, backend.misses), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
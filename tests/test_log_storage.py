@@ -0,0 +1,137 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import logging
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from log_storage import LogStorage
+from repository import Repository
+from models import Translation, Destination, Example, Reminder
+
+
+def create_translation(term: str) -> Translation:
+    return Translation(
+        term, (Destination(f"{term} en", (Example(term, f"{term} en"),)),), term
+    )
+
+
+def get_state(storage: LogStorage) -> dict:
+    # Everything stored of the chats, comparable between storages
+    return {
+        chat.id: (
+            chat.reminder_next_id,
+            list(chat.reminder_intervals),
+            chat.dictionary,
+            sorted(chat.reminders.items()),
+        )
+        for chat in storage.chats.values()
+    }
+
+
+class LogStorageTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, "chats")
+
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def open(self) -> Repository:
+        # Writes are only flushed on close, unless waited for
+        return Repository(LogStorage(self.path, group_commit_interval=60))
+
+    def fill(self, repository: Repository) -> None:
+        for chat_id in range(3):
+            chat = repository.get_chat(chat_id)
+
+            reminders = [
+                Reminder(
+                    chat.reminder_next_id + idx,
+                    1000 + idx,
+                    len(chat.reminder_intervals),
+                    create_translation(f"term {idx % 2}"),
+                    chat.dictionary,
+                    f"term {idx}",
+                )
+                for idx in range(4)
+            ]
+
+            repository.save_reminders(chat_id, reminders)
+
+        repository.handle_reminder_call(0, 1)
+        repository.review_reminder(0, 1, knew=False)
+        repository.remove_reminder(1, 2)
+        repository.clear_reminders(2)
+        repository.update_reminder_intervals(1, [10, 20])
+
+    def reopen(self, repository: Repository) -> Repository:
+        repository.storage.close()
+        return self.open()
+
+    def test_log_is_replayed(self):
+        repository = self.open()
+        self.fill(repository)
+
+        state = get_state(repository.storage)
+        recovered = self.reopen(repository)
+
+        self.assertEqual(get_state(recovered.storage), state)
+
+        # Shared translations stay shared
+        reminders = list(recovered.get_chat(0).reminders.values())
+        self.assertIs(reminders[0].translation, reminders[2].translation)
+
+        recovered.storage.close()
+
+    def test_snapshot_with_later_log(self):
+        repository = self.open()
+        self.fill(repository)
+
+        repository.storage.snapshot()
+
+        repository.review_reminder(0, 1, knew=True)
+        repository.update_reminder_intervals(0, [5, 10, 15])
+
+        state = get_state(repository.storage)
+        recovered = self.reopen(repository)
+
+        self.assertEqual(get_state(recovered.storage), state)
+
+        # Segments in the snapshot are removed
+        directory = os.path.dirname(self.path)
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory) if ".log." in name),
+            ["chats.log.1", "chats.log.2"],
+        )
+
+        recovered.storage.close()
+
+    def test_torn_write_is_skipped(self):
+        repository = self.open()
+        self.fill(repository)
+
+        state = get_state(repository.storage)
+        repository.storage.close()
+
+        with open(f"{self.path}.log.0", "ab") as file:
+            file.write(b"\x10\x00\x00\x00torn")
+
+        recovered = self.open()
+
+        self.assertEqual(get_state(recovered.storage), state)
+
+        # The schedule is rebuilt from the recovered chats
+        recovered.load_schedule()
+        self.assertEqual(len(recovered.scheduler), 7)
+
+        recovered.storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
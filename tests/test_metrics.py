@@ -0,0 +1,48 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from metrics import StatsCollector
+
+
+class StatsCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.stats = {"sent": 3, "queue_size": 2}
+
+        collector = StatsCollector()
+        collector.add("sender", lambda: self.stats, counters={"sent"})
+
+        self.registry = CollectorRegistry()
+        self.registry.register(collector)
+
+    def scrape(self) -> list[str]:
+        return generate_latest(self.registry).decode().splitlines()
+
+    def test_stats_are_exposed_by_kind(self):
+        lines = self.scrape()
+
+        self.assertIn("# TYPE oneling_sender_sent_total counter", lines)
+        self.assertIn("oneling_sender_sent_total 3.0", lines)
+
+        self.assertIn("# HELP oneling_sender_queue_size Sender queue size", lines)
+        self.assertIn("# TYPE oneling_sender_queue_size gauge", lines)
+        self.assertIn("oneling_sender_queue_size 2.0", lines)
+
+    def test_stats_are_read_on_scrape(self):
+        self.stats["sent"] = 5
+        self.stats["queue_size"] = 0
+
+        lines = self.scrape()
+
+        self.assertIn("oneling_sender_sent_total 5.0", lines)
+        self.assertIn("oneling_sender_queue_size 0.0", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+import dataclasses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models import (
+    Reminder,
+    Dictionary,
+    Translation,
+    Destination,
+    Example,
+    translation_to_tuple,
+    translation_from_tuple,
+)
+
+
+def create_translation() -> Translation:
+    return Translation(
+        "hond",
+        (Destination("dog", (Example("De hond.", "The dog."),)),),
+        "Een huisdier",
+    )
+
+
+class ModelsTest(unittest.TestCase):
+    def test_dictionaries_are_shared(self):
+        dictionary = Dictionary.of("nl", "en")
+
+        self.assertIs(Dictionary.of("nl", "en"), dictionary)
+        self.assertIs(Dictionary.of("".join(["n", "l"]), "en").src, dictionary.src)
+        self.assertIsNot(Dictionary.of("en", "nl"), dictionary)
+
+    def test_translations_are_frozen(self):
+        translation = create_translation()
+
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            translation.src = "kat"
+
+        # Equal translations are interchangeable, e.g. as dictionary keys
+        self.assertEqual(hash(translation), hash(create_translation()))
+
+    def test_models_have_no_instance_dicts(self):
+        translation = create_translation()
+        reminder = Reminder(1, 0, 3, translation, Dictionary.of("nl", "en"), "hond")
+
+        for model in [reminder, translation, translation.dst[0]]:
+            self.assertFalse(hasattr(model, "__dict__"))
+
+    def test_translation_tuples(self):
+        translation = create_translation()
+        value = translation_to_tuple(translation)
+
+        self.assertEqual(translation_from_tuple(value), translation)
+
+
+if __name__ == "__main__":
+    unittest.main()
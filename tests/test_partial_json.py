@@ -0,0 +1,107 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from partial_json import PartialJsonParser
+
+TRANSLATION = {
+    "valid": True,
+    "corrected_term": 'de "hond"\\',
+    "translations": [
+        {
+            "value": "dog",
+            "examples": [{"src": "De hond blaft.", "dst": "The dog barks."}],
+        },
+        {"value": "hound", "examples": []},
+    ],
+    "definition": "Een huisdier {dat blaft}, [meestal]",
+    "count": 2,
+}
+
+
+def parse_by_chars(text: str) -> list:
+    # Results after every character, as if each was a streamed chunk
+    parser = PartialJsonParser()
+    results = []
+
+    for char in text:
+        parser.feed(char)
+        results.append(parser.get())
+
+    return results
+
+
+class PartialJsonParserTest(unittest.TestCase):
+    def test_complete_json(self):
+        for text in (json.dumps(TRANSLATION), json.dumps(TRANSLATION, indent=2)):
+            self.assertEqual(parse_by_chars(text)[-1], TRANSLATION)
+
+    def test_incomplete_strings_are_never_returned(self):
+        strings = {"de \"hond\"\\", "dog", "hound", "De hond blaft.", "The dog barks."}
+        strings.add(TRANSLATION["definition"])
+
+        def get_strings(value) -> list[str]:
+            if isinstance(value, dict):
+                return [s for item in value.values() for s in get_strings(item)]
+
+            if isinstance(value, list):
+                return [s for item in value for s in get_strings(item)]
+
+            return [value] if isinstance(value, str) else []
+
+        for result in parse_by_chars(json.dumps(TRANSLATION)):
+            for string in get_strings(result):
+                self.assertIn(string, strings)
+
+    def test_results_grow(self):
+        results = parse_by_chars(json.dumps(TRANSLATION))
+
+        # Open containers are closed
+        self.assertEqual(results[0], {})
+
+        translations = [len(result.get("translations", [])) for result in results]
+        self.assertEqual(translations, sorted(translations))
+        self.assertEqual(translations[-1], 2)
+
+    def test_literals_wait_for_next_value(self):
+        results = parse_by_chars('{"valid": true, "term": "x"}')
+
+        self.assertNotIn({"valid": True}, results)
+        self.assertIn({"valid": True, "term": "x"}, results)
+
+    def test_numbers_wait_for_their_end(self):
+        results = parse_by_chars('{"a": "x", "n": 123}')
+
+        self.assertNotIn({"a": "x", "n": 1}, results)
+        self.assertNotIn({"a": "x", "n": 12}, results)
+        self.assertEqual(results[-1], {"a": "x", "n": 123})
+
+    def test_chunks(self):
+        text = json.dumps(TRANSLATION)
+        parser = PartialJsonParser()
+
+        cut = text.index(', "translations"')
+
+        parser.feed(text[:cut])
+        self.assertEqual(parser.get(), {"valid": True, "corrected_term": 'de "hond"\\'})
+
+        parser.feed(text[cut:])
+        self.assertEqual(parser.get(), TRANSLATION)
+
+    def test_nothing_parsed_yet(self):
+        parser = PartialJsonParser()
+
+        self.assertIsNone(parser.get())
+
+        parser.feed('  "valid')
+
+        self.assertIsNone(parser.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "dev"))
+
+import fake_openai
+from openai import AsyncOpenAI
+
+from cache import TranslationCache
+from prewarm import CachePrewarmer
+
+TERMS = ["hond", "fiets", "gezellig"]
+
+
+class CachePrewarmerTest(unittest.TestCase):
+    # Batches are run by the local stand-in for OpenAI (see 'dev/fake_openai.py')
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), fake_openai.RequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.seed_dir = os.path.join(directory.name, "seeds")
+        os.mkdir(self.seed_dir)
+
+        with open(os.path.join(self.seed_dir, "nl-en.txt"), "w") as file:
+            file.write("\n".join(TERMS) + "\n\n")
+
+        self.path = os.path.join(directory.name, "chats.db.prewarm")
+
+    def create_prewarmer(self, cache: TranslationCache) -> CachePrewarmer:
+        client = AsyncOpenAI(base_url=self.base_url, api_key="x")
+        return CachePrewarmer(
+            client, cache, 2, 1, self.seed_dir, poll_interval=0.01, path=self.path
+        )
+
+    def run_prewarmer(self, cache: TranslationCache) -> tuple[int, int]:
+        # Returns the number of loaded translations and of submitted batches
+        async def run():
+            prewarmer = self.create_prewarmer(cache)
+
+            async with prewarmer.client:
+                return await prewarmer.run()
+
+        batches = len(fake_openai.openai.batches)
+        loaded = asyncio.run(run())
+
+        return (loaded, len(fake_openai.openai.batches) - batches)
+
+    def test_seed_terms_are_prewarmed(self):
+        cache = TranslationCache(100)
+
+        self.assertEqual(self.run_prewarmer(cache), (len(TERMS), 1))
+
+        translation = cache.get(cache.key("Fiets", "nl", "en", 2, 1))
+        self.assertEqual(translation.src, "fiets")
+        self.assertEqual(translation.get_dst_values(), ["fiets (en)"])
+
+        # Cached terms aren't submitted again
+        self.assertEqual(self.run_prewarmer(cache), (0, 0))
+
+    def test_missed_terms_are_prewarmed(self):
+        cache = TranslationCache(100)
+        self.run_prewarmer(cache)
+
+        # Missed by chats, one of them with counts not prewarmed
+        cache.get(cache.key("kat", "nl", "en", 2, 1))
+        cache.get(cache.key("boom", "nl", "en", 3, 1))
+
+        self.assertEqual(self.run_prewarmer(cache), (1, 1))
+
+        self.assertTrue(cache.contains(cache.key("kat", "nl", "en", 2, 1)))
+        self.assertFalse(cache.contains(cache.key("boom", "nl", "en", 3, 1)))
+
+    def test_saved_translations_are_loaded_after_restart(self):
+        self.run_prewarmer(TranslationCache(100))
+
+        cache = TranslationCache(100)
+
+        self.assertEqual(self.run_prewarmer(cache), (len(TERMS), 0))
+        self.assertIsNotNone(cache.get(cache.key("hond", "nl", "en", 2, 1)))
+
+        # New seed terms are submitted, alone
+        with open(os.path.join(self.seed_dir, "nl-en.txt"), "a") as file:
+            file.write("kat\n")
+
+        self.assertEqual(self.run_prewarmer(TranslationCache(100)), (4, 1))
+        self.assertEqual(self.run_prewarmer(TranslationCache(100)), (4, 0))
+
+    def test_batch_in_progress_is_awaited_after_restart(self):
+        async def submit():
+            prewarmer = self.create_prewarmer(TranslationCache(100))
+            keys = prewarmer.collect_keys()
+
+            async with prewarmer.client:
+                prewarmer.write_pending_batch(await prewarmer.submit(keys), keys)
+
+        # E.g. the bot is stopped while waiting for the batch
+        asyncio.run(submit())
+
+        cache = TranslationCache(100)
+
+        self.assertEqual(self.run_prewarmer(cache), (len(TERMS), 0))
+        self.assertFalse(os.path.exists(f"{self.path}.batch"))
+
+    def test_overlapping_runs_are_skipped(self):
+        async def run():
+            prewarmer = self.create_prewarmer(TranslationCache(100))
+
+            async with prewarmer.client:
+                return await asyncio.gather(prewarmer.run(), prewarmer.run())
+
+        batches = len(fake_openai.openai.batches)
+
+        self.assertEqual(asyncio.run(run()), [len(TERMS), 0])
+        self.assertEqual(len(fake_openai.openai.batches) - batches, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
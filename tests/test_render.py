@@ -0,0 +1,145 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from render import RenderPool, RenderCache, render_parts, str_examples, str_translation
+from models import Translation, Destination, Example
+
+
+def create_translation(src: str = "hond") -> Translation:
+    return Translation(
+        src,
+        (Destination("dog", (Example(f"De {src}.", "The dog."),)),),
+        "Een huisdier",
+    )
+
+
+class RenderingTest(unittest.TestCase):
+    def test_translations_are_escaped(self):
+        translation = Translation(
+            "a < b & c",
+            (Destination("<i>x</i>", (Example("1 < 2", "2 > 1"),)),),
+            "",
+        )
+
+        self.assertEqual(
+            str_translation(translation),
+            "<b>a &lt; b &amp; c</b> - &lt;i&gt;x&lt;/i&gt;",
+        )
+        self.assertEqual(
+            str_examples(translation.get_examples()),
+            "<b>1. 1 &lt; 2</b>\nTranslation: 2 &gt; 1\n",
+        )
+
+    def test_parts(self):
+        (text, buttons, stop_button) = render_parts(7, create_translation())
+
+        self.assertEqual(text, "<b>hond</b> - dog")
+        self.assertEqual(
+            [data for _, data in buttons],
+            ["definition|7", "examples|7", "knew|7", "forgot|7"],
+        )
+        self.assertEqual(stop_button[1], "stop|7")
+
+
+class RenderCacheTest(unittest.TestCase):
+    def test_new_translation_is_rendered_again(self):
+        entries = RenderCache()
+        translation = create_translation()
+        parts = render_parts(7, translation)
+
+        entries.put(1, 7, translation, parts)
+
+        self.assertIs(entries.get(1, 7, translation), parts)
+        self.assertIsNone(entries.get(2, 7, translation))
+
+        # An equal translation that isn't the same object, e.g. reloaded
+        self.assertIsNone(entries.get(1, 7, create_translation()))
+
+        self.assertEqual((entries.hits, entries.misses), (1, 2))
+
+    def test_least_recently_used_is_evicted(self):
+        entries = RenderCache(max_size=2)
+        translation = create_translation()
+
+        for id in [1, 2]:
+            entries.put(1, id, translation, render_parts(id, translation))
+
+        entries.get(1, 1, translation)
+        entries.put(1, 3, translation, render_parts(3, translation))
+
+        self.assertIsNotNone(entries.get(1, 1, translation))
+        self.assertIsNone(entries.get(1, 2, translation))
+        self.assertIsNotNone(entries.get(1, 3, translation))
+
+    def test_examples_are_rendered_once(self):
+        entries = RenderCache()
+        translation = create_translation()
+
+        examples = entries.get_examples(1, 7, translation)
+
+        self.assertEqual(examples, str_examples(translation.get_examples()))
+        self.assertIs(entries.get_examples(1, 7, translation), examples)
+
+        # The parts are cached along the way
+        self.assertEqual(entries.get(1, 7, translation), render_parts(7, translation))
+
+        other = create_translation("kat")
+        self.assertNotEqual(entries.get_examples(1, 7, other), examples)
+
+
+class RenderPoolTest(unittest.TestCase):
+    def setUp(self):
+        translations = [create_translation(f"term {i}") for i in range(10)]
+        self.reminders = [(id, translations[id % 10]) for id in range(100)]
+
+    def test_workers_render_like_the_event_loop(self):
+        pool = RenderPool(1, min_reminders=10, chunk_reminders=30)
+        pool.start()
+        self.addCleanup(pool.stop)
+
+        expected = [render_parts(*reminder) for reminder in self.reminders]
+
+        self.assertEqual(asyncio.run(pool.render(self.reminders)), expected)
+
+    def test_small_waves_are_rendered_in_place(self):
+        # Sending them to workers would take longer than rendering them
+        pool = RenderPool(1, min_reminders=len(self.reminders) + 1)
+        pool.executor = mock.Mock()
+
+        expected = [render_parts(*reminder) for reminder in self.reminders]
+
+        self.assertEqual(asyncio.run(pool.render(self.reminders)), expected)
+        self.assertEqual(pool.executor.mock_calls, [])
+
+    def test_event_loop_is_yielded_to(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+
+            while True:
+                await asyncio.sleep(0)
+                ticks += 1
+
+        async def run():
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0)
+
+            parts = await RenderPool(0, slice_reminders=10).render(self.reminders)
+            ticker.cancel()
+
+            return parts
+
+        self.assertEqual(len(asyncio.run(run())), len(self.reminders))
+        self.assertGreaterEqual(ticks, 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,293 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import srs
+import repository
+from storage import Storage, SqliteStorage
+from repository import Repository
+from models import Reminder, Translation, Dictionary
+
+
+class FailingStorage(Storage):
+    # Fails calls and chat loads while 'failing' is set
+    def __init__(self):
+        self.failing = False
+
+    def load_chat(self, chat_id: int):
+        if self.failing:
+            raise OSError("storage is down")
+
+        return None
+
+    def call_reminder(self, chat_id, reminder, called, next_due) -> bool:
+        if self.failing:
+            raise OSError("storage is down")
+
+        return True
+
+
+class BlockingStorage(Storage):
+    # Blocks loading the chats in 'blocked' until 'released' is set
+    def __init__(self, blocked: set[int]):
+        self.blocked = blocked
+        self.loading = threading.Event()
+        self.released = threading.Event()
+        self.loads: list[int] = []
+
+    def load_chat(self, chat_id: int):
+        self.loads.append(chat_id)
+
+        if chat_id in self.blocked:
+            self.loading.set()
+            self.released.wait(5)
+
+        return None
+
+
+def create_reminder(id: int, last_at: float) -> Reminder:
+    translation = Translation(f"term {id}", (), "")
+    return Reminder(id, last_at, 3, translation, Dictionary.of("nl", "en"), "term")
+
+
+class DueRemindersTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = FailingStorage()
+        self.repository = Repository(self.storage)
+
+        # Everything added here is due by then
+        self.now = time.time() + 365 * 86400
+
+    def add_reminder(self, chat_id: int) -> Reminder:
+        chat = self.repository.get_chat(chat_id)
+        reminder = create_reminder(chat.reminder_next_id, time.time())
+
+        self.repository.save_reminder(chat_id, reminder)
+
+        return reminder
+
+    def test_failed_call_is_retried(self):
+        reminder = self.add_reminder(1)
+
+        [(chat, due)] = self.repository.get_due_reminders(self.now)
+        self.assertIs(due, reminder)
+
+        self.storage.failing = True
+
+        with self.assertRaises(OSError):
+            self.repository.handle_reminder_call(chat.id, reminder.id)
+
+        # The call is undone, and the reminder is due again shortly
+        self.assertEqual(reminder.left, 3)
+
+        retry_at = self.repository.scheduler.next_due()
+        self.assertAlmostEqual(
+            retry_at, time.time() + repository.CALL_RETRY_DELAY, delta=1
+        )
+
+        self.storage.failing = False
+
+        [(_, due)] = self.repository.get_due_reminders(self.now)
+        self.assertTrue(self.repository.handle_reminder_call(chat.id, due.id))
+        self.assertEqual(due.left, 2)
+
+    def test_restarted_reminder_starts_fresh(self):
+        reminder = self.add_reminder(1)
+        reminder.ease = 4.0
+        reminder.reviewed_at = reminder.last_at
+
+        restarted = self.repository.restart_reminder(1, reminder.id)
+
+        self.assertIs(restarted, reminder)
+        self.assertEqual(reminder.ease, srs.DEFAULT_EASE)
+        self.assertEqual(reminder.reviewed_at, 0)
+
+        # Scheduled like a new reminder
+        chat = self.repository.get_chat(1)
+        first_interval = chat.reminder_intervals[0]
+
+        self.assertAlmostEqual(
+            self.repository.scheduler.next_due(), time.time() + first_interval, delta=1
+        )
+
+        self.assertIsNone(self.repository.restart_reminder(1, reminder.id + 1))
+
+    def test_popped_reminders_are_kept_if_loading_fails(self):
+        self.add_reminder(1)
+        self.add_reminder(2)
+
+        # Chats are loaded from storage again
+        self.repository.chats.clear()
+        self.storage.failing = True
+
+        with self.assertRaises(OSError):
+            self.repository.get_due_reminders(self.now)
+
+        self.assertEqual(len(self.repository.scheduler), 2)
+
+        self.storage.failing = False
+
+        retry_at = self.now + repository.CALL_RETRY_DELAY
+        self.assertEqual(self.repository.scheduler.next_due(), retry_at)
+
+        # The chats are new ones (the storage keeps nothing), so nothing is due
+        self.assertEqual(self.repository.get_due_reminders(retry_at), [])
+        self.assertEqual(len(self.repository.scheduler), 0)
+
+
+class SavedRemindersTest(unittest.TestCase):
+    def test_reminders_are_found_by_value(self):
+        worker = Repository(Storage())
+        dictionary = Dictionary.of("nl", "en")
+
+        chat = worker.get_chat(1)
+        next_id = chat.reminder_next_id
+
+        # Added at once, e.g. a list of terms, one of them corrected
+        now = time.time()
+        fiets = Translation("fiets", (), "")
+        honger = Translation("heb honger", (), "")
+
+        reminders = [
+            Reminder(next_id, now, 3, fiets, dictionary, "fiets"),
+            Reminder(next_id + 1, now, 3, honger, dictionary, "hunger"),
+        ]
+
+        worker.save_reminders(1, reminders)
+
+        self.assertEqual(chat.reminder_next_id, next_id + 2)
+        self.assertEqual(len(worker.scheduler), 2)
+
+        # By the value added or the corrected term, in any spelling
+        for value, reminder in [
+            ("Fiets", reminders[0]),
+            ("hunger", reminders[1]),
+            ("heb  honger", reminders[1]),
+        ]:
+            self.assertIs(worker.get_reminder_by_value(1, value, dictionary), reminder)
+
+        self.assertIsNone(worker.get_reminder_by_value(1, "boom", dictionary))
+        self.assertIsNone(
+            worker.get_reminder_by_value(1, "fiets", Dictionary.of("nl", "de"))
+        )
+
+
+class ChatLockTest(unittest.TestCase):
+    def setUp(self):
+        self.storage = BlockingStorage({1})
+        self.repository = Repository(self.storage)
+
+        # Chat 1 is being loaded, holding the lock of its shard
+        self.loader = threading.Thread(target=self.repository.get_chat, args=(1,))
+        self.loader.start()
+        self.addCleanup(self.loader.join)
+        self.addCleanup(self.storage.released.set)
+
+        self.assertTrue(self.storage.loading.wait(5))
+
+    def get_chat_later(self, chat_id: int) -> threading.Thread:
+        thread = threading.Thread(target=self.repository.get_chat, args=(chat_id,))
+        thread.start()
+        self.addCleanup(thread.join)
+
+        return thread
+
+    def test_chats_of_other_shards_are_not_blocked(self):
+        self.assertEqual(self.repository.get_chat(2).id, 2)
+
+    def test_chats_of_the_same_shard_wait(self):
+        thread = self.get_chat_later(1 + repository.LOCK_SHARDS)
+
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        self.storage.released.set()
+
+        thread.join(5)
+        self.assertIn(1 + repository.LOCK_SHARDS, self.repository.chats)
+
+    def test_chat_is_loaded_once(self):
+        thread = self.get_chat_later(1)
+        thread.join(0.1)
+
+        self.storage.released.set()
+        thread.join(5)
+
+        self.assertEqual(self.storage.loads, [1])
+
+
+class ShardedRemindersTest(unittest.TestCase):
+    # Workers sharing a database, each owning some of the chats
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, "chats.db")
+        self.now = time.time() + 365 * 86400
+
+    def open(self) -> Repository:
+        worker = Repository(SqliteStorage(self.path))
+        self.addCleanup(worker.storage.close)
+
+        return worker
+
+    def add_reminder(self, worker: Repository, chat_id: int) -> Reminder:
+        chat = worker.get_chat(chat_id)
+        reminder = create_reminder(chat.reminder_next_id, time.time())
+
+        worker.save_reminder(chat_id, reminder)
+
+        return reminder
+
+    def test_reminders_of_chats_not_owned_are_dropped(self):
+        worker = self.open()
+
+        self.add_reminder(worker, 1)
+        self.add_reminder(worker, 2)
+
+        due = worker.get_due_reminders(self.now, owns=lambda id: id == 1)
+
+        self.assertEqual([chat.id for chat, _ in due], [1])
+
+        # The other chat is forgotten until this worker owns it (again)
+        self.assertEqual(len(worker.scheduler), 0)
+        self.assertNotIn(2, worker.chats)
+
+        worker.load_schedule(owns=lambda id: id == 2)
+        due = worker.get_due_reminders(self.now)
+
+        self.assertEqual([chat.id for chat, _ in due], [2])
+
+    def test_reminder_called_elsewhere_is_reloaded(self):
+        first = self.open()
+        second = self.open()
+
+        reminder = self.add_reminder(first, 1)
+        self.add_reminder(first, 2)
+
+        second.load_schedule()
+        second.get_chat(1)
+
+        self.assertTrue(first.handle_reminder_call(1, reminder.id))
+        self.assertFalse(second.handle_reminder_call(1, reminder.id))
+
+        # The chat is loaded again, with the call made by the first worker
+        self.assertNotIn(1, second.chats)
+        self.assertEqual(second.get_chat(1).reminders[reminder.id].left, 2)
+
+        # Only the schedule of that chat was reloaded
+        self.assertEqual(
+            sorted(second.scheduler.due.items()),
+            sorted(first.scheduler.due.items()),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from scheduler import ReminderScheduler
+
+
+class ReminderSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = ReminderScheduler()
+
+        self.earliest = []
+        self.scheduler.listener = self.earliest.append
+
+    def test_pops_due_reminders_in_order(self):
+        self.scheduler.schedule(1, 1, 30)
+        self.scheduler.schedule(2, 1, 10)
+        self.scheduler.schedule(1, 2, 20)
+
+        self.assertEqual(self.scheduler.pop_due(25), [(2, 1), (1, 2)])
+        self.assertEqual(self.scheduler.next_due(), 30)
+        self.assertEqual(len(self.scheduler), 1)
+
+        self.assertEqual(self.scheduler.pop_due(25), [])
+
+    def test_reschedule_replaces_due_time(self):
+        self.scheduler.schedule(1, 1, 10)
+        self.scheduler.schedule(1, 1, 50)
+
+        self.assertEqual(self.scheduler.pop_due(20), [])
+        self.assertEqual(self.scheduler.pop_due(50), [(1, 1)])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_schedule_without_replace_keeps_due_time(self):
+        self.scheduler.schedule(1, 1, 10)
+        self.scheduler.schedule(1, 1, 50, replace=False)
+
+        self.assertEqual(self.scheduler.pop_due(10), [(1, 1)])
+
+        # Unless the reminder isn't scheduled anymore
+        self.scheduler.schedule(1, 1, 50, replace=False)
+
+        self.assertEqual(self.scheduler.next_due(), 50)
+
+    def test_unschedule(self):
+        self.scheduler.schedule(1, 1, 10)
+        self.scheduler.schedule(1, 2, 20)
+        self.scheduler.schedule(2, 1, 30)
+
+        self.scheduler.unschedule(1, 1)
+        self.scheduler.unschedule(1, 1)
+
+        self.assertEqual(self.scheduler.next_due(), 20)
+        self.assertEqual(len(self.scheduler), 2)
+
+        self.scheduler.unschedule_chat(1)
+
+        self.assertEqual(self.scheduler.get_chat_ids(), [2])
+        self.assertEqual(self.scheduler.pop_due(100), [(2, 1)])
+
+    def test_listener_is_called_for_earliest_due_time(self):
+        self.scheduler.schedule(1, 1, 20)
+        self.scheduler.schedule(1, 2, 30)
+        self.scheduler.schedule(1, 3, 10)
+
+        self.assertEqual(self.earliest, [20, 10])
+
+    def test_schedule_many(self):
+        self.scheduler.schedule(1, 1, 40)
+        self.scheduler.schedule_many(2, [(1, 30), (2, 10), (3, 20)])
+
+        self.assertEqual(self.earliest, [40, 10])
+        self.assertEqual(len(self.scheduler), 4)
+
+        # Replaces due times like 'schedule'
+        self.scheduler.schedule_many(2, [(2, 50)])
+
+        self.assertEqual(self.scheduler.pop_due(100), [(2, 3), (2, 1), (1, 1), (2, 2)])
+
+    def test_stale_entries_are_compacted(self):
+        rng = random.Random(1)
+        due = {}
+
+        for _ in range(5000):
+            reminder_id = rng.randrange(100)
+            due[reminder_id] = rng.uniform(0, 1000)
+            self.scheduler.schedule(1, reminder_id, due[reminder_id])
+
+        self.assertLessEqual(len(self.scheduler.heap), 2 * len(due) + 64)
+
+        expected = sorted(due, key=due.get)
+        popped = [reminder_id for _, reminder_id in self.scheduler.pop_due(1000)]
+
+        self.assertEqual(popped, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
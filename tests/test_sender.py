@@ -0,0 +1,144 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import time
+import asyncio
+import unittest
+
+from telegram.error import RetryAfter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sender import MessageSender, TokenBucket, SCHEDULED, MAX_SEND_ATTEMPTS
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_delay_after_burst(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+        now = bucket.updated_at
+
+        for _ in range(2):
+            self.assertEqual(bucket.get_delay(now), 0)
+            bucket.take()
+
+        self.assertAlmostEqual(bucket.get_delay(now), 0.5)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+        now = bucket.updated_at
+
+        bucket.pause(now + 3)
+
+        self.assertAlmostEqual(bucket.get_delay(now), 3)
+        self.assertFalse(bucket.is_full(now))
+
+
+class MessageSenderTest(unittest.TestCase):
+    def run_sender(self, coroutine, chat_rate: float = 100, chat_burst: float = 100):
+        async def run():
+            sender = MessageSender(
+                global_rate=100, chat_rate=chat_rate, chat_burst=chat_burst
+            )
+            sender.start()
+
+            try:
+                return await coroutine(sender)
+            finally:
+                await sender.stop()
+
+        return asyncio.run(run())
+
+    def test_interactive_messages_go_first(self):
+        sent = []
+
+        async def send_all(sender: MessageSender):
+            async def request(text: str):
+                sent.append(text)
+
+            await asyncio.gather(
+                sender.send(1, lambda: request("scheduled"), SCHEDULED),
+                sender.send(2, lambda: request("interactive")),
+            )
+
+        self.run_sender(send_all)
+
+        self.assertEqual(sent, ["interactive", "scheduled"])
+
+    def test_retry_after_pauses_all_chats(self):
+        attempts = []
+
+        async def send_all(sender: MessageSender):
+            async def flooded():
+                attempts.append(time.monotonic())
+
+                if len(attempts) == 1:
+                    raise RetryAfter(1)
+
+                return "flooded"
+
+            flooded_task = asyncio.create_task(sender.send(1, flooded))
+            await asyncio.sleep(0.1)
+
+            # Other chats wait for the flood limit as well
+            other = await sender.send(2, lambda: asyncio.sleep(0, "other"))
+            other_at = time.monotonic()
+
+            return (await flooded_task, other, other_at, sender.retries)
+
+        (result, other, other_at, retries) = self.run_sender(send_all)
+
+        self.assertEqual((result, other, retries), ("flooded", "other", 1))
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.9)
+        self.assertGreaterEqual(other_at - attempts[0], 0.9)
+
+    def test_limited_chat_does_not_hold_up_others(self):
+        sent = []
+
+        async def send_all(sender: MessageSender):
+            async def request(chat_id: int):
+                sent.append((chat_id, time.monotonic()))
+
+            await asyncio.gather(
+                *(sender.send(1, lambda: request(1)) for _ in range(3)),
+                sender.send(2, lambda: request(2)),
+            )
+
+        self.run_sender(send_all, chat_rate=10, chat_burst=1)
+
+        # The other chat is sent to while the first one waits for its limit
+        self.assertEqual([chat_id for chat_id, _ in sent], [1, 2, 1, 1])
+
+        times = [sent_at for chat_id, sent_at in sent if chat_id == 1]
+
+        for previous, sent_at in zip(times, times[1:]):
+            self.assertGreaterEqual(sent_at - previous, 0.09)
+
+    def test_repeated_flood_limits_fail(self):
+        attempts = []
+
+        async def send(sender: MessageSender):
+            async def flooded():
+                attempts.append(1)
+                raise RetryAfter(0)
+
+            await sender.send(1, flooded)
+
+        with self.assertRaises(RetryAfter):
+            self.run_sender(send)
+
+        self.assertEqual(len(attempts), MAX_SEND_ATTEMPTS)
+
+    def test_failed_request_raises(self):
+        async def send(sender: MessageSender):
+            async def request():
+                raise ValueError("bad")
+
+            await sender.send(1, request)
+
+        with self.assertRaises(ValueError):
+            self.run_sender(send)
+
+
+if __name__ == "__main__":
+    unittest.main()
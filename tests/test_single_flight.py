@@ -0,0 +1,122 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import logging
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = 0
+
+    async def call(self, notify, result="done", error: Exception | None = None):
+        self.calls += 1
+
+        await asyncio.sleep(0.05)
+        await notify("partial")
+        await asyncio.sleep(0.05)
+
+        if error:
+            raise error
+
+        return result
+
+    def test_concurrent_calls_are_coalesced(self):
+        async def run():
+            return await asyncio.gather(
+                *(self.flights.run("key", self.call) for _ in range(3)),
+                self.flights.run("other", self.call),
+            )
+
+        self.assertEqual(asyncio.run(run()), ["done"] * 4)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.flights.get_stats()["deduplicated"], 2)
+
+        # Finished calls are forgotten
+        self.assertNotIn("key", self.flights)
+
+    def test_errors_are_shared(self):
+        async def call(notify):
+            return await self.call(notify, error=ValueError("failed"))
+
+        async def run():
+            return await asyncio.gather(
+                *(self.flights.run("key", call) for _ in range(2)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.calls, 1)
+
+    def test_listeners_get_partial_results(self):
+        partials = []
+
+        async def listener(value):
+            partials.append(value)
+
+        async def failing_listener(value):
+            raise ValueError("failed")
+
+        async def run():
+            return await asyncio.gather(
+                self.flights.run("key", self.call, listener),
+                self.flights.run("key", self.call, failing_listener),
+                self.flights.run("key", self.call, listener),
+            )
+
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        # A failing listener doesn't fail the call for others
+        self.assertEqual(asyncio.run(run()), ["done"] * 3)
+        self.assertEqual(partials, ["partial", "partial"])
+
+    def test_cancelled_caller_leaves_call_to_others(self):
+        async def run():
+            first = asyncio.create_task(self.flights.run("key", self.call))
+            second = asyncio.create_task(self.flights.run("key", self.call))
+            await asyncio.sleep(0.01)
+
+            first.cancel()
+
+            return await second
+
+        self.assertEqual(asyncio.run(run()), "done")
+        self.assertEqual(self.calls, 1)
+
+    def test_call_is_cancelled_without_callers(self):
+        cancelled = []
+
+        async def call(notify):
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            caller = asyncio.create_task(self.flights.run("key", call))
+            await asyncio.sleep(0.01)
+
+            caller.cancel()
+            await asyncio.sleep(0.01)
+
+            # A later caller starts a new call
+            self.assertNotIn("key", self.flights)
+
+        asyncio.run(run())
+
+        self.assertEqual(cancelled, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import srs
+from models import Chat, Reminder, Translation, Dictionary
+
+INTERVALS = [60, 600, 3600, 86400]
+
+
+def create_chat() -> Chat:
+    return Chat(1, {}, 0, list(INTERVALS), Dictionary.of("nl", "en"))
+
+
+def create_reminder(left: int = len(INTERVALS), last_at: float = 1000) -> Reminder:
+    translation = Translation("hond", (), "")
+    return Reminder(0, last_at, left, translation, Dictionary.of("nl", "en"), "hond")
+
+
+class IntervalTest(unittest.TestCase):
+    def test_default_ease_keeps_chat_intervals(self):
+        for left in range(1, len(INTERVALS) + 1):
+            interval = srs.get_interval(INTERVALS, left, srs.DEFAULT_EASE)
+            self.assertEqual(interval, INTERVALS[-left])
+
+    def test_ease_scales_intervals(self):
+        self.assertEqual(srs.get_interval(INTERVALS, 1, 5.0), 2 * 86400)
+        self.assertEqual(srs.get_interval(INTERVALS, 4, 1.25), 30)
+
+    def test_next_dues(self):
+        chat = create_chat()
+        reminders = [create_reminder(left=left) for left in (4, 1, 0)]
+        reminders[1].ease = 5.0
+
+        next_dues = srs.get_next_dues(chat, reminders)
+
+        self.assertEqual(next_dues, [1060, 1000 + 2 * 86400, None])
+        self.assertEqual(
+            next_dues, [srs.get_next_due(chat, reminder) for reminder in reminders]
+        )
+
+
+class ReviewTest(unittest.TestCase):
+    def test_knew_raises_ease(self):
+        reminder = create_reminder(left=2)
+
+        self.assertTrue(srs.review(create_chat(), reminder, True, 2000))
+
+        self.assertAlmostEqual(reminder.ease, srs.DEFAULT_EASE + srs.KNEW_EASE_BONUS)
+        self.assertEqual((reminder.last_at, reminder.left), (1000, 2))
+
+    def test_forgot_lowers_ease_and_starts_over(self):
+        reminder = create_reminder(left=2)
+
+        self.assertTrue(srs.review(create_chat(), reminder, False, 2000))
+
+        self.assertAlmostEqual(
+            reminder.ease, srs.DEFAULT_EASE - srs.FORGOT_EASE_PENALTY
+        )
+        self.assertEqual((reminder.last_at, reminder.left), (2000, len(INTERVALS)))
+
+    def test_ease_is_bounded(self):
+        chat = create_chat()
+
+        reminder = create_reminder()
+        reminder.ease = srs.MAX_EASE
+        srs.review(chat, reminder, True, 2000)
+
+        self.assertEqual(reminder.ease, srs.MAX_EASE)
+
+        reminder = create_reminder()
+        reminder.ease = srs.MIN_EASE
+        srs.review(chat, reminder, False, 2000)
+
+        self.assertEqual(reminder.ease, srs.MIN_EASE)
+
+    def test_single_review_per_call(self):
+        chat = create_chat()
+
+        for knew in (True, False):
+            reminder = create_reminder(left=2)
+
+            self.assertTrue(srs.review(chat, reminder, knew, 2000))
+            ease = reminder.ease
+
+            self.assertFalse(srs.review(chat, reminder, True, 2001))
+            self.assertFalse(srs.review(chat, reminder, False, 2002))
+            self.assertEqual(reminder.ease, ease)
+
+            # The next call may be reviewed again
+            reminder.last_at = 3000
+
+            self.assertTrue(srs.review(chat, reminder, True, 3001))
+
+    def test_finished_reminders_are_not_reviewed(self):
+        reminder = create_reminder(left=0)
+
+        self.assertFalse(srs.review(create_chat(), reminder, False, 2000))
+        self.assertEqual((reminder.left, reminder.ease), (0, srs.DEFAULT_EASE))
+
+
+class RestartTest(unittest.TestCase):
+    def test_restart_forgets_learned_ease(self):
+        chat = create_chat()
+        reminder = create_reminder(left=1)
+
+        srs.review(chat, reminder, True, 2000)
+        srs.restart(chat, reminder, 3000)
+
+        self.assertEqual(
+            (reminder.last_at, reminder.left, reminder.ease),
+            (3000, len(INTERVALS), srs.DEFAULT_EASE),
+        )
+        self.assertEqual(srs.get_next_due(chat, reminder), 3000 + INTERVALS[0])
+
+        # The next call may be reviewed again
+        self.assertTrue(srs.review(chat, reminder, False, 3001))
+
+
+class MigrateTest(unittest.TestCase):
+    def test_progress_is_kept(self):
+        reminders = [create_reminder(left=left) for left in (4, 3, 2, 1, 0)]
+
+        srs.migrate(reminders, 4, 8)
+
+        self.assertEqual([reminder.left for reminder in reminders], [8, 6, 4, 2, 0])
+
+    def test_unfinished_reminders_stay_unfinished(self):
+        reminders = [create_reminder(left=left) for left in (2, 1)]
+
+        srs.migrate(reminders, 4, 2)
+
+        self.assertEqual([reminder.left for reminder in reminders], [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from storage import SqliteStorage
+from models import Chat, Reminder, Dictionary, Translation, Destination, Example
+
+
+def create_reminder(id: int, term: str) -> Reminder:
+    translation = Translation(
+        term, (Destination(f"{term} en", (Example(term, f"{term} en"),)),), term
+    )
+
+    return Reminder(id, 1000.0, 3, translation, Dictionary.of("nl", "en"), term)
+
+
+def create_chat(chat_id: int) -> Chat:
+    return Chat(chat_id, {}, 1, [60, 3600, 86400], Dictionary.of("nl", "en"))
+
+
+class SqliteStorageTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = os.path.join(directory.name, "chats.db")
+        self.storage = self.open()
+
+    def open(self) -> SqliteStorage:
+        storage = SqliteStorage(self.path)
+        self.addCleanup(storage.close)
+
+        return storage
+
+    def add_reminders(self, chat: Chat, terms: list[str]) -> list[Reminder]:
+        reminders = []
+
+        for term in terms:
+            reminder = create_reminder(chat.reminder_next_id, term)
+            chat.reminders[reminder.id] = reminder
+            chat.reminder_next_id += 1
+
+            self.storage.add_reminder(chat, reminder, reminder.last_at + 60)
+            reminders.append(reminder)
+
+        return reminders
+
+    def test_chat_is_loaded_as_saved(self):
+        chat = create_chat(1)
+        [first, second] = self.add_reminders(chat, ["fiets", "boom"])
+
+        second.ease = 2.0
+        second.reviewed_at = 1500.0
+        self.storage.save_reminder(chat.id, second, 2000.0)
+
+        loaded = self.open().load_chat(1)
+
+        self.assertEqual(loaded.reminder_next_id, 3)
+        self.assertEqual(loaded.reminder_intervals, chat.reminder_intervals)
+        self.assertIs(loaded.dictionary, chat.dictionary)
+        self.assertEqual(loaded.reminders, {1: first, 2: second})
+
+        self.assertIsNone(self.storage.load_chat(2))
+
+    def test_chat_schedule_is_loaded_alone(self):
+        self.add_reminders(create_chat(1), ["fiets"])
+        [done, _] = self.add_reminders(create_chat(2), ["boom", "huis"])
+
+        # Reminders without a next call are not scheduled
+        self.storage.save_reminder(2, done, None)
+
+        self.assertEqual(self.storage.load_chat_schedule(2), [(2, 2, 1060.0)])
+        self.assertEqual(
+            sorted(self.storage.load_schedule()), [(1, 1, 1060.0), (2, 2, 1060.0)]
+        )
+
+    def test_equal_translations_are_shared(self):
+        chat = create_chat(1)
+        self.add_reminders(chat, ["fiets"])
+        self.add_reminders(create_chat(2), ["fiets"])
+
+        [first] = self.storage.load_chat(1).reminders.values()
+        [second] = self.open().load_chat(2).reminders.values()
+
+        self.assertEqual(first.translation, chat.reminders[1].translation)
+        self.assertIs(first.translation, second.translation)
+
+    def test_reminder_is_called_once(self):
+        chat = create_chat(1)
+        [reminder] = self.add_reminders(chat, ["fiets"])
+        called = (reminder.last_at, reminder.left)
+
+        # Two workers calling the same reminder, in the same state
+        other = self.open()
+
+        reminder.last_at = 1100.0
+        reminder.left = 2
+
+        self.assertTrue(self.storage.call_reminder(1, reminder, called, 1200.0))
+        self.assertFalse(other.call_reminder(1, reminder, called, 1300.0))
+
+        # The other call changed nothing
+        self.assertEqual(other.load_chat_schedule(1), [(1, 1, 1200.0)])
+
+        loaded = other.load_chat(1).reminders[reminder.id]
+        self.assertEqual((loaded.last_at, loaded.left), (1100.0, 2))
+
+        # Calls from the new state go through
+        reminder.left = 1
+        self.assertTrue(other.call_reminder(1, reminder, (1100.0, 2), None))
+        self.assertEqual(other.load_chat_schedule(1), [])
+
+    def test_cleared_reminders_are_gone(self):
+        chat = create_chat(1)
+        self.add_reminders(chat, ["fiets", "boom"])
+
+        self.storage.clear_reminders(1)
+
+        self.assertEqual(self.storage.load_chat(1).reminders, {})
+        self.assertEqual(list(self.storage.load_schedule()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import translator
+from utils import normalize_term
+from cache import TranslationCache
+from models import Translation, Destination
+
+PARTIAL = Translation("hond", (), "")
+TRANSLATION = Translation("hond", (Destination("dog", ()),), "")
+
+
+class TranslateTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+
+        async def request_translation(*args):
+            on_partial = args[-1]
+            self.requests.append(on_partial is not None)
+
+            await asyncio.sleep(0.05)
+
+            if on_partial:
+                await on_partial(PARTIAL)
+
+            await asyncio.sleep(0.05)
+
+            return TRANSLATION
+
+        patches = [
+            mock.patch.object(translator, "request_translation", request_translation),
+            mock.patch.object(translator, "cache", TranslationCache(100, 60)),
+            mock.patch.object(translator, "backends", []),
+        ]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def translate(self, on_partial=None):
+        return translator.translate("hond", "nl", "en", 1, 1, on_partial=on_partial)
+
+    def test_concurrent_translations_are_coalesced(self):
+        async def run():
+            return await asyncio.gather(*(self.translate() for _ in range(3)))
+
+        self.assertEqual(asyncio.run(run()), [TRANSLATION] * 3)
+        self.assertEqual(self.requests, [False])
+
+    def test_streaming_caller_gets_partials_after_plain_caller(self):
+        partials = []
+
+        async def on_partial(translation: Translation):
+            partials.append(translation)
+
+        async def run():
+            plain = asyncio.create_task(self.translate())
+            await asyncio.sleep(0)
+
+            return await asyncio.gather(plain, self.translate(on_partial))
+
+        self.assertEqual(asyncio.run(run()), [TRANSLATION] * 2)
+        self.assertEqual(partials, [PARTIAL])
+
+        # A plain flight can't stream, so the streaming caller started its own
+        self.assertEqual(self.requests, [False, True])
+
+    def test_plain_caller_joins_streamed_flight(self):
+        async def on_partial(translation: Translation):
+            pass
+
+        async def run():
+            streamed = asyncio.create_task(self.translate(on_partial))
+            await asyncio.sleep(0)
+
+            return await asyncio.gather(streamed, self.translate())
+
+        self.assertEqual(asyncio.run(run()), [TRANSLATION] * 2)
+        self.assertEqual(self.requests, [True])
+
+    def test_cached_translation_is_not_requested(self):
+        asyncio.run(self.translate())
+        asyncio.run(self.translate())
+
+        self.assertEqual(self.requests, [False])
+
+
+class TranslateLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.running = 0
+        self.max_running = 0
+
+        async def request_translation(value, *args):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+            try:
+                await asyncio.sleep(0.5 if value == "slow" else 0.05)
+            finally:
+                self.running -= 1
+
+            return Translation(value, (Destination("dog", ()),), "")
+
+        patches = [
+            mock.patch.object(translator, "request_translation", request_translation),
+            mock.patch.object(translator, "cache", TranslationCache(100, 60)),
+            mock.patch.object(translator, "backends", []),
+            mock.patch.object(translator, "semaphore", asyncio.Semaphore(2)),
+        ]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_requests_are_bounded(self):
+        async def run():
+            return await asyncio.gather(
+                *(translator.translate(f"term {i}", "nl", "en", 1, 1) for i in range(5))
+            )
+
+        translations = asyncio.run(run())
+
+        self.assertEqual([t.src for t in translations], [f"term {i}" for i in range(5)])
+        self.assertEqual(self.max_running, 2)
+
+    def test_slow_request_times_out(self):
+        async def run():
+            return await translator.translate("slow", "nl", "en", 1, 1, timeout=0.1)
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run(run())
+
+        # The request is cancelled, and nothing is cached
+        self.assertEqual(self.running, 0)
+        self.assertIsNone(translator.get_cached("slow", "nl", "en", 1, 1))
+
+
+class TranslateManyTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+
+        async def request_translations(values, *args):
+            self.requests.append(values)
+
+            return {
+                normalize_term(value): (
+                    None if value == "xyzzy" else Translation(value, (), "")
+                )
+                for value in values
+            }
+
+        patches = [
+            mock.patch.object(translator, "request_translations", request_translations),
+            mock.patch.object(translator, "cache", TranslationCache(100, 60)),
+            mock.patch.object(translator, "backends", []),
+        ]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def translate_many(self, values: list[str]):
+        return asyncio.run(translator.translate_many(values, "nl", "en", 1, 1))
+
+    def test_duplicates_are_requested_once(self):
+        translations = self.translate_many(["fiets", "Fiets ", "xyzzy", "boom"])
+
+        self.assertEqual(self.requests, [["fiets", "xyzzy", "boom"]])
+
+        # Every value gets the translation of its term
+        self.assertEqual(
+            [translation and translation.src for translation in translations],
+            ["fiets", "fiets", None, "boom"],
+        )
+
+    def test_cached_terms_are_not_requested(self):
+        self.translate_many(["fiets", "xyzzy"])
+        translations = self.translate_many(["xyzzy", "boom", "fiets"])
+
+        self.assertEqual(self.requests, [["fiets", "xyzzy"], ["boom"]])
+        self.assertEqual(
+            [translation and translation.src for translation in translations],
+            [None, "boom", "fiets"],
+        )
+
+
+def get_object_schemas(schema: dict) -> list[dict]:
+    # The schema and every object schema nested in it
+    schemas = [schema] if schema.get("type") == "object" else []
+
+    for value in schema.get("properties", {}).values():
+        schemas.extend(get_object_schemas(value))
+
+    if "items" in schema:
+        schemas.extend(get_object_schemas(schema["items"]))
+
+    return schemas
+
+
+class PromptTest(unittest.TestCase):
+    def test_system_message_is_the_same_for_every_term(self):
+        [system, user] = translator.get_translation_messages("hond", "nl", "en", 3, 1)
+        [other_system, other_user] = translator.get_translation_messages(
+            "Katze", "de", "en", 3, 1
+        )
+
+        # Only the user message varies, so OpenAI can cache the prompt prefix
+        self.assertIs(system["content"], other_system["content"])
+        self.assertNotIn("hond", system["content"])
+
+        self.assertIn("hond", user["content"])
+        self.assertIn("Katze", other_user["content"])
+
+    def test_schemas_are_strict(self):
+        for json_schema in [translator.JSON_SCHEMA, translator.BATCH_JSON_SCHEMA]:
+            self.assertTrue(json_schema["strict"])
+
+            for schema in get_object_schemas(json_schema["schema"]):
+                self.assertEqual(schema["required"], list(schema["properties"]))
+                self.assertFalse(schema["additionalProperties"])
+
+    def test_completion_params(self):
+        messages = translator.get_translation_messages("hond", "nl", "en", 3, 1)
+        params = translator.get_completion_params(
+            messages, 4, translator.BATCH_JSON_SCHEMA
+        )
+
+        self.assertEqual(
+            params["response_format"],
+            {"type": "json_schema", "json_schema": translator.BATCH_JSON_SCHEMA},
+        )
+        self.assertEqual(params["temperature"], 0)
+        self.assertEqual(params["max_tokens"], translator.MAX_TOKENS_PER_TERM * 4)
+
+    def test_invalid_terms_have_no_translation(self):
+        json_object = {
+            "valid": False,
+            "corrected_term": "",
+            "translations": [],
+            "definition": "",
+        }
+
+        self.assertIsNone(translator.parse_translation(json_object))
+
+        json_object.update(
+            valid=True,
+            corrected_term="hond",
+            translations=[{"value": "dog", "examples": []}],
+        )
+
+        self.assertEqual(translator.parse_translation(json_object), TRANSLATION)
+
+    def test_cached_tokens(self):
+        usage = SimpleNamespace(prompt_tokens_details={"cached_tokens": 1024})
+        self.assertEqual(translator.get_cached_tokens(usage), 1024)
+
+        details = SimpleNamespace(cached_tokens=None)
+        usage = SimpleNamespace(prompt_tokens_details=details)
+        self.assertEqual(translator.get_cached_tokens(usage), 0)
+
+        self.assertEqual(translator.get_cached_tokens(SimpleNamespace()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
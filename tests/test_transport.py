@@ -0,0 +1,236 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import time
+import random
+import logging
+import asyncio
+import unittest
+from unittest import mock
+from collections import deque
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import transport
+from transport import CircuitBreaker, Transport, UpstreamUnavailable
+
+
+def setUpModule():
+    # Retries and opened circuits are logged on purpose here
+    logging.disable(logging.CRITICAL)
+
+
+def tearDownModule():
+    logging.disable(logging.NOTSET)
+
+
+def create_request(failure_rate: float, rng: random.Random):
+    # Fails like a flaky upstream, i.e. with retryable connection errors
+    async def request():
+        if rng.random() < failure_rate:
+            raise httpx.ConnectError("flaky")
+
+        return "ok"
+
+    return request
+
+
+class BadRequest(Exception):
+    pass
+
+
+@mock.patch.object(transport, "RETRY_BASE_DELAY", 0)
+class TransportTest(unittest.TestCase):
+    def call(self, transport: Transport, request) -> str:
+        return asyncio.run(transport.call(request, "test", 10))
+
+    def test_flaky_upstream_keeps_circuit_closed(self):
+        # Most failed attempts succeed when retried, so requests don't fail
+        rng = random.Random(1)
+        tr = Transport()
+        failed = 0
+
+        for _ in range(500):
+            try:
+                self.call(tr, create_request(0.3, rng))
+            except UpstreamUnavailable:
+                failed += 1
+
+        self.assertLess(failed, 25)
+        self.assertFalse(tr.breaker.is_open())
+        self.assertEqual(tr.breaker.opens, 0)
+        self.assertGreater(tr.retries, 0)
+
+    def test_outage_opens_circuit(self):
+        tr = Transport()
+        request = create_request(1, random.Random(1))
+
+        for _ in range(transport.CIRCUIT_MIN_REQUESTS):
+            with self.assertRaises(UpstreamUnavailable):
+                self.call(tr, request)
+
+        self.assertTrue(tr.breaker.is_open())
+
+        # Requests now fail right away, without attempts
+        failures = tr.failures
+
+        with self.assertRaises(UpstreamUnavailable):
+            self.call(tr, request)
+
+        self.assertEqual(tr.failures, failures)
+        self.assertEqual(tr.rejected, 1)
+
+    def test_bad_requests_are_not_retried(self):
+        tr = Transport()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            raise BadRequest()
+
+        for _ in range(transport.CIRCUIT_MIN_REQUESTS):
+            with self.assertRaises(BadRequest):
+                self.call(tr, request)
+
+        self.assertEqual(len(attempts), transport.CIRCUIT_MIN_REQUESTS)
+        self.assertFalse(tr.breaker.is_open())
+
+    def test_auth_errors_open_circuit(self):
+        from openai import AuthenticationError
+
+        tr = Transport()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+
+            request = httpx.Request("POST", "https://api.openai.com/v1")
+            response = httpx.Response(401, request=request)
+
+            raise AuthenticationError("Invalid API key", response=response, body=None)
+
+        # E.g. a revoked API key, which no retry helps with
+        for _ in range(transport.CIRCUIT_MIN_REQUESTS):
+            with self.assertRaises(AuthenticationError):
+                self.call(tr, request)
+
+        self.assertEqual(len(attempts), transport.CIRCUIT_MIN_REQUESTS)
+        self.assertTrue(tr.breaker.is_open())
+
+        with self.assertRaises(UpstreamUnavailable):
+            self.call(tr, request)
+
+
+class HedgingTest(unittest.TestCase):
+    def setUp(self):
+        self.cancelled = 0
+
+    def create_transport(self, hedging: bool) -> Transport:
+        # Recent attempts took 50ms, so slower ones are hedged after that
+        tr = Transport(hedging=hedging)
+        tr.latencies["test"] = deque([0.05] * transport.HEDGE_MIN_SAMPLES)
+
+        return tr
+
+    def create_request(self, latencies: list[float]):
+        # Attempts take the given latencies, in order
+        latencies = iter(latencies)
+
+        async def request():
+            latency = next(latencies)
+
+            try:
+                await asyncio.sleep(latency)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+
+            return latency
+
+        return request
+
+    def call(self, tr: Transport, request) -> tuple[float, float]:
+        started_at = time.monotonic()
+        result = asyncio.run(tr.call(request, "test", 10))
+
+        return (result, time.monotonic() - started_at)
+
+    def test_slow_request_is_hedged(self):
+        tr = self.create_transport(hedging=True)
+
+        (result, duration) = self.call(tr, self.create_request([5, 0.01]))
+
+        self.assertEqual(result, 0.01)
+        self.assertLess(duration, 1)
+
+        # The slow request is cancelled once the hedge wins
+        self.assertEqual(tr.hedged, 1)
+        self.assertEqual(self.cancelled, 1)
+
+    def test_fast_request_is_not_hedged(self):
+        tr = self.create_transport(hedging=True)
+
+        (result, _) = self.call(tr, self.create_request([0.01]))
+
+        self.assertEqual(result, 0.01)
+        self.assertEqual(tr.hedged, 0)
+
+    def test_requests_are_not_hedged_unless_enabled(self):
+        tr = self.create_transport(hedging=False)
+
+        (result, _) = self.call(tr, self.create_request([0.2, 0.01]))
+
+        self.assertEqual(result, 0.2)
+        self.assertEqual(tr.hedged, 0)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_at_failure_ratio(self):
+        breaker = CircuitBreaker()
+
+        for idx in range(transport.CIRCUIT_MIN_REQUESTS):
+            breaker.record_failure() if idx % 2 else breaker.record_success()
+
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+    def test_needs_min_requests(self):
+        breaker = CircuitBreaker()
+
+        for _ in range(transport.CIRCUIT_MIN_REQUESTS - 1):
+            breaker.record_failure()
+
+        self.assertFalse(breaker.is_open())
+
+    def test_probe_closes_circuit(self):
+        breaker = CircuitBreaker(open_duration=0)
+        breaker.open()
+
+        # A single probe at a time
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.is_open())
+
+        breaker.record_success()
+
+        self.assertFalse(breaker.is_open())
+        self.assertEqual(breaker.opens, 1)
+
+    def test_failed_probe_opens_circuit_again(self):
+        breaker = CircuitBreaker(open_duration=60)
+        breaker.open()
+        breaker.opened_at -= 60
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
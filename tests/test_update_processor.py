@@ -0,0 +1,86 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from telegram import Update
+
+from update_processor import ChatUpdateProcessor
+
+
+def create_update(update_id: int, chat_id: int) -> Update:
+    chat = {"id": chat_id, "type": "private"}
+    user = {"id": chat_id, "is_bot": False, "first_name": "User"}
+    message = {"message_id": update_id, "date": 0, "chat": chat, "from": user}
+
+    return Update.de_json({"update_id": update_id, "message": message}, None)
+
+
+class ChatUpdateProcessorTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    async def handle(self, name: str, duration: float = 0.02):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.events.append(f"start {name}")
+
+        await asyncio.sleep(duration)
+
+        self.events.append(f"end {name}")
+        self.running -= 1
+
+    def run_updates(self, processor, updates: list[tuple[int, int, str]]):
+        async def run():
+            await asyncio.gather(
+                *(
+                    processor.process_update(
+                        create_update(update_id, chat_id), self.handle(name)
+                    )
+                    for update_id, chat_id, name in updates
+                )
+            )
+
+        asyncio.run(run())
+
+    def test_updates_of_a_chat_are_handled_in_order(self):
+        processor = ChatUpdateProcessor(10)
+
+        self.run_updates(processor, [(1, 1, "a1"), (2, 1, "a2"), (3, 1, "a3")])
+
+        self.assertEqual(
+            self.events,
+            ["start a1", "end a1", "start a2", "end a2", "start a3", "end a3"],
+        )
+
+        # Locks of chats without updates are forgotten
+        self.assertEqual(processor.chat_locks, {})
+
+    def test_chats_are_handled_concurrently(self):
+        processor = ChatUpdateProcessor(10)
+
+        self.run_updates(processor, [(1, 1, "a"), (2, 2, "b"), (3, 3, "c")])
+
+        self.assertEqual(self.max_running, 3)
+
+    def test_waiting_updates_dont_hold_up_other_chats(self):
+        processor = ChatUpdateProcessor(2)
+
+        updates = [(id, 1, f"a{id}") for id in range(1, 6)]
+        updates += [(6, 2, "b"), (7, 3, "c"), (8, 4, "d")]
+
+        self.run_updates(processor, updates)
+
+        # Other chats are handled while the first one waits for its updates
+        self.assertLess(self.events.index("end d"), self.events.index("start a3"))
+        self.assertEqual(self.max_running, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
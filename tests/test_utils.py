@@ -0,0 +1,31 @@
+# Usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import split_values
+
+
+class SplitValuesTest(unittest.TestCase):
+    def test_values_are_split_by_line(self):
+        self.assertEqual(
+            split_values("fiets\n  goed  gedaan \n\n boom\n"),
+            ["fiets", "goed  gedaan", "boom"],
+        )
+
+    def test_duplicates_are_skipped(self):
+        # The first spelling of a term is kept, in the order of appearance
+        self.assertEqual(
+            split_values("Fiets\nboom\nfiets\ngoed gedaan\nGoed  gedaan\nFIETS"),
+            ["Fiets", "boom", "goed gedaan"],
+        )
+
+    def test_blank_text_has_no_values(self):
+        self.assertEqual(split_values(" \n\t\n"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()